@@ -0,0 +1,181 @@
+"""
+Cost of decoding and validating sensor messages.
+
+Compares the old path, ``json.loads`` and reading the keys the writer
+needs, with ``orjson`` followed by validation of the parsed dict (if
+orjson is installed) and with the pre-built schema validating the raw
+bytes in one pass. Then compares JSON with MessagePack and CBOR, one
+reading per message and gateway envelopes of ``--batch`` readings, and
+prints bytes and microseconds per reading::
+
+    python benchmarks/decode.py --messages 100000 --batch 50
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import cbor2
+import msgpack
+
+from lakewatch.services.messages import (
+    CBOR,
+    JSON,
+    MSGPACK,
+    READING,
+    decode_message,
+    decode_reading,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+KEYS = (
+    "node_id",
+    "timestamp",
+    "latitude",
+    "longitude",
+    "temperature",
+    "ph",
+    "dissolved_oxygen",
+    "maintenance_required",
+)
+
+
+def make_readings(count: int, invalid: float, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build readings as the nodes publish them.
+
+    :param count: number of readings.
+    :param invalid: share of readings missing a required key.
+    :param seed: random seed.
+    :return: readings.
+    """
+    rng = random.Random(seed)
+    readings = []
+    for index in range(count):
+        reading: Dict[str, Any] = {
+            "node_id": f"node{rng.randrange(100)}",
+            "timestamp": 1700000000 + index,
+            "latitude": 12.9 + rng.random() / 10,
+            "longitude": 77.5 + rng.random() / 10,
+            "temperature": rng.gauss(25, 1),
+            "ph": rng.gauss(6.5, 0.1),
+            "dissolved_oxygen": rng.gauss(4, 0.2),
+            "maintenance_required": int(rng.random() < 0.001),
+        }
+        if rng.random() < invalid:
+            del reading[rng.choice(KEYS)]
+        readings.append(reading)
+    return readings
+
+
+def envelope(readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pack readings of a gateway, keys sent once."""
+    return {
+        "gateway": "gw1",
+        "fields": list(KEYS),
+        "readings": [[reading.get(key) for key in KEYS] for reading in readings],
+    }
+
+
+def stdlib(body: bytes) -> Any:
+    """Decode as messages used to be, without checking types or ranges."""
+    data = json.loads(body)
+    return [data[key] for key in KEYS]
+
+
+def orjson_then_validate(body: bytes) -> Any:
+    """Decode with orjson, then validate the parsed dict."""
+    return READING.validate_python(orjson.loads(body))
+
+
+def timed(decode: Callable[[bytes], Any], bodies: List[bytes], count: int) -> float:
+    """
+    Decode every body, skipping rejected ones like the consumer does.
+
+    :param decode: decoder under test.
+    :param bodies: message bodies.
+    :param count: readings in all bodies.
+    :return: microseconds per reading.
+    """
+    start = time.perf_counter()
+    for body in bodies:
+        # A bare try is cheaper than suppress() inside the timed loop
+        try:  # noqa: SIM105
+            decode(body)
+        except (KeyError, ValueError):
+            pass
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def compare_formats(readings: List[Dict[str, Any]], batch: int) -> None:
+    """
+    Print size and decode cost per reading of every format.
+
+    :param readings: readings to send.
+    :param batch: readings per envelope.
+    """
+    encoders: Dict[str, Callable[[Any], bytes]] = {
+        JSON: lambda data: json.dumps(data).encode(),
+        MSGPACK: msgpack.packb,
+        CBOR: cbor2.dumps,
+    }
+    batches = [readings[i : i + batch] for i in range(0, len(readings), batch)]
+    print(f"\n{'format':>20} {'readings':>9} {'bytes/reading':>14} {'us/reading':>11}")
+    for content_type, encode in encoders.items():
+        for size, messages in ((1, [[r] for r in readings]), (batch, batches)):
+            if size > 1 and content_type == JSON:
+                continue
+            bodies = [
+                encode(message[0] if size == 1 else envelope(message))
+                for message in messages
+            ]
+            size_per_reading = sum(map(len, bodies)) / len(readings)
+            elapsed = timed(
+                lambda body, content_type=content_type: decode_message(
+                    body,
+                    content_type,
+                ),
+                bodies,
+                len(readings),
+            )
+            print(
+                f"{content_type:>20} {size:>9} {size_per_reading:>14.1f} "
+                f"{elapsed:>11.2f}",
+            )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--messages", type=int, default=100000, help="Messages.")
+    parser.add_argument(
+        "--invalid",
+        type=float,
+        default=0.01,
+        help="Share of messages missing a key.",
+    )
+    parser.add_argument("--batch", type=int, default=50, help="Readings per envelope.")
+    args = parser.parse_args(argv)
+
+    readings = make_readings(args.messages, args.invalid)
+    bodies = [json.dumps(reading).encode() for reading in readings]
+    decoders: Dict[str, Callable[[bytes], Any]] = {
+        "json.loads": stdlib,
+        "validate_json": decode_reading,
+    }
+    if orjson is not None:
+        decoders["orjson + validate"] = orjson_then_validate
+    print(f"{'decoder':>20} {'us/message':>12}")
+    for name, decode in decoders.items():
+        print(f"{name:>20} {timed(decode, bodies, len(bodies)):>12.2f}")
+    compare_formats(readings, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Throughput of the batch evaluation against checking readings one by one.
+
+Runs ``threshold_check`` and ``process_outliers`` for every reading, then
+``evaluate_batch`` on the same readings, on a temporary database and
+without WebSocket clients, and prints readings per second of both::
+
+    python benchmarks/evaluate.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from unittest.mock import patch
+
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.db.migrations import migrate
+from lakewatch.services.alerts import alert_engine
+from lakewatch.services.evaluate import evaluate_batch
+from lakewatch.services.outlier import outlier_detector, process_outliers
+from lakewatch.services.threshold import threshold_check
+from lakewatch.services.writer import ingest_writer
+
+
+def make_readings(count: int, nodes: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build readings in the normal range with occasional breaches.
+
+    :param count: number of readings.
+    :param nodes: number of distinct nodes.
+    :param seed: random seed.
+    :return: readings in timestamp order.
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "node_id": f"node{rng.randrange(nodes)}",
+            "timestamp": 1700000000 + index,
+            "latitude": 12.9 + rng.random() / 10,
+            "longitude": 77.5 + rng.random() / 10,
+            "temperature": rng.gauss(25, 1) + (10 if rng.random() < 0.01 else 0),
+            "ph": rng.gauss(6.5, 0.1),
+            "dissolved_oxygen": rng.gauss(4, 0.2),
+            "maintenance_required": int(rng.random() < 0.001),
+        }
+        for index in range(count)
+    ]
+
+
+async def per_message(readings: List[Dict[str, Any]]) -> None:
+    """Check every reading on its own, as messages used to be."""
+    for data in readings:
+        await threshold_check(data)
+        await process_outliers(data)
+
+
+async def timed(
+    check: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+    readings: List[Dict[str, Any]],
+) -> float:
+    """
+    Time one run of a check from an empty alert and window state.
+
+    :param check: evaluation path.
+    :param readings: readings to check.
+    :return: elapsed seconds.
+    """
+    alert_engine.clear()
+    outlier_detector.clear()
+    started = time.perf_counter()
+    await check(readings)
+    return time.perf_counter() - started
+
+
+async def run(sizes: Sequence[int], nodes: int) -> None:
+    """
+    Print the throughput of both paths for every batch size.
+
+    :param sizes: readings per batch.
+    :param nodes: number of distinct nodes.
+    """
+    print(f"{'readings':>10} {'per message/s':>15} {'batch/s':>15} {'speedup':>8}")
+    for size in sizes:
+        readings = make_readings(size, nodes)
+        single = await timed(per_message, readings)
+        batch = await timed(evaluate_batch, readings)
+        print(
+            f"{size:>10} {size / single:>15,.0f} {size / batch:>15,.0f} "
+            f"{single / batch:>7.1f}x",
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Readings per batch.",
+    )
+    parser.add_argument("--nodes", type=int, default=100, help="Distinct nodes.")
+    args = parser.parse_args(argv)
+    # Every alert is logged, writing those to the terminal would dominate
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "db.sqlite3"
+        conn = sqlite3.connect(path, isolation_level=None)
+        migrate(conn)
+        conn.close()
+        # Alert history is written by the ingest writer, not measured here
+        with patch.object(database, "_path", path), patch.object(
+            ingest_writer,
+            "record_alert",
+        ):
+            asyncio.run(run(args.sizes, args.nodes))
+            database.close()
+
+
+if __name__ == "__main__":
+    main()
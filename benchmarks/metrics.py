@@ -0,0 +1,77 @@
+"""
+Overhead of the metrics on the ingest hot path.
+
+Decodes sensor messages with and without the instrumentation added to
+every message, timing the decode stage and counting the outcome, and
+prints the added cost per message next to the decoding itself. Then
+renders the whole registry as a scrape would::
+
+    python benchmarks/metrics.py --messages 200000
+"""
+
+import argparse
+import json
+import time
+from typing import Optional, Sequence
+
+from loguru import logger
+
+from lakewatch.services.messages import decode_message
+from lakewatch.services.metrics import LATENCY_BUCKETS, Counter, Histogram, registry
+from lakewatch.web.application import get_app
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--messages", type=int, default=200000, help="Messages.")
+    parser.add_argument("--scrapes", type=int, default=100, help="Renders.")
+    args = parser.parse_args(argv)
+    logger.remove()
+    # Registers the metrics of every module, like the API process does
+    get_app()
+
+    body = json.dumps(
+        {
+            "node_id": "node1",
+            "timestamp": 1700000000,
+            "latitude": 12.9,
+            "longitude": 77.5,
+            "temperature": 25.0,
+            "ph": 6.5,
+            "dissolved_oxygen": 4.0,
+            "maintenance_required": 0,
+        },
+    ).encode()
+    decode_seconds = Histogram("bench_seconds", "Decode.", LATENCY_BUCKETS)
+    messages = Counter("bench_messages", "Messages.")
+    readings = Counter("bench_readings", "Readings.")
+
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        decode_message(body)
+    bare = (time.perf_counter() - start) / args.messages * 1e6
+
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        started = time.perf_counter()
+        decoded = decode_message(body)
+        decode_seconds.observe(time.perf_counter() - started)
+        messages.inc()
+        readings.inc(len(decoded))
+    instrumented = (time.perf_counter() - start) / args.messages * 1e6
+
+    print(f"{'path':>14} {'us/message':>11}")
+    print(f"{'bare':>14} {bare:>11.3f}")
+    print(f"{'instrumented':>14} {instrumented:>11.3f}")
+    print(f"{'overhead':>14} {instrumented - bare:>11.3f}")
+
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        text = registry.render()
+    elapsed = (time.perf_counter() - start) / args.scrapes * 1e3
+    print(f"\nrender: {elapsed:.2f} ms, {len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,35 @@
 import uvicorn
+from uvicorn.supervisors import ChangeReload, Multiprocess
 
 from lakewatch.settings import settings
+from lakewatch.web.server import Server
 
 
 def main() -> None:
     """Entrypoint of the application."""
-    uvicorn.run(
+    config = uvicorn.Config(
         "lakewatch.web.application:get_app",
         workers=settings.workers_count,
         host=settings.host,
         port=settings.port,
         reload=settings.reload,
         log_level=settings.log_level.value.lower(),
+        ws_per_message_deflate=settings.ws_per_message_deflate,
         factory=True,
     )
+    # Like uvicorn.run, with a server that closes WebSockets gracefully
+    server = Server(config)
+    try:
+        if config.should_reload:
+            sockets = [config.bind_socket()]
+            ChangeReload(config, target=server.run, sockets=sockets).run()
+        elif config.workers > 1:
+            sockets = [config.bind_socket()]
+            Multiprocess(config, target=server.run, sockets=sockets).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
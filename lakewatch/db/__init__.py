@@ -0,0 +1,5 @@
+"""Database access for lakewatch."""
+
+from lakewatch.db.executor import Database, database
+
+__all__ = ["Database", "database"]
@@ -0,0 +1,260 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+from loguru import logger
+
+from lakewatch.db.migrations import apply_pragmas, migrate
+from lakewatch.settings import settings
+
+T = TypeVar("T")
+Params = Union[Sequence[Any], Mapping[str, Any]]
+
+
+class _Pool:
+    """Thread pool whose threads each own one SQLite connection."""
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        connect: Callable[[], sqlite3.Connection],
+    ) -> None:
+        self.name = name
+        self.size = size
+        self.depth = 0
+        self.peak_depth = 0
+        self._connect = connect
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._congested = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        return fn(self._connection())
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.size,
+                thread_name_prefix=f"lakewatch-db-{self.name}",
+            )
+        self.depth += 1
+        self.peak_depth = max(self.peak_depth, self.depth)
+        self._report_depth()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                self._call,
+                fn,
+            )
+        finally:
+            self.depth -= 1
+            self._report_depth()
+
+    def _report_depth(self) -> None:
+        warn_depth = settings.db_queue_warn_depth
+        if not self._congested and self.depth >= warn_depth:
+            self._congested = True
+            logger.warning(
+                f"Database {self.name} queue depth reached {self.depth} "
+                f"(pool size {self.size})",
+            )
+        elif self._congested and self.depth == 0:
+            self._congested = False
+            logger.info(
+                f"Database {self.name} queue drained (peak depth {self.peak_depth})",
+            )
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class Database:
+    """
+    Async access to the SQLite database.
+
+    All writes go through a single long-lived connection that lives on
+    its own thread, so they are serialized without blocking the event
+    loop. Reads run on a bounded pool of read-only connections. Both
+    sides are created lazily on first use.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        read_pool_size: Optional[int] = None,
+    ) -> None:
+        self._path = path
+        self._writer = _Pool("writer", 1, self._connect_writer)
+        self._readers = _Pool(
+            "reader",
+            read_pool_size or settings.db_read_pool_size,
+            self._connect_reader,
+        )
+
+    @property
+    def path(self) -> Path:
+        """Location of the database file."""
+        return Path(self._path or settings.db_file)
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        apply_pragmas(conn)
+        return conn
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"{self.path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        return conn
+
+    async def migrate(self) -> int:
+        """
+        Enable WAL and apply pending schema migrations.
+
+        :return: schema version after migrating.
+        """
+        return await self._writer.run(migrate)
+
+    async def execute(self, sql: str, params: Params = ()) -> int:
+        """
+        Run a single write statement in its own transaction.
+
+        :param sql: SQL statement.
+        :param params: statement parameters.
+        :return: number of affected rows.
+        """
+        return await self._writer.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql: str, seq: Iterable[Params]) -> int:
+        """
+        Run a write statement for every parameter set in one transaction.
+
+        :param sql: SQL statement.
+        :param seq: parameter sets.
+        :return: number of affected rows.
+        """
+        return await self.transaction(lambda conn: conn.executemany(sql, seq).rowcount)
+
+    async def transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run ``fn`` with the writer connection inside a transaction.
+
+        The transaction is committed when ``fn`` returns and rolled back
+        when it raises.
+
+        :param fn: callable receiving the writer connection.
+        :return: whatever ``fn`` returns.
+        """
+
+        def run(conn: sqlite3.Connection) -> T:
+            conn.execute("BEGIN")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+        return await self._writer.run(run)
+
+    async def fetch(self, sql: str, params: Params = ()) -> List[sqlite3.Row]:
+        """
+        Run a query on a read-only connection.
+
+        :param sql: SQL query.
+        :param params: query parameters.
+        :return: all resulting rows.
+        """
+        return await self._readers.run(
+            lambda conn: conn.execute(sql, params).fetchall(),
+        )
+
+    async def fetchone(
+        self,
+        sql: str,
+        params: Params = (),
+    ) -> Optional[sqlite3.Row]:
+        """
+        Run a query on a read-only connection and return the first row.
+
+        :param sql: SQL query.
+        :param params: query parameters.
+        :return: first row or None.
+        """
+        return await self._readers.run(
+            lambda conn: conn.execute(sql, params).fetchone(),
+        )
+
+    async def read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run ``fn`` with a read-only connection.
+
+        :param fn: callable receiving a reader connection.
+        :return: whatever ``fn`` returns.
+        """
+        return await self._readers.run(fn)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return queue-depth statistics of the writer and reader pools.
+
+        :return: current and peak queue depth of every pool.
+        """
+        return {
+            pool.name: {
+                "size": pool.size,
+                "queue_depth": pool.depth,
+                "peak_queue_depth": pool.peak_depth,
+            }
+            for pool in (self._writer, self._readers)
+        }
+
+    def close(self) -> None:
+        """Wait for pending work and close every connection."""
+        self._writer.close()
+        self._readers.close()
+
+
+database = Database()
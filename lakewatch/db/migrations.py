@@ -0,0 +1,234 @@
+import sqlite3
+from typing import List, NamedTuple, Sequence
+
+from loguru import logger
+
+from lakewatch.settings import settings
+
+
+class Migration(NamedTuple):
+    """Versioned schema change."""
+
+    version: int
+    description: str
+    statements: Sequence[str]
+
+
+# Append new migrations at the end with the next version number.
+# Never edit a migration that has already been released.
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create node_data and node_metadata",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS node_data (
+                node_id TEXT,
+                timestamp INTEGER,
+                temperature REAL,
+                ph REAL,
+                dissolved_oxygen REAL,
+                PRIMARY KEY (node_id, timestamp)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS node_metadata (
+                node_id TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                last_updated INTEGER,
+                maintenance_required INTEGER,
+                temperature REAL,
+                dissolved_oxygen REAL,
+                ph REAL,
+                FOREIGN KEY (node_id) REFERENCES node_data (node_id)
+            )
+            """,
+        ],
+    ),
+    Migration(
+        2,
+        "covering index for time-ranged readings",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS ix_node_data_node_timestamp
+            ON node_data (node_id, timestamp, temperature, ph, dissolved_oxygen)
+            """,
+        ],
+    ),
+    Migration(
+        3,
+        "minute, hour and day rollups of node_data",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS node_rollup_1m (
+                node_id TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                temperature_count INTEGER NOT NULL,
+                temperature_sum REAL NOT NULL,
+                temperature_min REAL,
+                temperature_max REAL,
+                ph_count INTEGER NOT NULL,
+                ph_sum REAL NOT NULL,
+                ph_min REAL,
+                ph_max REAL,
+                dissolved_oxygen_count INTEGER NOT NULL,
+                dissolved_oxygen_sum REAL NOT NULL,
+                dissolved_oxygen_min REAL,
+                dissolved_oxygen_max REAL,
+                PRIMARY KEY (node_id, bucket)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS node_rollup_1h (
+                node_id TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                temperature_count INTEGER NOT NULL,
+                temperature_sum REAL NOT NULL,
+                temperature_min REAL,
+                temperature_max REAL,
+                ph_count INTEGER NOT NULL,
+                ph_sum REAL NOT NULL,
+                ph_min REAL,
+                ph_max REAL,
+                dissolved_oxygen_count INTEGER NOT NULL,
+                dissolved_oxygen_sum REAL NOT NULL,
+                dissolved_oxygen_min REAL,
+                dissolved_oxygen_max REAL,
+                PRIMARY KEY (node_id, bucket)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS node_rollup_1d (
+                node_id TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                temperature_count INTEGER NOT NULL,
+                temperature_sum REAL NOT NULL,
+                temperature_min REAL,
+                temperature_max REAL,
+                ph_count INTEGER NOT NULL,
+                ph_sum REAL NOT NULL,
+                ph_min REAL,
+                ph_max REAL,
+                dissolved_oxygen_count INTEGER NOT NULL,
+                dissolved_oxygen_sum REAL NOT NULL,
+                dissolved_oxygen_min REAL,
+                dissolved_oxygen_max REAL,
+                PRIMARY KEY (node_id, bucket)
+            ) WITHOUT ROWID
+            """,
+        ],
+    ),
+    Migration(
+        4,
+        "alert history and per-node alert counters",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS alert_events (
+                id INTEGER PRIMARY KEY,
+                node_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                value REAL,
+                threshold REAL,
+                timestamp INTEGER NOT NULL
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_alert_events_node_metric_timestamp
+            ON alert_events (node_id, metric, timestamp)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_alert_events_timestamp
+            ON alert_events (timestamp)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS alert_counts (
+                node_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                last_timestamp INTEGER NOT NULL,
+                PRIMARY KEY (node_id, metric, kind, state)
+            ) WITHOUT ROWID
+            """,
+        ],
+    ),
+]
+
+
+def apply_pragmas(conn: sqlite3.Connection) -> None:
+    """
+    Apply per-connection performance pragmas.
+
+    :param conn: connection to tune.
+    """
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout_ms)}")
+    conn.execute(f"PRAGMA synchronous = {settings.db_synchronous.value}")
+    # A negative cache_size is expressed in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = -{int(settings.db_cache_size_kib)}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.db_mmap_size)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Get the schema version recorded in the database.
+
+    :param conn: database connection.
+    :return: current schema version, 0 for a fresh database.
+    """
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Enable WAL and bring the schema up to the latest version.
+
+    Fresh databases are also created with incremental auto-vacuum.
+
+    Each pending migration runs in its own transaction together with
+    the bump of ``PRAGMA user_version``, so an interrupted upgrade
+    resumes from the last completed step. Processes starting together
+    apply every migration once, the others find it done.
+
+    :param conn: writer connection in autocommit mode.
+    :return: schema version after migrating.
+    """
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        # Only possible before the first table exists. Lets retention hand
+        # pruned pages back to the file system with incremental_vacuum.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    if journal_mode.lower() != "wal":
+        logger.warning(f"Could not enable WAL, journal mode is {journal_mode}")
+
+    version = schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # Take the write lock first, another process may be migrating too
+        conn.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) >= migration.version:
+            conn.execute("COMMIT")
+            version = schema_version(conn)
+            continue
+        logger.info(
+            f"Applying migration {migration.version}: {migration.description}",
+        )
+        try:
+            for statement in migration.statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        version = migration.version
+    return version
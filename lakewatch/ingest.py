@@ -0,0 +1,292 @@
+"""
+Standalone ingest worker.
+
+Runs the RabbitMQ consumer, the batched ingest writer and the alert
+engine without the HTTP API, so bursts of readings do not slow down API
+requests and consumers scale independently of API workers::
+
+    python -m lakewatch.ingest --workers 4
+
+Every worker is a competing consumer of the same durable queue. Alert
+state and outlier windows are kept in memory, so every node is owned by
+one worker that checks all of its readings: committed readings of nodes
+owned by another worker are routed to it, see
+:class:`~lakewatch.services.routing.AlertRouter`.
+
+With ``LAKEWATCH_INGEST_METRICS_PORT`` set, worker N serves its metrics
+for Prometheus at ``/metrics`` on that port plus N.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+from types import FrameType
+from typing import Any, Dict, Optional, Sequence
+
+import aio_pika
+import uvicorn
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractQueue
+from fastapi import FastAPI
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.log import configure_logging
+from lakewatch.services.fanout import fanout
+from lakewatch.services.flow import flow_controller
+from lakewatch.services.messages import dead_letters
+from lakewatch.services.profiles import threshold_store
+from lakewatch.services.rabbitmq import process_message
+from lakewatch.services.retention import retention_worker
+from lakewatch.services.routing import alert_router
+from lakewatch.services.writer import ingest_writer
+from lakewatch.settings import settings
+from lakewatch.web import metrics
+
+
+class IngestService:
+    """
+    Consumes readings and hands them to the ingest writer.
+
+    Committed batches are checked for alerts and published to every
+    worker by the writer, so this is all a process needs to ingest.
+    """
+
+    def __init__(
+        self,
+        retention: bool = True,
+        index: int = 0,
+        workers: int = 1,
+    ) -> None:
+        self.retention = retention
+        self.index = index
+        self.workers = workers
+        self._channel: Optional[AbstractChannel] = None
+        self._queue: Optional[AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+        self._reporter: "Optional[asyncio.Task[None]]" = None
+
+    async def start(self, connection: AbstractConnection) -> None:
+        """
+        Start the writer and consume the ingest queue.
+
+        :param connection: RabbitMQ connection.
+        """
+        ingest_writer.start()
+        if self.retention:
+            retention_worker.start()
+
+        if self.workers > 1:
+            channel = await connection.channel()
+            await alert_router.start(channel, self.index, self.workers)
+        self._channel = await connection.channel()
+        self._queue = await self._channel.declare_queue(
+            settings.rabbitmq_queue,
+            durable=True,
+        )
+        await dead_letters.start(self._channel)
+        # Sets the prefetch before the first delivery and adapts it from then on
+        await flow_controller.start(self._channel, self._queue)
+        self._consumer_tag = await self._queue.consume(process_message)
+        logger.info(f"Consuming {settings.rabbitmq_queue}")
+        self._reporter = asyncio.create_task(self._report())
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop consuming, finish the messages in flight and flush the writer.
+
+        Messages already delivered are processed and acked while the
+        channel is still open, so they are not redelivered. Whatever is
+        not done within ``timeout`` is left to the broker to redeliver,
+        which ingest skips as duplicates if it was committed after all.
+
+        :param timeout: how long to wait for the messages in flight,
+            defaults to ``shutdown_timeout_seconds``.
+        """
+        if timeout is None:
+            timeout = settings.shutdown_timeout_seconds
+        if self._reporter is not None:
+            self._reporter.cancel()
+            self._reporter = None
+        if self._queue is not None and self._consumer_tag is not None:
+            await self._queue.cancel(self._consumer_tag)
+        # Slots are only released once the message has been acked
+        unfinished = await flow_controller.drain(timeout)
+        if unfinished:
+            logger.warning(f"Stopping with {unfinished} messages unfinished")
+        await flow_controller.stop()
+        dead_letters.stop()
+        if self._channel is not None:
+            await self._channel.close()
+        self._channel = None
+        self._queue = None
+        self._consumer_tag = None
+
+        await ingest_writer.stop()
+        logger.info("Ingest writer stopped")
+        # After the writer, whose last batches may still be routed
+        await alert_router.stop()
+        await retention_worker.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the ingest statistics of this worker.
+
+        :return: writer, database, retention, dead-letter and routing
+            statistics, keyed like the flow status of the worker.
+        """
+        return {
+            "worker": flow_controller.worker,
+            **ingest_writer.stats(),
+            "database": database.stats(),
+            "retention": retention_worker.stats(),
+            "dead_letters": dead_letters.stats(),
+            "routing": alert_router.stats(),
+        }
+
+    async def _report(self) -> None:
+        # Every API worker keeps them, whichever process ingests
+        while True:
+            await asyncio.sleep(flow_controller.interval)
+            try:
+                await fanout.publish("ingest", self.stats())
+            except Exception as e:
+                logger.error(f"Error reporting ingest statistics: {e}")
+
+
+def metrics_server(port: int) -> uvicorn.Server:
+    """
+    Build the server answering scrapes of the metrics of this worker.
+
+    :param port: port to listen on.
+    :return: uvicorn server of an app with only the ``/metrics`` route.
+    """
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    app.include_router(metrics.router)
+    config = uvicorn.Config(
+        app,
+        host=settings.host,
+        port=port,
+        lifespan="off",
+        access_log=False,
+        log_config=None,
+    )
+    return uvicorn.Server(config)
+
+
+async def run(index: int, stopping: asyncio.Event, workers: int = 1) -> None:
+    """
+    Run one ingest worker until ``stopping`` is set.
+
+    :param index: worker number, only the first one prunes old readings.
+    :param stopping: set to shut the worker down.
+    :param workers: number of workers, nodes are split between them.
+    """
+    version = await database.migrate()
+    logger.info(f"Database schema at version {version}")
+    threshold_store.load(threshold_store.read())
+
+    connection = await aio_pika.connect_robust(
+        host=settings.rabbitmq_host,
+        port=settings.rabbitmq_port,
+    )
+    # Alerts and committed readings reach the API workers through the fan-out
+    await fanout.start(await connection.channel(publisher_confirms=False))
+    service = IngestService(retention=index == 0, index=index, workers=workers)
+    scrapes: Optional[uvicorn.Server] = None
+    serving: "Optional[asyncio.Task[None]]" = None
+    try:
+        await service.start(connection)
+        if settings.ingest_metrics_port:
+            port = settings.ingest_metrics_port + index
+            scrapes = metrics_server(port)
+            # Uvicorn hands SIGINT and SIGTERM back to the loop once it stopped
+            serving = asyncio.create_task(scrapes.serve())
+            logger.info(f"Serving metrics on {settings.host}:{port}")
+        logger.info(f"Ingest worker {index} started")
+        await stopping.wait()
+    finally:
+        if scrapes is not None and serving is not None:
+            scrapes.should_exit = True
+            await serving
+        await service.stop()
+        await fanout.stop()
+        await connection.close()
+        database.close()
+        logger.info(f"Ingest worker {index} stopped")
+
+
+async def serve(index: int, workers: int = 1) -> None:
+    """
+    Run one ingest worker until it receives SIGINT or SIGTERM.
+
+    :param index: worker number.
+    :param workers: number of workers.
+    """
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await run(index, stopping, workers)
+
+
+def work(index: int, workers: int = 1) -> None:
+    """
+    Entrypoint of an ingest worker process.
+
+    :param index: worker number.
+    :param workers: number of workers.
+    """
+    configure_logging()
+    asyncio.run(serve(index, workers))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Start the ingest workers.
+
+    :param argv: command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m lakewatch.ingest",
+        description="Consume sensor readings from RabbitMQ without the HTTP API.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.ingest_workers,
+        help="Number of worker processes consuming the queue.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        work(0)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=work,
+            args=(index, args.workers),
+            name=f"lakewatch-ingest-{index}",
+        )
+        for index in range(args.workers)
+    ]
+
+    def terminate(signum: int, frame: Optional[FrameType]) -> None:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGINT, terminate)
+    signal.signal(signal.SIGTERM, terminate)
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    if any(process.exitcode for process in processes):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
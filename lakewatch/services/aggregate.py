@@ -0,0 +1,172 @@
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from lakewatch.db import database
+from lakewatch.services.readings import METRICS, BucketSize, Metric
+from lakewatch.services.rollup import ROLLUP_TABLES
+
+
+def _aggregate_query(table: str) -> str:
+    columns = ",\n        ".join(
+        f"MIN({metric}_min) AS {metric}_min, "
+        f"MAX({metric}_max) AS {metric}_max, "
+        f"SUM({metric}_sum) / SUM({metric}_count) AS {metric}_mean"
+        for metric in METRICS
+    )
+    return f"""
+    SELECT
+        (bucket / :width) * :width AS bucket,
+        SUM(count) AS count,
+        {columns}
+    FROM {table}
+    WHERE node_id = :node_id AND bucket >= :lower AND bucket <= :upper
+    GROUP BY 1
+    ORDER BY 1
+    """
+
+
+def rollup_source(bucket: BucketSize) -> BucketSize:
+    """
+    Pick the coarsest rollup table that can produce the requested buckets.
+
+    :param bucket: requested bucket size.
+    :return: bucket size of the rollup table to read.
+    """
+    return max(
+        (size for size in ROLLUP_TABLES if bucket.seconds % size.seconds == 0),
+        key=lambda size: size.seconds,
+    )
+
+
+AGGREGATE_QUERY = {
+    size: _aggregate_query(table) for size, table in ROLLUP_TABLES.items()
+}
+
+
+async def aggregate_readings(
+    node_id: str,
+    bucket: BucketSize,
+    lower: int,
+    upper: int,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate the readings of a node into fixed time buckets.
+
+    Buckets are aligned to the Unix epoch, so they line up across
+    nodes and requests, and are read from the pre-aggregated rollup
+    tables instead of the raw readings. Every bucket overlapping the
+    range is returned whole. Empty buckets are omitted.
+
+    :param node_id: node identifier.
+    :param bucket: bucket size.
+    :param lower: first timestamp, inclusive.
+    :param upper: last timestamp, inclusive.
+    :return: min, max, mean and count of every metric per bucket.
+    """
+    width = bucket.seconds
+    rows = await database.fetch(
+        AGGREGATE_QUERY[rollup_source(bucket)],
+        {
+            "width": width,
+            "node_id": node_id,
+            "lower": (lower // width) * width,
+            "upper": upper,
+        },
+    )
+    return [
+        {
+            "bucket": row["bucket"],
+            "count": row["count"],
+            **{
+                metric: {
+                    "min": row[f"{metric}_min"],
+                    "max": row[f"{metric}_max"],
+                    "mean": row[f"{metric}_mean"],
+                }
+                for metric in METRICS
+            },
+        }
+        for row in rows
+    ]
+
+
+def lttb(
+    x: NDArray[np.float64],
+    y: NDArray[np.float64],
+    threshold: int,
+) -> NDArray[np.int64]:
+    """
+    Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The remaining points are
+    split into ``threshold - 2`` buckets and from each the point forming
+    the largest triangle with the previously selected point and the
+    average of the next bucket is kept, which preserves the visual shape
+    of the series.
+
+    :param x: ascending x values.
+    :param y: y values.
+    :param threshold: number of points to keep.
+    :return: indices of the selected points.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_stop = max(next_stop, stop + 1)
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (avg_y - y[previous]),
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def load_series(
+    conn: sqlite3.Connection,
+    node_id: str,
+    metric: Metric,
+    lower: int,
+    upper: int,
+    max_points: int,
+) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """
+    Load one metric of a node into NumPy arrays.
+
+    :param conn: reader connection.
+    :param node_id: node identifier.
+    :param metric: metric to load.
+    :param lower: first timestamp, inclusive.
+    :param upper: last timestamp, inclusive.
+    :param max_points: maximum number of readings to load.
+    :return: timestamps and values, at most ``max_points + 1`` of them.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"""
+        SELECT timestamp, {metric.value}
+        FROM node_data
+        WHERE node_id = ? AND timestamp >= ? AND timestamp <= ?
+        AND {metric.value} IS NOT NULL
+        ORDER BY timestamp
+        LIMIT ?
+        """,  # noqa: S608
+        (node_id, lower, upper, max_points + 1),
+    )
+    series = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+    return series[:, 0], series[:, 1]
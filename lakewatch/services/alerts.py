@@ -0,0 +1,305 @@
+import enum
+import time
+from typing import Any, Dict, KeysView, NamedTuple, Optional, Tuple
+
+from lakewatch.settings import settings
+
+
+class AlertKind(str, enum.Enum):
+    """What raised an alert."""
+
+    THRESHOLD = "threshold"
+    OUTLIER = "outlier"
+    MAINTENANCE = "maintenance"
+
+
+class AlertState(str, enum.Enum):
+    """Lifecycle of an alert."""
+
+    OPEN = "open"
+    ONGOING = "ongoing"
+    RESOLVED = "resolved"
+
+
+AlertKey = Tuple[str, str, AlertKind]
+
+
+class AlertEvent(NamedTuple):
+    """Row of the alert history."""
+
+    node_id: str
+    metric: str
+    kind: str
+    state: str
+    value: Optional[float]
+    threshold: Optional[float]
+    timestamp: int
+
+
+class Transition(NamedTuple):
+    """A change of an alert that clients should be told about."""
+
+    state: AlertState
+    node_id: str
+    metric: str
+    kind: AlertKind
+    value: Any
+    readings: int
+    since: float
+    at: float
+
+    def event(
+        self,
+        timestamp: Optional[int],
+        threshold: Optional[float] = None,
+    ) -> AlertEvent:
+        """
+        Build the alert history row of this transition.
+
+        :param timestamp: timestamp of the reading that caused it, defaults
+            to the time of the transition.
+        :param threshold: threshold the value was checked against.
+        :return: row to persist.
+        """
+        return AlertEvent(
+            self.node_id,
+            self.metric,
+            self.kind.value,
+            self.state.value,
+            self.value,
+            threshold,
+            timestamp if timestamp is not None else int(self.at),
+        )
+
+
+class _Alert:
+    __slots__ = (
+        "state",
+        "count",
+        "since",
+        "clear_streak",
+        "notified",
+        "last_opened",
+        "last_notified",
+    )
+
+    def __init__(self) -> None:
+        self.state = AlertState.RESOLVED
+        self.count = 0
+        self.since = 0.0
+        self.clear_streak = 0
+        self.notified = False
+        self.last_opened: Optional[float] = None
+        self.last_notified = 0.0
+
+
+class AlertEngine:
+    """
+    Turns per-reading checks into alert state transitions.
+
+    Every node, metric and kind of alert has its own state. A breach
+    opens the alert and notifies clients once; further breaches only
+    keep it ongoing. A digest of an ongoing alert is emitted at most
+    every ``digest_interval`` seconds. The alert resolves after
+    ``clear_count`` consecutive cleared readings. Callers pass a stricter
+    condition for clearing than for breaching, such as a threshold
+    lowered by the ``hysteresis`` ratio, so values hovering around a
+    threshold do not flap. An alert that opens again within
+    ``cooldown`` seconds of when it last opened is tracked silently,
+    together with its resolution. If it is still not resolved once the
+    cooldown has passed, it is notified as opened then.
+    """
+
+    def __init__(
+        self,
+        cooldown: Optional[float] = None,
+        digest_interval: Optional[float] = None,
+        clear_count: Optional[int] = None,
+        hysteresis: Optional[float] = None,
+    ) -> None:
+        self.cooldown = (
+            cooldown if cooldown is not None else settings.alert_cooldown_seconds
+        )
+        self.digest_interval = digest_interval or settings.alert_digest_seconds
+        self.clear_count = clear_count or settings.alert_clear_count
+        self.hysteresis = (
+            hysteresis if hysteresis is not None else settings.alert_hysteresis
+        )
+        self.emitted: Dict[str, int] = {state.value: 0 for state in AlertState}
+        self.suppressed = 0
+        self._alerts: Dict[AlertKey, _Alert] = {}
+        # Number of alerts that are not resolved per node
+        self._active: Dict[str, int] = {}
+
+    def clear(self) -> None:
+        """Forget the state of every alert."""
+        self._alerts.clear()
+        self._active.clear()
+
+    def active_nodes(self) -> KeysView[str]:
+        """
+        Get the nodes with at least one alert that is not resolved.
+
+        :return: node identifiers.
+        """
+        return self._active.keys()
+
+    def observe(
+        self,
+        node_id: str,
+        metric: str,
+        kind: AlertKind,
+        value: Any,
+        breached: bool,
+        cleared: bool,
+        now: Optional[float] = None,
+    ) -> Optional[Transition]:
+        """
+        Update an alert with the result of a check.
+
+        :param node_id: node identifier.
+        :param metric: checked reading.
+        :param kind: what raised the alert.
+        :param value: checked value.
+        :param breached: whether the value raises the alert.
+        :param cleared: whether the value counts towards resolving it.
+        :param now: current time, defaults to the wall clock.
+        :return: the transition to notify clients of, if any.
+        """
+        now = now if now is not None else time.time()
+        key = (node_id, metric, kind)
+        alert = self._alerts.get(key)
+        if alert is None:
+            if not breached:
+                return None
+            alert = self._alerts[key] = _Alert()
+
+        state: Optional[AlertState] = None
+        if breached:
+            state = self._breach(node_id, alert, now)
+        elif cleared and alert.state is not AlertState.RESOLVED:
+            state = self._clear(node_id, alert)
+        elif alert.state is not AlertState.RESOLVED:
+            alert.clear_streak = 0
+
+        if state is None:
+            if breached:
+                self.suppressed += 1
+            return None
+        alert.last_notified = now
+        self.emitted[state.value] += 1
+        return Transition(
+            state,
+            node_id,
+            metric,
+            kind,
+            value,
+            alert.count,
+            alert.since,
+            now,
+        )
+
+    def _breach(
+        self,
+        node_id: str,
+        alert: _Alert,
+        now: float,
+    ) -> Optional[AlertState]:
+        alert.clear_streak = 0
+        alert.count += 1
+        if alert.state is AlertState.RESOLVED:
+            self._active[node_id] = self._active.get(node_id, 0) + 1
+            alert.state = AlertState.OPEN
+            alert.count = 1
+            alert.since = now
+            alert.notified = False
+        else:
+            alert.state = AlertState.ONGOING
+        if not alert.notified:
+            # Opened during the cooldown, notified once it has passed
+            if (
+                alert.last_opened is not None
+                and now - alert.last_opened < self.cooldown
+            ):
+                return None
+            alert.notified = True
+            alert.last_opened = now
+            return AlertState.OPEN
+        if now - alert.last_notified >= self.digest_interval:
+            return AlertState.ONGOING
+        return None
+
+    def _clear(self, node_id: str, alert: _Alert) -> Optional[AlertState]:
+        alert.clear_streak += 1
+        if alert.clear_streak < self.clear_count:
+            return None
+        alert.state = AlertState.RESOLVED
+        self._active[node_id] -= 1
+        if not self._active[node_id]:
+            del self._active[node_id]
+        return AlertState.RESOLVED if alert.notified else None
+
+    def clear_below(self, threshold: float) -> float:
+        """
+        Get the value a reading must not exceed to clear a threshold alert.
+
+        :param threshold: upper limit that opens the alert.
+        :return: threshold lowered by the hysteresis margin.
+        """
+        return threshold - abs(threshold) * self.hysteresis
+
+    def clear_above(self, threshold: float) -> float:
+        """
+        Get the value a reading must reach to clear a low threshold alert.
+
+        :param threshold: lower limit that opens the alert.
+        :return: threshold raised by the hysteresis margin.
+        """
+        return threshold + abs(threshold) * self.hysteresis
+
+    def state(self, node_id: str, metric: str, kind: AlertKind) -> AlertState:
+        """
+        Get the current state of an alert.
+
+        :param node_id: node identifier.
+        :param metric: checked reading.
+        :param kind: what raised the alert.
+        :return: its state, resolved if it never opened.
+        """
+        alert = self._alerts.get((node_id, metric, kind))
+        return alert.state if alert is not None else AlertState.RESOLVED
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return alert engine statistics.
+
+        :return: open alerts, notifications per state and suppressed breaches.
+        """
+        return {
+            "active": sum(self._active.values()),
+            "emitted": dict(self.emitted),
+            "suppressed": self.suppressed,
+        }
+
+
+def describe(transition: Transition, breach: str, label: str) -> str:
+    """
+    Render the alert text of a transition.
+
+    :param transition: alert transition.
+    :param breach: text of the breach, e.g. "pH threshold exceeded".
+    :param label: human readable name of the metric.
+    :return: message for clients.
+    """
+    if transition.state is AlertState.OPEN:
+        return f"{breach}: {transition.value}"
+    if transition.state is AlertState.ONGOING:
+        minutes = int(transition.at - transition.since) // 60
+        return (
+            f"{breach}: {transition.value} "
+            f"(ongoing for {minutes} min, {transition.readings} readings)"
+        )
+    return f"{label} back to normal: {transition.value}"
+
+
+alert_engine = AlertEngine()
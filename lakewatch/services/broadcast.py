@@ -0,0 +1,306 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket, status
+from loguru import logger
+
+from lakewatch.services.metrics import Gauge, Histogram, registry
+from lakewatch.services.subscriptions import Subscription, SubscriptionIndex
+from lakewatch.settings import SlowConsumerPolicy, settings
+
+DELIVERY_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class Client:
+    """
+    A WebSocket connection with its own bounded outbound queue.
+
+    Messages are sent by a dedicated writer task, so a slow connection
+    only ever delays its own messages.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int) -> None:
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.connected_at = time.time()
+        self._pending: Deque[Tuple[float, str]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def offer(self, message: str, now: float) -> bool:
+        """
+        Queue a message unless the queue is full.
+
+        :param message: message to send.
+        :param now: monotonic time the message was published.
+        :return: whether the message was queued.
+        """
+        if len(self._pending) >= self.queue_size:
+            return False
+        self._pending.append((now, message))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def drop_oldest(self) -> None:
+        """Discard the oldest queued message to make room for a new one."""
+        self._pending.popleft()
+        self.dropped += 1
+
+    def lag(self, now: float) -> float:
+        """
+        Get how long the oldest queued message has been waiting.
+
+        :param now: current monotonic time.
+        :return: age of the oldest queued message in seconds.
+        """
+        return now - self._pending[0][0] if self._pending else 0.0
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        """
+        Return delivery statistics of this client.
+
+        :param now: current monotonic time.
+        :return: queue depth, lag and message counters.
+        """
+        return {
+            "connected_at": int(self.connected_at),
+            "queued": len(self._pending),
+            "lag_seconds": self.lag(now),
+            "last_lag_seconds": self.last_lag,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+    async def drained(self) -> None:
+        """Wait until every queued message was sent or sending failed."""
+        if self._task is None:
+            return
+        idle = asyncio.ensure_future(self._idle.wait())
+        try:
+            await asyncio.wait({idle, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            idle.cancel()
+
+    async def _next(self) -> Tuple[float, str]:
+        while not self._pending:
+            self._idle.set()
+            self._ready.clear()
+            await self._ready.wait()
+        return self._pending.popleft()
+
+
+class Broadcaster:
+    """
+    Fans messages out to every connected WebSocket client.
+
+    Publishing only appends to the bounded queue of every subscribed
+    client and never awaits a connection. Alerts are routed through a
+    subscription index, so only clients whose subscription matches are
+    visited. When a client's queue is full, either its oldest message is
+    dropped or the client is disconnected, depending on ``policy``.
+    ``feed`` labels the metrics of the broadcaster.
+    """
+
+    def __init__(
+        self,
+        queue_size: Optional[int] = None,
+        policy: Optional[SlowConsumerPolicy] = None,
+        send_timeout: Optional[float] = None,
+        feed: str = "alerts",
+    ) -> None:
+        self.queue_size = queue_size or settings.ws_queue_size
+        self.policy = policy or settings.ws_slow_consumer_policy
+        self.send_timeout = send_timeout or settings.ws_send_timeout_seconds
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.delivery_lag = Histogram(
+            "lakewatch_ws_delivery_lag_seconds",
+            "Time from publishing a message to sending it to a client.",
+            DELIVERY_LAG_BUCKETS,
+            labels={"feed": feed},
+        )
+        self.connections = Gauge(
+            "lakewatch_ws_connections",
+            "WebSocket clients currently connected.",
+            labels={"feed": feed},
+            function=self.__len__,
+        )
+        self._clients: Set[Client] = set()
+        self._index: SubscriptionIndex[Client] = SubscriptionIndex()
+        self._closing: Set["asyncio.Task[None]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def connect(self, websocket: WebSocket) -> Client:
+        """
+        Register an accepted WebSocket and start its writer task.
+
+        :param websocket: accepted connection.
+        :return: the registered client.
+        """
+        client = Client(websocket, self.queue_size)
+        client._task = asyncio.create_task(self._write(client))  # noqa: SLF001
+        self._clients.add(client)
+        self._index.add(client, Subscription())
+        return client
+
+    def subscribe(self, client: Client, subscription: Subscription) -> None:
+        """
+        Replace the subscription of a connected client.
+
+        :param client: connected client.
+        :param subscription: alerts to deliver to it.
+        """
+        if client in self._clients:
+            self._index.add(client, subscription)
+
+    async def disconnect(
+        self,
+        client: Client,
+        code: Optional[int] = None,
+    ) -> None:
+        """
+        Unregister a client and stop its writer task.
+
+        :param client: client to remove.
+        :param code: close code to send, or None if the peer is already gone.
+        """
+        self._forget(client)
+        task = client._task  # noqa: SLF001
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        if code is not None:
+            try:
+                await asyncio.wait_for(
+                    client.websocket.close(code=code),
+                    self.send_timeout,
+                )
+            except Exception as e:
+                logger.debug(f"Failed to close WebSocket: {e}")
+
+    def publish(self, message: str, alert: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Queue a message for every subscribed client.
+
+        :param message: message to send.
+        :param alert: alert metadata matched against the subscriptions, or
+            None to send the message to every client.
+        :return: number of clients the message was queued for.
+        """
+        now = time.monotonic()
+        clients = self._index.match(alert) if alert is not None else self._clients
+        queued = sum(self._enqueue(client, message, now) for client in list(clients))
+        self.published += 1
+        return queued
+
+    def send(self, client: Client, message: str) -> bool:
+        """
+        Queue a message for a single client, behind its pending alerts.
+
+        :param client: connected client.
+        :param message: message to send.
+        :return: whether the message was queued.
+        """
+        return self._enqueue(client, message, time.monotonic())
+
+    def _enqueue(self, client: Client, message: str, now: float) -> bool:
+        if client.offer(message, now):
+            return True
+        self.dropped += 1
+        if self.policy is SlowConsumerPolicy.DROP_OLDEST:
+            client.drop_oldest()
+            return client.offer(message, now)
+        logger.warning("Disconnecting WebSocket client that fell behind")
+        self.disconnected += 1
+        self._forget(client)
+        self._spawn(self.disconnect(client, status.WS_1013_TRY_AGAIN_LATER))
+        return False
+
+    def _forget(self, client: Client) -> None:
+        self._clients.discard(client)
+        self._index.remove(client)
+
+    async def close(self, timeout: float = 0) -> None:
+        """
+        Disconnect every client with a going-away close code.
+
+        :param timeout: how long to wait for clients to receive the
+            messages still queued for them first.
+        """
+        clients = list(self._clients)
+        if timeout > 0 and clients:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(client.drained() for client in clients)),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Closing WebSockets with messages still queued")
+        await asyncio.gather(
+            *(
+                self.disconnect(client, status.WS_1001_GOING_AWAY)
+                for client in list(self._clients)
+            ),
+        )
+        if self._closing:
+            await asyncio.gather(*self._closing)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return fan-out statistics.
+
+        :return: totals, delivery lag histogram and per-client statistics.
+        """
+        now = time.monotonic()
+        clients: List[Dict[str, Any]] = [client.stats(now) for client in self._clients]
+        return {
+            "policy": self.policy.value,
+            "queue_size": self.queue_size,
+            "connections": len(clients),
+            "published": self.published,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+            "max_lag_seconds": max((c["lag_seconds"] for c in clients), default=0.0),
+            "delivery_lag": self.delivery_lag.snapshot(),
+            "clients": clients,
+        }
+
+    def _spawn(self, coro: "Coroutine[Any, Any, None]") -> None:
+        task = asyncio.create_task(coro)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _write(self, client: Client) -> None:
+        try:
+            while True:
+                published, message = await client._next()  # noqa: SLF001
+                await asyncio.wait_for(
+                    client.websocket.send_text(message),
+                    self.send_timeout,
+                )
+                client.last_lag = time.monotonic() - published
+                client.sent += 1
+                self.delivery_lag.observe(client.last_lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send message: {e}")
+            self.disconnected += 1
+            self._forget(client)
+            self._spawn(self.disconnect(client, status.WS_1011_INTERNAL_ERROR))
+
+
+broadcaster = Broadcaster()
+registry.register(broadcaster.connections, broadcaster.delivery_lag)
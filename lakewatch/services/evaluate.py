@@ -0,0 +1,493 @@
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from lakewatch.services.alerts import (
+    AlertEngine,
+    AlertKind,
+    AlertState,
+    Transition,
+    alert_engine,
+)
+from lakewatch.services.metrics import ingest_stage
+from lakewatch.services.outlier import OutlierDetector, outlier_detector
+from lakewatch.services.profiles import (
+    THRESHOLD_METRICS,
+    ThresholdTable,
+    threshold_store,
+)
+from lakewatch.services.readings import METRICS
+from lakewatch.services.threshold import notify
+
+# Maintenance flag of readings that do not report one
+NO_FLAG = -1
+
+threshold_seconds = ingest_stage("threshold")
+outlier_seconds = ingest_stage("outlier")
+
+
+class ReadingBatch(NamedTuple):
+    """Committed readings laid out as arrays, one row per reading."""
+
+    readings: List[Dict[str, Any]]
+    node_ids: List[str]
+    node_index: NDArray[np.int64]
+    values: NDArray[np.float64]
+    maintenance: NDArray[np.int64]
+
+    @classmethod
+    def from_readings(cls, readings: List[Dict[str, Any]]) -> "ReadingBatch":
+        """
+        Convert readings into arrays.
+
+        :param readings: sensor readings in arrival order.
+        :return: batch with a column per metric with thresholds, NaN where
+            a value is missing.
+        """
+        nodes: Dict[str, int] = {}
+        node_index = np.fromiter(
+            (nodes.setdefault(data["node_id"], len(nodes)) for data in readings),
+            dtype=np.int64,
+            count=len(readings),
+        )
+        values = np.array(
+            [[data.get(metric) for metric in THRESHOLD_METRICS] for data in readings],
+            dtype=np.float64,
+        ).reshape(len(readings), len(THRESHOLD_METRICS))
+        maintenance = np.fromiter(
+            (
+                (
+                    NO_FLAG
+                    if data.get("maintenance_required") is None
+                    else data["maintenance_required"]
+                )
+                for data in readings
+            ),
+            dtype=np.int64,
+            count=len(readings),
+        )
+        return cls(readings, list(nodes), node_index, values, maintenance)
+
+
+class Evaluation(NamedTuple):
+    """Checks of every reading and metric of a batch."""
+
+    breached: NDArray[np.bool_]
+    cleared: NDArray[np.bool_]
+    # Bound every value is checked against, NaN for unchecked metrics
+    thresholds: NDArray[np.float64]
+    outliers: NDArray[np.bool_]
+
+
+class AlertRecord(NamedTuple):
+    """Result of one check that the alert engine has to see."""
+
+    row: int
+    node_id: str
+    metric: str
+    kind: AlertKind
+    value: Any
+    threshold: Optional[float]
+    breached: bool
+    cleared: bool
+
+
+def group_rows(
+    node_index: NDArray[np.int64],
+    nodes: int,
+) -> Tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Group rows by node, keeping their order within each node.
+
+    :param node_index: node of every row.
+    :param nodes: number of nodes.
+    :return: row order, start of every node's group in that order and
+        rank of every row within its node.
+    """
+    order = np.argsort(node_index, kind="stable")
+    counts = np.bincount(node_index, minlength=nodes)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    rank = np.empty(len(node_index), dtype=np.int64)
+    rank[order] = np.arange(len(node_index)) - np.repeat(starts, counts)
+    return order, starts, rank
+
+
+def rolling_outliers(
+    values: NDArray[np.float64],
+    node_index: NDArray[np.int64],
+    histories: Sequence[Sequence[float]],
+    window: int,
+    factor: float,
+    min_history: int,
+) -> NDArray[np.bool_]:
+    """
+    Check every value against the window of values before it.
+
+    The window of a value holds the last ``window`` values of its node,
+    taken from ``histories`` and from the rows of the same node earlier
+    in the batch. All windows are gathered into one matrix, so the
+    whole batch is checked at once.
+
+    :param values: values of a single metric, all present.
+    :param node_index: node of every value.
+    :param histories: values each node had before the batch, oldest first.
+    :param window: window size.
+    :param factor: allowed deviation from the mean in half-ranges.
+    :param min_history: values a window needs before it is checked.
+    :return: whether each value is an outlier.
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.bool_)
+    nodes = len(histories)
+    order, starts, rank = group_rows(node_index, nodes)
+    counts = np.bincount(node_index, minlength=nodes)
+
+    # Every node gets a segment of ``window`` slots of history, padded with
+    # NaN at the front, followed by its values in this batch.
+    padded = np.full((nodes, window), np.nan)
+    for node, history in enumerate(histories):
+        if len(history):
+            tail = list(history)[-window:]
+            padded[node, window - len(tail) :] = tail
+    segment_starts = starts + np.arange(nodes) * window
+    series = np.empty(len(values) + nodes * window)
+    history_slots = segment_starts[:, None] + np.arange(window)
+    series[history_slots.ravel()] = padded.ravel()
+    series[np.repeat(segment_starts + window, counts) + rank[order]] = values[order]
+
+    windows = series[(segment_starts[node_index] + rank)[:, None] + np.arange(window)]
+    present = ~np.isnan(windows)
+    seen = present.sum(axis=1)
+    mean = np.where(present, windows, 0.0).sum(axis=1) / np.maximum(seen, 1)
+    low = np.where(present, windows, np.inf).min(axis=1)
+    high = np.where(present, windows, -np.inf).max(axis=1)
+    with np.errstate(invalid="ignore"):
+        deviates = np.abs(values - mean) > factor * (high - low) / 2
+    return (seen >= min_history) & deviates
+
+
+def check_thresholds(
+    batch: ReadingBatch,
+    table: Optional[ThresholdTable] = None,
+    hysteresis: Optional[float] = None,
+) -> Tuple[NDArray[np.bool_], NDArray[np.bool_], NDArray[np.float64]]:
+    """
+    Check every value of a batch against the bounds of its node.
+
+    :param batch: committed readings.
+    :param table: thresholds of every node, defaults to the loaded ones.
+    :param hysteresis: ratio inside the bounds that clears an alert.
+    :return: breached and cleared flags and the bound every value is
+        checked against, per reading and metric.
+    """
+    table = table or threshold_store.table
+    ratio = hysteresis if hysteresis is not None else alert_engine.hysteresis
+    rows = table.rows(batch.node_ids)[batch.node_index]
+    low, high = table.low[rows], table.high[rows]
+    values = batch.values
+    with np.errstate(invalid="ignore"):
+        # Open bounds are infinite and never breached nor moved by hysteresis
+        low_clear = np.where(np.isfinite(low), low + np.abs(low) * ratio, low)
+        high_clear = np.where(np.isfinite(high), high - np.abs(high) * ratio, high)
+        breached = (values > high) | (values < low)
+        cleared = (values <= high_clear) & (values >= low_clear)
+    bounded_low = np.where(np.isfinite(low), low, np.nan)
+    thresholds = np.where(
+        (values < low) | ~np.isfinite(high),
+        bounded_low,
+        high,
+    )
+    return breached, cleared, thresholds
+
+
+async def evaluate(
+    batch: ReadingBatch,
+    detector: OutlierDetector = outlier_detector,
+    table: Optional[ThresholdTable] = None,
+    hysteresis: Optional[float] = None,
+) -> Evaluation:
+    """
+    Check thresholds and rolling windows of a whole batch at once.
+
+    The windows of the detector are extended with the batch afterwards,
+    exactly as if the readings had been checked one by one.
+
+    :param batch: committed readings.
+    :param detector: holds the window of every node.
+    :param table: thresholds of every node, defaults to the loaded ones.
+    :param hysteresis: ratio inside the bounds that clears an alert.
+    :return: breached, cleared and outlier flags per reading and metric.
+    """
+    started = time.perf_counter()
+    breached, cleared, thresholds = check_thresholds(batch, table, hysteresis)
+    values = batch.values
+    checked = time.perf_counter()
+    threshold_seconds.observe(checked - started)
+
+    first: Dict[int, int] = {}
+    for row, node in enumerate(batch.node_index.tolist()):
+        first.setdefault(node, row)
+    windows = await detector.node_windows(
+        [
+            (node_id, batch.readings[first[node]].get("timestamp"))
+            for node, node_id in enumerate(batch.node_ids)
+        ],
+    )
+
+    outliers = np.zeros((len(values), len(METRICS)), dtype=np.bool_)
+    for column, metric in enumerate(METRICS):
+        present = np.flatnonzero(~np.isnan(values[:, column]))
+        metric_values = values[present, column]
+        metric_nodes = batch.node_index[present]
+        histories = [window.values[metric] for window in windows]
+        outliers[present, column] = rolling_outliers(
+            metric_values,
+            metric_nodes,
+            histories,
+            detector.window,
+            detector.factor,
+            detector.min_history,
+        )
+        order, starts, _ = group_rows(metric_nodes, len(windows))
+        grouped = np.split(metric_values[order], starts[1:])
+        for history, new in zip(histories, grouped):
+            history.extend(new.tolist())  # type: ignore[attr-defined]
+    outlier_seconds.observe(time.perf_counter() - checked)
+    return Evaluation(breached, cleared, thresholds, outliers)
+
+
+def relevant_rows(
+    node_index: NDArray[np.int64],
+    breached: NDArray[np.bool_],
+    cleared: NDArray[np.bool_],
+    active: NDArray[np.bool_],
+    clear_count: int,
+) -> NDArray[np.bool_]:
+    """
+    Find the checks of a single metric and kind that can change an alert.
+
+    A check of a resolved alert only matters if it breaches. After a
+    breach, or from the start of the batch if the alert was open already,
+    every check matters until ``clear_count`` consecutive cleared checks
+    have been seen, by which time the alert is resolved again. The
+    result may include a few checks past the resolution, which the
+    engine ignores.
+
+    :param node_index: node of every check.
+    :param breached: whether each check breaches.
+    :param cleared: whether each check counts towards resolving.
+    :param active: whether the alert of each node is open before the batch.
+    :param clear_count: consecutive cleared checks that resolve an alert.
+    :return: whether each check has to be passed to the alert engine.
+    """
+    rows = len(node_index)
+    if not rows:
+        return np.zeros(0, dtype=np.bool_)
+    order, starts, rank = group_rows(node_index, len(active))
+    position = np.arange(rows)
+    first = position - rank[order]
+    breached = breached[order]
+    cleared = cleared[order]
+
+    # Length of the run of cleared checks ending at every check of a node
+    reset = np.where(cleared, np.where(position == first, first - 1, -1), position)
+    streak = position - np.maximum.accumulate(reset)
+    resolved = np.cumsum(streak == clear_count)
+    resolved_before = resolved - (streak == clear_count)
+
+    # Checks matter from the last breach, or the start of an open alert
+    opened = active[node_index[order]] & (position == first)
+    anchor = np.where(breached | opened, position, -1)
+    last = np.maximum.accumulate(anchor)
+    anchored = last >= first
+    since = np.where(anchored, last, 0)
+    relevant = anchored & (resolved_before == resolved_before[since])
+
+    result = np.empty(rows, dtype=np.bool_)
+    result[order] = relevant
+    return result
+
+
+def alert_records(
+    batch: ReadingBatch,
+    evaluation: Evaluation,
+    engine: AlertEngine = alert_engine,
+) -> List[AlertRecord]:
+    """
+    Select the checks that can change the state of an alert.
+
+    Every other check would be a no-op for the engine, so in a batch
+    without breaches nothing is left to do in Python.
+
+    :param batch: committed readings.
+    :param evaluation: checks of the batch.
+    :param engine: alert engine the records are meant for.
+    :return: records in the order the per-message path checks them.
+    """
+    columns: List[Tuple[str, AlertKind, int]] = [
+        (metric, AlertKind.THRESHOLD, column)
+        for column, metric in enumerate(THRESHOLD_METRICS)
+    ]
+    columns.append(("maintenance_required", AlertKind.MAINTENANCE, -1))
+    columns.extend(
+        (metric, AlertKind.OUTLIER, column) for column, metric in enumerate(METRICS)
+    )
+    active_nodes = engine.active_nodes()
+    active_index = [
+        index for index, node_id in enumerate(batch.node_ids) if node_id in active_nodes
+    ]
+
+    rows = len(batch.readings)
+    relevant = np.zeros((rows, len(columns)), dtype=np.bool_)
+    breached = np.zeros((rows, len(columns)), dtype=np.bool_)
+    cleared = np.zeros((rows, len(columns)), dtype=np.bool_)
+    for slot, (metric, kind, column) in enumerate(columns):
+        if kind is AlertKind.MAINTENANCE:
+            present = batch.maintenance != NO_FLAG
+            breached[:, slot] = batch.maintenance == 1
+            cleared[:, slot] = present & ~breached[:, slot]
+        elif kind is AlertKind.THRESHOLD:
+            present = ~np.isnan(batch.values[:, column]) & ~np.isnan(
+                evaluation.thresholds[:, column],
+            )
+            breached[:, slot] = evaluation.breached[:, column]
+            cleared[:, slot] = evaluation.cleared[:, column]
+        else:
+            present = ~np.isnan(batch.values[:, column])
+            breached[:, slot] = evaluation.outliers[:, column]
+            cleared[:, slot] = present & ~breached[:, slot]
+        active = np.zeros(len(batch.node_ids), dtype=np.bool_)
+        for index in active_index:
+            state = engine.state(batch.node_ids[index], metric, kind)
+            active[index] = state is not AlertState.RESOLVED
+        if not breached[:, slot].any() and not active.any():
+            continue
+        present_rows = np.flatnonzero(present)
+        relevant[present_rows, slot] = relevant_rows(
+            batch.node_index[present_rows],
+            breached[present_rows, slot],
+            cleared[present_rows, slot],
+            active,
+            engine.clear_count,
+        )
+
+    records: List[AlertRecord] = []
+    for row, slot in zip(*np.nonzero(relevant)):
+        metric, kind, column = columns[slot]
+        data = batch.readings[row]
+        threshold = (
+            float(evaluation.thresholds[row, column])
+            if kind is AlertKind.THRESHOLD
+            else None
+        )
+        records.append(
+            AlertRecord(
+                int(row),
+                data["node_id"],
+                metric,
+                kind,
+                data[metric],
+                threshold,
+                bool(breached[row, slot]),
+                bool(cleared[row, slot]),
+            ),
+        )
+    return records
+
+
+def late_records(
+    batch: ReadingBatch,
+    table: Optional[ThresholdTable] = None,
+) -> List[AlertRecord]:
+    """
+    Select the breaches of readings older than the latest of their node.
+
+    Late readings are only checked against thresholds and the maintenance
+    flag. Outlier windows and clearing streaks follow the current
+    readings, so late readings neither enter a window nor count towards
+    resolving an alert.
+
+    :param batch: late readings.
+    :param table: thresholds of every node, defaults to the loaded ones.
+    :return: one breaching record per reading and metric, in the order
+        the per-message path checks them.
+    """
+    breached, _, thresholds = check_thresholds(batch, table)
+    records: List[AlertRecord] = []
+    for row, data in enumerate(batch.readings):
+        for column in np.flatnonzero(breached[row]).tolist():
+            metric = THRESHOLD_METRICS[column]
+            records.append(
+                AlertRecord(
+                    row,
+                    data["node_id"],
+                    metric,
+                    AlertKind.THRESHOLD,
+                    data[metric],
+                    float(thresholds[row, column]),
+                    breached=True,
+                    cleared=False,
+                ),
+            )
+        if batch.maintenance[row] == 1:
+            records.append(
+                AlertRecord(
+                    row,
+                    data["node_id"],
+                    "maintenance_required",
+                    AlertKind.MAINTENANCE,
+                    data["maintenance_required"],
+                    None,
+                    breached=True,
+                    cleared=False,
+                ),
+            )
+    return records
+
+
+async def evaluate_batch(
+    readings: List[Dict[str, Any]],
+    late: Optional[List[Dict[str, Any]]] = None,
+) -> List[Transition]:
+    """
+    Check a batch of committed readings and notify clients of alert changes.
+
+    Replaces calling ``threshold_check`` and ``process_outliers`` for every
+    reading, with the same alerts as a result. Breaches of ``late``
+    readings, e.g. a backlog sent after an outage, are checked afterwards
+    and open or continue alerts like a current breach would.
+
+    :param readings: committed sensor readings in arrival order.
+    :param late: committed readings older than the latest of their node.
+    :return: alert transitions that were notified.
+    """
+    transitions: List[Transition] = []
+    if readings:
+        batch = ReadingBatch.from_readings(readings)
+        evaluation = await evaluate(batch)
+        await _observe(batch, alert_records(batch, evaluation), transitions)
+    if late:
+        batch = ReadingBatch.from_readings(late)
+        await _observe(batch, late_records(batch), transitions)
+    return transitions
+
+
+async def _observe(
+    batch: ReadingBatch,
+    records: List[AlertRecord],
+    transitions: List[Transition],
+) -> None:
+    for record in records:
+        transition = alert_engine.observe(
+            record.node_id,
+            record.metric,
+            record.kind,
+            record.value,
+            breached=record.breached,
+            cleared=record.cleared,
+        )
+        if transition is not None:
+            await notify(transition, batch.readings[record.row], record.threshold)
+            transitions.append(transition)
@@ -0,0 +1,133 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import aio_pika
+import ujson
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractExchange,
+    AbstractIncomingMessage,
+    AbstractQueue,
+)
+from loguru import logger
+
+from lakewatch.settings import settings
+
+Handler = Callable[[Any], Any]
+
+
+class Fanout:
+    """
+    Distributes events to every API worker.
+
+    With a RabbitMQ channel, events are published to a fanout exchange
+    that every worker binds with its own exclusive queue, so each worker,
+    including the one that raised the event, receives every event exactly
+    once and hands it to its local handlers. Without a channel the same
+    envelope is dispatched in-process, which is what single-process runs
+    and the tests use.
+    """
+
+    def __init__(self, exchange: Optional[str] = None) -> None:
+        self.exchange_name = exchange or settings.rabbitmq_fanout_exchange
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._exchange: Optional[AbstractExchange] = None
+        self._queue: Optional[AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+
+    @property
+    def distributed(self) -> bool:
+        """Whether events go through the broker rather than in-process."""
+        return self._exchange is not None
+
+    def subscribe(self, kind: str, handler: Handler) -> None:
+        """
+        Register a local handler for one kind of event.
+
+        :param kind: event kind.
+        :param handler: called with the event data on every worker.
+        """
+        self._handlers.setdefault(kind, []).append(handler)
+
+    async def start(self, channel: AbstractChannel) -> None:
+        """
+        Bind this worker to the fanout exchange.
+
+        :param channel: channel dedicated to the fan-out.
+        """
+        self._exchange = await channel.declare_exchange(
+            self.exchange_name,
+            aio_pika.ExchangeType.FANOUT,
+        )
+        self._queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await self._queue.bind(self._exchange)
+        self._consumer_tag = await self._queue.consume(self._on_message, no_ack=True)
+        logger.info(f"Bound to fanout exchange {self.exchange_name}")
+
+    async def stop(self) -> None:
+        """Stop receiving events and fall back to in-process dispatch."""
+        if self._queue is not None and self._consumer_tag is not None:
+            await self._queue.cancel(self._consumer_tag)
+        self._exchange = None
+        self._queue = None
+        self._consumer_tag = None
+
+    async def publish(self, kind: str, data: Any) -> None:
+        """
+        Send an event to every worker.
+
+        :param kind: event kind.
+        :param data: JSON serializable event data.
+        """
+        body = ujson.dumps({"kind": kind, "data": data}).encode()
+        self.published += 1
+        if self._exchange is None:
+            self._dispatch(body)
+            return
+        await self._exchange.publish(
+            aio_pika.Message(
+                body,
+                content_type="application/json",
+                delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT,
+            ),
+            routing_key="",
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return fan-out channel statistics.
+
+        :return: whether the broker is used and event counters.
+        """
+        return {
+            "distributed": self.distributed,
+            "exchange": self.exchange_name,
+            "published": self.published,
+            "received": self.received,
+            "failed": self.failed,
+        }
+
+    async def _on_message(self, message: AbstractIncomingMessage) -> None:
+        self._dispatch(message.body)
+
+    def _dispatch(self, body: bytes) -> None:
+        self.received += 1
+        try:
+            event = ujson.loads(body)
+            handlers = self._handlers.get(event["kind"], [])
+            data = event["data"]
+        except (ValueError, KeyError, TypeError) as e:
+            self.failed += 1
+            logger.error(f"Invalid fan-out event: {e}")
+            return
+        for handler in handlers:
+            try:
+                handler(data)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error handling {event['kind']} event: {e}")
+
+
+fanout = Fanout()
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from aio_pika.abc import AbstractChannel, AbstractQueue
+from loguru import logger
+
+from lakewatch.services.fanout import fanout
+from lakewatch.services.metrics import registry
+from lakewatch.services.reports import WorkerReports
+from lakewatch.services.writer import IngestWriter, ingest_writer
+from lakewatch.settings import settings
+
+
+class FlowController:
+    """
+    Adapts how many messages a consumer takes on at once.
+
+    Every ``interval`` seconds the mean commit latency of the ingest
+    writer since the last tick is compared with ``target``. While commits
+    are fast and the consumer used its whole limit, the limit grows by
+    ``minimum`` messages. Once commits get slower than the target, nothing
+    was committed for a whole tick or more than a batch of readings waits
+    for the writer, the limit is halved.
+
+    The limit is applied as the channel prefetch, so the broker keeps
+    undelivered messages instead of the consumer buffering them, and as
+    a cap on messages being processed, which also holds back messages
+    delivered before the prefetch was lowered. Memory stays bounded by
+    the limit however far the writer falls behind.
+    """
+
+    def __init__(
+        self,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+        target: Optional[float] = None,
+        interval: Optional[float] = None,
+        writer: IngestWriter = ingest_writer,
+    ) -> None:
+        self.minimum = minimum or settings.ingest_prefetch_min
+        self.maximum = max(maximum or settings.ingest_prefetch_max, self.minimum)
+        self.target = (
+            target if target is not None else settings.ingest_commit_target_ms / 1000
+        )
+        self.interval = (
+            interval
+            if interval is not None
+            else settings.ingest_flow_interval_ms / 1000
+        )
+        self.writer = writer
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.limit = min(
+            max(settings.rabbitmq_prefetch_count, self.minimum),
+            self.maximum,
+        )
+        self.in_flight = 0
+        self.queue_depth: Optional[int] = None
+        self.commit_latency: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+        self._peak = 0
+        self._commits = (0, 0.0)
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+        self._idle: "Optional[asyncio.Future[None]]" = None
+        self.reports = WorkerReports(self.interval)
+        self._channel: Optional[AbstractChannel] = None
+        self._queue: Optional[AbstractQueue] = None
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    async def start(self, channel: AbstractChannel, queue: AbstractQueue) -> None:
+        """
+        Start adapting the prefetch of a consumer.
+
+        :param channel: channel the consumer receives messages on.
+        :param queue: consumed queue, its depth is reported as lag.
+        """
+        self._channel = channel
+        self._queue = queue
+        self._commits = (self.writer.flush_latency.count, self.writer.flush_latency.sum)
+        await self._set_prefetch()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop adapting the prefetch."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self._channel = None
+        self._queue = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the ``limit`` slots while a message is processed."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        """Wait until fewer than ``limit`` messages are being processed."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._peak = max(self._peak, self.in_flight)
+            return
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        """Give a slot back, handing it to the longest waiting message."""
+        self.in_flight -= 1
+        self._wake()
+        if not self.in_flight and self._idle is not None and not self._idle.done():
+            self._idle.set_result(None)
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Wait for the messages being processed or waiting for a slot.
+
+        :param timeout: how long to wait at most.
+        :return: number of messages still unfinished.
+        """
+        if self.in_flight:
+            self._idle = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._idle), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._idle = None
+        return self.in_flight + len(self._waiters)
+
+    async def tick(self) -> int:
+        """
+        Adapt the limit to the writer latency and backlog since the last tick.
+
+        :return: new limit.
+        """
+        count, total = self.writer.flush_latency.count, self.writer.flush_latency.sum
+        commits, elapsed = count - self._commits[0], total - self._commits[1]
+        self._commits = (count, total)
+        self.commit_latency = elapsed / commits if commits else None
+        await self._update_queue_depth()
+
+        limit = self.limit
+        if self.commit_latency is None:
+            # Nothing committed although messages were waiting for the writer
+            slow = self.in_flight > 0
+        else:
+            slow = self.commit_latency > self.target
+        if slow or self.writer.pending > self.writer.batch_size:
+            limit = max(self.minimum, limit // 2)
+        elif self._peak >= self.limit:
+            limit = min(self.maximum, limit + self.minimum)
+        self._peak = self.in_flight
+
+        if limit != self.limit:
+            if limit > self.limit:
+                self.increases += 1
+            else:
+                self.decreases += 1
+            logger.info(f"Ingest prefetch {self.limit} -> {limit}")
+            self.limit = limit
+            await self._set_prefetch()
+            self._wake()
+        return self.limit
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Return the flow state of this worker.
+
+        :return: limit, messages being processed, writer latency and
+            backlog and the depth of the consumed queue.
+        """
+        return {
+            "worker": self.worker,
+            "running": self._task is not None,
+            "prefetch": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "commit_latency_ms": (
+                self.commit_latency * 1000 if self.commit_latency is not None else None
+            ),
+            "writer_pending": self.writer.pending,
+            "queue_depth": self.queue_depth,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "updated": int(time.time()),
+        }
+
+    def apply(self, data: Dict[str, Any]) -> None:
+        """
+        Keep the status sent by a worker.
+
+        :param data: status of the worker.
+        """
+        self.reports.apply(data)
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """
+        Get the latest status of every running worker.
+
+        :return: statuses received recently, sorted by worker.
+        """
+        return self.reports.latest()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+                await fanout.publish("flow", self.status())
+            except Exception as e:
+                logger.error(f"Error adapting ingest prefetch: {e}")
+
+    async def _set_prefetch(self) -> None:
+        if self._channel is not None:
+            # Channel-wide, so it also applies to the running consumer
+            await self._channel.set_qos(prefetch_count=self.limit, global_=True)
+
+    async def _update_queue_depth(self) -> None:
+        if self._queue is None:
+            return
+        try:
+            declared = await self._queue.declare()
+        except Exception as e:
+            logger.warning(f"Could not get depth of {self._queue.name}: {e}")
+            return
+        self.queue_depth = declared.message_count
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                self._peak = max(self._peak, self.in_flight)
+                waiter.set_result(None)
+
+
+flow_controller = FlowController()
+fanout.subscribe("flow", flow_controller.apply)
+registry.gauge(
+    "lakewatch_ingest_prefetch",
+    "Messages the consumer may hold at once.",
+    function=lambda: flow_controller.limit,
+)
+registry.gauge(
+    "lakewatch_ingest_in_flight",
+    "Messages being processed.",
+    function=lambda: flow_controller.in_flight,
+)
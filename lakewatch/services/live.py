@@ -0,0 +1,173 @@
+import asyncio
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+import ujson
+from fastapi import WebSocket
+from loguru import logger
+
+from lakewatch.services.broadcast import Broadcaster, Client
+from lakewatch.services.fanout import fanout
+from lakewatch.services.metrics import registry
+from lakewatch.services.node_cache import node_cache
+from lakewatch.settings import SlowConsumerPolicy, settings
+
+# Fields of a node's state streamed to live clients, the node ID is the key
+LIVE_FIELDS = (
+    "timestamp",
+    "latitude",
+    "longitude",
+    "temperature",
+    "ph",
+    "dissolved_oxygen",
+    "maintenance_required",
+)
+
+NodeState = Dict[str, Any]
+
+
+def _live_state(data: Dict[str, Any]) -> NodeState:
+    return {field: data.get(field) for field in LIVE_FIELDS}
+
+
+def diff(previous: Optional[NodeState], current: NodeState) -> NodeState:
+    """
+    Get the fields of a node's state that changed.
+
+    :param previous: state last sent to clients, None for a new node.
+    :param current: latest state.
+    :return: changed fields and their new values.
+    """
+    if previous is None:
+        return dict(current)
+    return {
+        field: value for field, value in current.items() if previous.get(field) != value
+    }
+
+
+class LiveFeed:
+    """
+    Streams node readings to WebSocket clients as they are committed.
+
+    Readings committed by any worker arrive through the fan-out channel
+    and only the latest one per node is kept. Every ``tick`` seconds the
+    nodes that changed are sent in a single message holding just the
+    fields that differ from what clients already have. A new client
+    first gets a snapshot of every node, after which the deltas apply.
+
+    Dropping a delta would leave a client with a wrong picture, so
+    clients that fall behind are disconnected and get a fresh snapshot
+    when they reconnect.
+    """
+
+    def __init__(self, tick: Optional[float] = None) -> None:
+        self.tick = tick if tick is not None else settings.live_tick_ms / 1000
+        self.broadcaster = Broadcaster(
+            policy=SlowConsumerPolicy.DISCONNECT,
+            feed="live",
+        )
+        self.ticks = 0
+        self.updates = 0
+        self._state: Dict[str, NodeState] = {}
+        self._pending: Dict[str, NodeState] = {}
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Start the tick task if it is not running yet."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        Stop the tick task, send the last changes and disconnect every client.
+
+        :param timeout: how long to wait for clients to receive the last
+            changes.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            self.flush()
+        await self.broadcaster.close(timeout)
+
+    def apply(self, readings: List[Dict[str, Any]]) -> None:
+        """
+        Queue committed readings for the next tick.
+
+        Readings older than the latest known one of their node are
+        ignored.
+
+        :param readings: sensor readings.
+        """
+        for data in readings:
+            node_id = data["node_id"]
+            latest = self._pending.get(node_id) or self._state.get(node_id)
+            if latest is not None and latest["timestamp"] > data["timestamp"]:
+                continue
+            self._pending[node_id] = _live_state(data)
+
+    def connect(self, websocket: WebSocket) -> Client:
+        """
+        Register a live client and queue the current snapshot for it.
+
+        :param websocket: accepted connection.
+        :return: the registered client.
+        """
+        for node_id, state in node_cache.items():
+            if node_id not in self._state:
+                self._state[node_id] = _live_state(state)
+        client = self.broadcaster.connect(websocket)
+        self.broadcaster.send(
+            client,
+            ujson.dumps({"type": "snapshot", "nodes": self._state}),
+        )
+        return client
+
+    def flush(self) -> int:
+        """
+        Send the changes collected since the last tick.
+
+        :return: number of nodes whose changes were sent.
+        """
+        pending, self._pending = self._pending, {}
+        nodes: Dict[str, NodeState] = {}
+        for node_id, state in pending.items():
+            changed = diff(self._state.get(node_id), state)
+            self._state[node_id] = state
+            if changed:
+                nodes[node_id] = changed
+        self.ticks += 1
+        if nodes and len(self.broadcaster):
+            self.broadcaster.publish(ujson.dumps({"type": "delta", "nodes": nodes}))
+            self.updates += len(nodes)
+        return len(nodes)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return live feed statistics.
+
+        :return: tick and update counters and the client fan-out state.
+        """
+        return {
+            "tick_seconds": self.tick,
+            "ticks": self.ticks,
+            "node_updates": self.updates,
+            "nodes": len(self._state),
+            "pending": len(self._pending),
+            **self.broadcaster.stats(),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error sending live updates: {e}")
+
+
+live_feed = LiveFeed()
+registry.register(live_feed.broadcaster.connections, live_feed.broadcaster.delivery_lag)
+fanout.subscribe("readings", live_feed.apply)
@@ -0,0 +1,269 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import aio_pika
+import cbor2
+import msgpack
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractIncomingMessage
+from loguru import logger
+from pydantic import Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, NotRequired, TypedDict
+
+from lakewatch.settings import settings
+
+# Header of dead-lettered messages holding why they were rejected
+REASON_HEADER = "x-lakewatch-reason"
+# Header of retried messages holding how often they failed
+ATTEMPTS_HEADER = "x-lakewatch-attempts"
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+Metric = Annotated[Optional[float], Field(allow_inf_nan=False)]
+
+# Largest integer SQLite stores, later timestamps could never be written
+MAX_TIMESTAMP = 2**63 - 1
+
+
+class Reading(TypedDict):
+    """Sensor reading as published by the nodes."""
+
+    node_id: Annotated[str, Field(min_length=1)]
+    timestamp: Annotated[int, Field(ge=0, le=MAX_TIMESTAMP)]
+    latitude: Annotated[Optional[float], Field(ge=-90, le=90)]
+    longitude: Annotated[Optional[float], Field(ge=-180, le=180)]
+    temperature: Metric
+    ph: Metric
+    dissolved_oxygen: Metric
+    maintenance_required: Annotated[Optional[int], Field(ge=0, le=1)]
+    humidity: NotRequired[Metric]
+    turbidity: NotRequired[Metric]
+    conductivity: NotRequired[Metric]
+
+
+# Built once, parses and validates JSON in a single pass without
+# materializing an intermediate dict. Unknown keys are dropped.
+READING = TypeAdapter(Reading)
+
+
+def decode_reading(body: bytes) -> Reading:
+    """
+    Parse and validate a JSON sensor message.
+
+    :param body: message body.
+    :raises ValidationError: if it is not valid JSON or not a valid reading.
+    :return: the reading.
+    """
+    return READING.validate_json(body)
+
+
+class Envelope(TypedDict):
+    """
+    Readings of several nodes sent by a gateway in one message.
+
+    Keys are sent once in ``fields``, every reading is a list of values
+    in the same order, so they are not repeated for every reading.
+    """
+
+    gateway: NotRequired[str]
+    fields: List[str]
+    readings: List[List[Any]]
+
+
+ENVELOPE = TypeAdapter(Envelope)
+READINGS = TypeAdapter(List[Reading])
+
+# Binary formats, both decode to the same structures as JSON
+DECODERS: Dict[str, Callable[[bytes], Any]] = {
+    MSGPACK: msgpack.unpackb,
+    "application/x-msgpack": msgpack.unpackb,
+    "application/vnd.msgpack": msgpack.unpackb,
+    CBOR: cbor2.loads,
+}
+
+
+class DecodeError(ValueError):
+    """Raised for messages that are not in a supported format."""
+
+
+def decode_message(body: bytes, content_type: Optional[str] = None) -> List[Reading]:
+    """
+    Parse and validate a sensor message in any supported format.
+
+    The format is taken from the AMQP ``content_type``, messages without
+    one are JSON as sent by older gateways. JSON messages hold a single
+    reading, MessagePack and CBOR messages hold either a single reading
+    or an :class:`Envelope` of many.
+
+    :param body: message body.
+    :param content_type: AMQP content type of the message.
+    :raises DecodeError: if the message is not in a supported format, or
+        a reading of an envelope does not have a value for every field.
+    :raises ValidationError: if it does not hold valid readings.
+    :return: the readings.
+    """
+    media_type = (content_type or JSON).split(";", 1)[0].strip().lower()
+    if media_type == JSON:
+        return [decode_reading(body)]
+    decode = DECODERS.get(media_type)
+    if decode is None:
+        raise DecodeError(f"content_type: unsupported {media_type}")
+    try:
+        data = decode(body)
+    except Exception as e:
+        raise DecodeError(f"body: invalid {media_type}: {e}") from e
+    if isinstance(data, dict) and "readings" in data:
+        envelope = ENVELOPE.validate_python(data)
+        fields = envelope["fields"]
+        for position, values in enumerate(envelope["readings"]):
+            if len(values) != len(fields):
+                raise DecodeError(
+                    f"readings.{position}: {len(values)} values "
+                    f"for {len(fields)} fields",
+                )
+        return READINGS.validate_python(
+            [dict(zip(fields, values)) for values in envelope["readings"]],
+        )
+    return [READING.validate_python(data)]
+
+
+def describe_error(error: ValueError) -> str:
+    """
+    Summarize why a message was rejected.
+
+    :param error: decoding or validation error.
+    :return: one line per problem, with the location of the field.
+    """
+    if not isinstance(error, ValidationError):
+        return str(error)
+    return "; ".join(
+        f"{'.'.join(str(part) for part in problem['loc']) or 'body'}: {problem['msg']}"
+        for problem in error.errors(include_url=False)
+    )
+
+
+class DeadLetters:
+    """
+    Parks messages that can never be ingested.
+
+    Rejected messages are republished unchanged to ``queue``, a durable
+    queue on the default exchange, with the reason in the
+    ``x-lakewatch-reason`` header, and only then acked. They can be
+    inspected and replayed from there. Without a channel they are only
+    logged, which is what the tests use.
+
+    Messages that failed to be processed are retried at the back of
+    their queue with the number of attempts in the
+    ``x-lakewatch-attempts`` header, and parked once they failed
+    ``max_attempts`` times.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self.queue_name = queue or settings.rabbitmq_dead_letter_queue
+        self.max_attempts = max_attempts or settings.rabbitmq_max_attempts
+        self.rejected = 0
+        self.failed = 0
+        self.retried = 0
+        self._exchange: Optional[AbstractExchange] = None
+
+    async def start(self, channel: AbstractChannel) -> None:
+        """
+        Declare the dead-letter queue.
+
+        :param channel: channel to publish rejected messages on.
+        """
+        await channel.declare_queue(self.queue_name, durable=True)
+        self._exchange = channel.default_exchange
+
+    def stop(self) -> None:
+        """Fall back to only logging rejected messages."""
+        self._exchange = None
+
+    async def retry(
+        self,
+        message: AbstractIncomingMessage,
+        queue: str,
+        reason: str,
+    ) -> None:
+        """
+        Send a message that failed back to its queue, or park it.
+
+        :param message: message that could not be processed.
+        :param queue: queue the message was consumed from.
+        :param reason: why it failed.
+        :raises Exception: if the message could not be republished, or
+            there is no channel to republish it on, so it is requeued.
+        """
+        failed = (message.headers or {}).get(ATTEMPTS_HEADER)
+        attempts = (failed if isinstance(failed, int) else 0) + 1
+        if attempts >= self.max_attempts:
+            await self.publish(message, f"failed {attempts} times: {reason}")
+            return
+        if self._exchange is None:
+            raise RuntimeError(reason)
+        await self._exchange.publish(
+            _copy(message, {ATTEMPTS_HEADER: attempts}),
+            routing_key=queue,
+        )
+        self.retried += 1
+        logger.warning(f"Retrying message {message.message_id} ({attempts}): {reason}")
+
+    async def publish(self, message: AbstractIncomingMessage, reason: str) -> None:
+        """
+        Park a rejected message.
+
+        :param message: message that failed to decode or validate.
+        :param reason: why it was rejected.
+        :raises Exception: if the message could not be parked, so it is
+            requeued rather than acked and lost.
+        """
+        self.rejected += 1
+        logger.warning(f"Rejected message {message.message_id}: {reason}")
+        if self._exchange is None:
+            return
+        try:
+            await self._exchange.publish(
+                _copy(message, {REASON_HEADER: reason}),
+                routing_key=self.queue_name,
+            )
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to dead-letter message: {e}")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return dead-letter statistics.
+
+        :return: queue name and number of rejected, unparkable and
+            retried messages.
+        """
+        return {
+            "queue": self.queue_name,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+def _copy(
+    message: AbstractIncomingMessage,
+    headers: Dict[str, Any],
+) -> aio_pika.Message:
+    # Persistent copy of the message, with extra headers
+    return aio_pika.Message(
+        message.body,
+        headers={**(message.headers or {}), **headers},
+        content_type=message.content_type,
+        content_encoding=message.content_encoding,
+        message_id=message.message_id,
+        timestamp=message.timestamp,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+    )
+
+
+dead_letters = DeadLetters()
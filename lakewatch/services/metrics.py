@@ -0,0 +1,386 @@
+import abc
+import bisect
+import math
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Durations of a single stage or request, from 50µs to 5s
+LATENCY_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+Labels = Dict[str, str]
+Sample = Tuple[str, Labels, float]
+
+
+class Metric(abc.ABC):
+    """
+    Base of every metric.
+
+    Metrics are updated with plain attribute arithmetic and no locking.
+    Each one is only updated from a single thread, the event loop or the
+    database writer thread, and read when the registry is rendered, so a
+    scrape may see a histogram between updating its count and its sum,
+    never a lost update.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Labels] = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Sample]:
+        """
+        Yield the current samples of the metric.
+
+        :return: sample names, labels and values.
+        """
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+
+    With ``function`` the value is read from it whenever the metric is
+    collected, which exposes a count kept elsewhere at no cost.
+    """
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Labels] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self._value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        Increase the count.
+
+        :param amount: how much to add, not negative.
+        """
+        self._value += amount
+
+    @property
+    def value(self) -> float:
+        """Current count."""
+        return self.function() if self.function is not None else self._value
+
+    def samples(self) -> Iterator[Sample]:
+        """
+        Yield the count.
+
+        :return: a single ``_total`` sample.
+        """
+        yield f"{self.name}_total", self.labels, self.value
+
+
+class Gauge(Metric):
+    """
+    Value that goes up and down.
+
+    With ``function`` the value is read from it whenever the metric is
+    collected.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Labels] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self._value: float = 0
+
+    def set(self, value: float) -> None:
+        """
+        Set the value.
+
+        :param value: new value.
+        """
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        Increase the value.
+
+        :param amount: how much to add.
+        """
+        self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        """
+        Decrease the value.
+
+        :param amount: how much to subtract.
+        """
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        """Current value."""
+        return self.function() if self.function is not None else self._value
+
+    def samples(self) -> Iterator[Sample]:
+        """
+        Yield the value.
+
+        :return: a single sample.
+        """
+        yield self.name, self.labels, self.value
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram with fixed bucket bounds.
+
+    Follows the Prometheus layout: every bucket counts the
+    observations that are less than or equal to its upper bound.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        labels: Optional[Labels] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Record a single observation.
+
+        :param value: observed value.
+        """
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @property
+    def count(self) -> int:
+        """Number of observations recorded so far."""
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        """Sum of all observations recorded so far."""
+        return self._sum
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the current state of the histogram.
+
+        :return: cumulative bucket counts, total count and sum.
+        """
+        buckets: Dict[str, int] = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            buckets[f"{bound:g}"] = cumulative
+        buckets["+Inf"] = self._count
+        return {"buckets": buckets, "count": self._count, "sum": self._sum}
+
+    def samples(self) -> Iterator[Sample]:
+        """
+        Yield the cumulative buckets, the sum and the count.
+
+        :return: ``_bucket`` samples with an ``le`` label, ``_sum`` and
+            ``_count``.
+        """
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            yield f"{self.name}_bucket", {**self.labels, "le": f"{bound:g}"}, cumulative
+        yield f"{self.name}_bucket", {**self.labels, "le": "+Inf"}, self._count
+        yield f"{self.name}_sum", self.labels, self._sum
+        yield f"{self.name}_count", self.labels, self._count
+
+
+class Registry:
+    """
+    Collects metrics and renders them in the Prometheus text format.
+
+    Metrics with the same name but different labels are rendered as one
+    family under a single ``HELP`` and ``TYPE`` line.
+    """
+
+    def __init__(self) -> None:
+        self._families: Dict[str, List[Metric]] = {}
+
+    def register(self, *metrics: Metric) -> None:
+        """
+        Add metrics to the registry.
+
+        :param metrics: metrics to render from now on.
+        :raises ValueError: if a metric of the same name has another type
+            or the same labels.
+        """
+        for metric in metrics:
+            family = self._families.setdefault(metric.name, [])
+            for other in family:
+                if other.kind != metric.kind:
+                    raise ValueError(
+                        f"{metric.name} is a {other.kind}, not a {metric.kind}",
+                    )
+                if other.labels == metric.labels:
+                    raise ValueError(f"{metric.name}{metric.labels} already registered")
+            family.append(metric)
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Labels] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Counter:
+        """
+        Create and register a counter.
+
+        :param name: metric name, without the ``_total`` suffix.
+        :param documentation: help text.
+        :param labels: constant labels.
+        :param function: reads the count when collected.
+        :return: the counter.
+        """
+        counter = Counter(name, documentation, labels, function)
+        self.register(counter)
+        return counter
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Labels] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        """
+        Create and register a gauge.
+
+        :param name: metric name.
+        :param documentation: help text.
+        :param labels: constant labels.
+        :param function: reads the value when collected.
+        :return: the gauge.
+        """
+        gauge = Gauge(name, documentation, labels, function)
+        self.register(gauge)
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        labels: Optional[Labels] = None,
+    ) -> Histogram:
+        """
+        Create and register a histogram.
+
+        :param name: metric name.
+        :param documentation: help text.
+        :param buckets: upper bounds of the buckets.
+        :param labels: constant labels.
+        :return: the histogram.
+        """
+        histogram = Histogram(name, documentation, buckets, labels)
+        self.register(histogram)
+        return histogram
+
+    def render(self) -> str:
+        """
+        Render every metric.
+
+        :return: text exposition format, version 0.0.4.
+        """
+        lines: List[str] = []
+        for name, family in sorted(self._families.items()):
+            lines.append(f"# HELP {name} {_escape_help(family[0].documentation)}")
+            lines.append(f"# TYPE {name} {family[0].kind}")
+            for metric in family:
+                for sample, labels, value in metric.samples():
+                    lines.append(f"{sample}{_format_labels(labels)} {_format(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def _format(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+registry = Registry()
+
+
+def ingest_stage(stage: str) -> Histogram:
+    """
+    Create and register the duration histogram of one stage of ingest.
+
+    :param stage: value of the ``stage`` label.
+    :return: the histogram.
+    """
+    return registry.histogram(
+        "lakewatch_ingest_stage_seconds",
+        "Time spent in each stage of ingesting readings.",
+        labels={"stage": stage},
+    )
@@ -0,0 +1,131 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, ItemsView, List, Optional, Tuple
+
+import ujson
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.services.fanout import fanout
+
+
+def _node_state(data: Any, timestamp: int) -> Dict[str, Any]:
+    return {
+        "node_id": data["node_id"],
+        "timestamp": timestamp,
+        "datetime": datetime.fromtimestamp(timestamp).isoformat(),
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "temperature": data["temperature"],
+        "ph": data["ph"],
+        "dissolved_oxygen": data["dissolved_oxygen"],
+        "maintenance_required": data["maintenance_required"],
+    }
+
+
+class NodeStateCache:
+    """
+    Latest known state of every node, kept in memory.
+
+    The cache is warmed from ``node_metadata`` and then updated by the
+    ingest path with the same rules as the metadata upsert. The JSON
+    body served by ``/api/get_nodes`` and its ETag are rendered once
+    per change rather than once per request.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._rendered: Optional[Tuple[bytes, str]] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest state of a node.
+
+        :param node_id: node identifier.
+        :return: node state or None if the node is unknown.
+        """
+        return self._nodes.get(node_id)
+
+    def update(self, data: Dict[str, Any]) -> bool:
+        """
+        Apply an accepted reading to the cache.
+
+        Older readings are ignored unless they change the maintenance
+        flag, mirroring the ``node_metadata`` upsert.
+
+        :param data: sensor reading.
+        :return: whether the cached state changed.
+        """
+        current = self._nodes.get(data["node_id"])
+        timestamp = data["timestamp"]
+        if (
+            current is not None
+            and current["timestamp"] >= timestamp
+            and current["maintenance_required"] == data["maintenance_required"]
+        ):
+            return False
+        self._nodes[data["node_id"]] = _node_state(data, timestamp)
+        self._rendered = None
+        return True
+
+    def items(self) -> ItemsView[str, Dict[str, Any]]:
+        """
+        Get the latest state of every node.
+
+        :return: node identifiers and their states.
+        """
+        return self._nodes.items()
+
+    def apply(self, readings: List[Dict[str, Any]]) -> None:
+        """
+        Apply a batch of committed readings, as published by any worker.
+
+        :param readings: sensor readings.
+        """
+        for data in readings:
+            self.update(data)
+
+    async def warm(self) -> None:
+        """Load the state of every node from ``node_metadata``."""
+        rows = await database.fetch("SELECT * FROM node_metadata")
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            try:
+                nodes[row["node_id"]] = _node_state(row, row["last_updated"])
+            except (KeyError, IndexError, TypeError) as e:
+                logger.error(f"Error processing node data: {e} for row: {dict(row)}")
+        self._nodes = nodes
+        self._rendered = None
+        self.ready = True
+        logger.info(f"Node state cache warmed with {len(nodes)} nodes")
+
+    def clear(self) -> None:
+        """Drop every cached node and require a new warm-up."""
+        self._nodes = {}
+        self._rendered = None
+        self.ready = False
+
+    def render(self) -> Tuple[bytes, str]:
+        """
+        Get the serialized node list and its ETag.
+
+        :return: JSON body and strong ETag.
+        """
+        if self._rendered is None:
+            if self._nodes:
+                nodes = list(self._nodes.values())
+                payload: Dict[str, Any] = {"count": len(nodes), "data": nodes}
+            else:
+                payload = {"message": "No nodes found"}
+            body = ujson.dumps(payload).encode()
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            self._rendered = (body, etag)
+        return self._rendered
+
+
+node_cache = NodeStateCache()
+fanout.subscribe("readings", node_cache.apply)
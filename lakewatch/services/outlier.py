@@ -1,77 +1,235 @@
-from typing import Dict, Any, List
-import sqlite3
-import logging as logger
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
 
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.services.alerts import AlertKind, AlertState, alert_engine, describe
+from lakewatch.services.readings import METRICS
+from lakewatch.services.subscriptions import Severity
+from lakewatch.services.writer import ingest_writer
 from lakewatch.settings import settings
 from lakewatch.web.api.monitoring.views import send_threshold_alert
 
+# Nodes seeded per query, two parameters each stay well below SQLite's limit
+SEED_NODES = 400
 
-async def process_outliers(payload: Dict[str, Any]) -> None:
+ALERT_LABELS = {
+    "temperature": "temperature",
+    "ph": "pH",
+    "dissolved_oxygen": "dissolved oxygen",
+}
+
+
+def is_outlier(current: float, history: Sequence[float], factor: float) -> bool:
     """
-    Detect and handle outliers in sensor readings compared to recent historical data.
+    Check whether a value deviates too far from its recent history.
 
-    Args:
-        payload: Dictionary containing sensor data with node information and readings
+    :param current: value to check.
+    :param history: recent values of the same metric.
+    :param factor: allowed deviation from the mean in half-ranges.
+    :return: whether the value is an outlier.
     """
-    node_id = payload.get("node_id")
-    temperature = payload.get("temperature")
-    ph = payload.get("ph")
-    dissolved_oxygen = payload.get("dissolved_oxygen")
+    mean = sum(history) / len(history)
+    deviation = abs(current - mean)
+    return deviation > (factor * (max(history) - min(history)) / 2)
 
-    try:
-        conn = sqlite3.connect(settings.db_file)
-        cursor = conn.cursor()
 
-        # Fetch last 5 readings for this node
-        cursor.execute(
-            """
-            SELECT temperature, ph, dissolved_oxygen
+class NodeWindow:
+    """Last readings of every metric of a single node."""
+
+    __slots__ = ("last_seen", "values")
+
+    def __init__(self, size: int) -> None:
+        self.values: Dict[str, Deque[float]] = {
+            metric: deque(maxlen=size) for metric in METRICS
+        }
+        self.last_seen = time.monotonic()
+
+
+class OutlierDetector:
+    """
+    Rolling-window outlier detection kept in memory per node.
+
+    The window of a node is seeded from the database the first time the
+    node is seen and then updated with every reading, so steady-state
+    detection needs no queries at all. Nodes that stay idle longer than
+    ``idle_seconds``, or the least recently seen ones beyond
+    ``max_nodes``, are evicted to bound memory.
+    """
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        factor: Optional[float] = None,
+        min_history: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        max_nodes: Optional[int] = None,
+    ) -> None:
+        self.window = window or settings.outlier_window
+        self.factor = factor or settings.outlier_factor
+        self.min_history = min_history or settings.outlier_min_history
+        self.idle_seconds = idle_seconds or settings.outlier_idle_seconds
+        self.max_nodes = max_nodes or settings.outlier_max_nodes
+        self._nodes: "OrderedDict[str, NodeWindow]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def clear(self) -> None:
+        """Forget every node window."""
+        self._nodes.clear()
+
+    async def node_window(self, node_id: str, timestamp: Optional[int]) -> NodeWindow:
+        """
+        Get the window of a node, seeding it from the database if needed.
+
+        :param node_id: node identifier.
+        :param timestamp: only readings before this one seed the window.
+        :return: the node window.
+        """
+        (window,) = await self.node_windows([(node_id, timestamp)])
+        return window
+
+    async def node_windows(
+        self,
+        nodes: Sequence[Tuple[str, Optional[int]]],
+    ) -> List[NodeWindow]:
+        """
+        Get the windows of many nodes, seeding the missing ones at once.
+
+        The last readings of every node not seen yet are read with a
+        single query, instead of one query per node.
+
+        :param nodes: distinct node identifiers, each with the timestamp
+            only readings before which seed its window.
+        :return: the node windows, in the order of ``nodes``.
+        """
+        missing = [(node_id, ts) for node_id, ts in nodes if node_id not in self._nodes]
+        seeds: Dict[str, List[Tuple[Any, ...]]] = {}
+        for start in range(0, len(missing), SEED_NODES):
+            chunk = missing[start : start + SEED_NODES]
+            params: List[Any] = [value for seed in chunk for value in seed]
+            rows = await database.fetch(_seed_query(len(chunk)), (*params, self.window))
+            for row in rows:
+                seeds.setdefault(row[0], []).append(tuple(row)[1:])
+
+        now = time.monotonic()
+        windows = []
+        for node_id, _ in nodes:
+            # Another batch may have seeded it while the query ran
+            window = self._nodes.get(node_id)
+            if window is None:
+                window = NodeWindow(self.window)
+                for seed in seeds.get(node_id, ()):
+                    for metric, value in zip(METRICS, seed):
+                        if value is not None:
+                            window.values[metric].append(float(value))
+                self._nodes[node_id] = window
+            window.last_seen = now
+            self._nodes.move_to_end(node_id)
+            windows.append(window)
+        self._evict()
+        return windows
+
+    def _evict(self) -> None:
+        idle_before = time.monotonic() - self.idle_seconds
+        while self._nodes:
+            node_id, window = next(iter(self._nodes.items()))
+            if len(self._nodes) <= self.max_nodes and window.last_seen >= idle_before:
+                break
+            del self._nodes[node_id]
+
+    async def check(self, payload: Dict[str, Any]) -> List[str]:
+        """
+        Check a reading against its node's window and add it to the window.
+
+        :param payload: sensor reading.
+        :return: metrics whose value is an outlier.
+        """
+        window = await self.node_window(payload["node_id"], payload.get("timestamp"))
+        outliers = []
+        for metric in METRICS:
+            value = payload.get(metric)
+            if value is None:
+                continue
+            value = float(value)
+            history = window.values[metric]
+            if len(history) >= self.min_history and is_outlier(
+                value,
+                history,
+                self.factor,
+            ):
+                outliers.append(metric)
+            history.append(value)
+        return outliers
+
+
+def _seed_query(nodes: int) -> str:
+    # Oldest first, the last readings before the timestamp of every node.
+    # Only the placeholders of the seed rows are interpolated.
+    seeds = ", ".join(["(?, ?)"] * nodes)
+    return f"""
+        WITH seeds(node_id, cutoff) AS (VALUES {seeds})
+        SELECT seeds.node_id, node_data.temperature, node_data.ph,
+            node_data.dissolved_oxygen
+        FROM seeds
+        JOIN node_data ON node_data.rowid IN (
+            SELECT rowid
             FROM node_data
-            WHERE node_id = ?
+            WHERE node_id = seeds.node_id
+                AND (seeds.cutoff IS NULL OR timestamp < seeds.cutoff)
             ORDER BY timestamp DESC
-            LIMIT 5
-        """,
-            (node_id,),
+            LIMIT ?
         )
-        rows = cursor.fetchall()
+        ORDER BY seeds.node_id, node_data.timestamp
+    """  # noqa: S608
 
-        conn.close()
-        if not rows or len(rows) < 3:
-            return
 
-        # Calculate simple means of recent values
-        recent_temp = [r[0] for r in rows]
-        recent_ph = [r[1] for r in rows]
-        recent_oxygen = [r[2] for r in rows]
+outlier_detector = OutlierDetector()
 
-        def is_outlier(
-            current: float, history: List[float], factor: float = 1.7
-        ) -> bool:
-            mean = sum(history) / len(history)
-            deviation = abs(current - mean)
-            return deviation > (factor * (max(history) - min(history)) / 2)
 
-        if temperature is not None and is_outlier(float(temperature), recent_temp):
-            await send_threshold_alert(
-                message=f"Outlier detected in temperature: {temperature}"
-            )
-            logger.warning(
-                f"Node {node_id}: Outlier detected in temperature: {temperature}"
-            )
-
-        if ph is not None and is_outlier(float(ph), recent_ph):
-            await send_threshold_alert(message=f"Outlier detected in pH: {ph}")
-            logger.warning(f"Node {node_id}: Outlier detected in pH: {ph}")
+async def process_outliers(payload: Dict[str, Any]) -> None:
+    """
+    Detect and handle outliers in sensor readings compared to recent historical data.
 
-        if dissolved_oxygen is not None and is_outlier(
-            float(dissolved_oxygen), recent_oxygen
-        ):
-            await send_threshold_alert(
-                message=f"Outlier detected in dissolved oxygen: {dissolved_oxygen}"
+    Args:
+        payload: Dictionary containing sensor data with node information and readings
+    """
+    try:
+        node_id = payload["node_id"]
+        outliers = await outlier_detector.check(payload)
+        for metric in METRICS:
+            if payload.get(metric) is None:
+                continue
+            value = payload[metric]
+            transition = alert_engine.observe(
+                node_id,
+                metric,
+                AlertKind.OUTLIER,
+                value,
+                breached=metric in outliers,
+                cleared=metric not in outliers,
             )
-            logger.warning(
-                f"Node {node_id}: Outlier detected in dissolved oxygen: {dissolved_oxygen}"
+            if transition is None:
+                continue
+            ingest_writer.record_alert(transition.event(payload.get("timestamp")))
+            label = ALERT_LABELS[metric]
+            message = describe(transition, f"Outlier detected in {label}", label)
+            await send_threshold_alert(
+                message=message,
+                node_id=node_id,
+                metric=metric,
+                severity=(
+                    Severity.INFO
+                    if transition.state is AlertState.RESOLVED
+                    else Severity.WARNING
+                ),
+                latitude=payload.get("latitude"),
+                longitude=payload.get("longitude"),
             )
+            logger.warning(f"Node {node_id}: {message}")
 
     except Exception as e:
         logger.error(f"Error during outlier processing: {e}")
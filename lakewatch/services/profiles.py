@@ -0,0 +1,342 @@
+import hashlib
+import math
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import ujson
+from numpy.typing import NDArray
+from pydantic import BaseModel, field_validator, model_validator
+
+from lakewatch.services.fanout import fanout
+from lakewatch.services.readings import METRICS
+from lakewatch.settings import settings
+
+# Metrics thresholds can be set for, the stored readings come first
+THRESHOLD_METRICS = (*METRICS, "humidity", "turbidity", "conductivity")
+
+
+class Bounds(BaseModel):
+    """Range a metric is expected to stay in, either end may be open."""
+
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_range(self) -> "Bounds":
+        """Reject ranges whose ends are swapped."""
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise ValueError("min must not be above max")
+        return self
+
+
+MetricBounds = Dict[str, Bounds]
+
+
+def _check_metrics(bounds: MetricBounds) -> MetricBounds:
+    for metric in bounds:
+        if metric not in THRESHOLD_METRICS:
+            raise ValueError(f"unknown metric {metric}")
+    return bounds
+
+
+class NodeGroup(BaseModel):
+    """Nodes sharing the same thresholds."""
+
+    nodes: FrozenSet[str]
+    thresholds: MetricBounds = {}
+
+    @field_validator("thresholds")
+    @classmethod
+    def check_thresholds(cls, value: MetricBounds) -> MetricBounds:
+        """Only accept known metrics."""
+        return _check_metrics(value)
+
+
+class ThresholdProfiles(BaseModel):
+    """
+    Thresholds of every node.
+
+    ``default`` overrides the thresholds from the settings for every
+    node, a group overrides them for its nodes and ``nodes`` for single
+    nodes. An override replaces both bounds of a metric, so a metric
+    given without bounds is not checked at all.
+    """
+
+    default: MetricBounds = {}
+    groups: Dict[str, NodeGroup] = {}
+    nodes: Dict[str, MetricBounds] = {}
+
+    @field_validator("default")
+    @classmethod
+    def check_default(cls, value: MetricBounds) -> MetricBounds:
+        """Only accept known metrics."""
+        return _check_metrics(value)
+
+    @field_validator("nodes")
+    @classmethod
+    def check_nodes(cls, value: Dict[str, MetricBounds]) -> Dict[str, MetricBounds]:
+        """Only accept known metrics."""
+        for bounds in value.values():
+            _check_metrics(bounds)
+        return value
+
+    @model_validator(mode="after")
+    def check_groups(self) -> "ThresholdProfiles":
+        """Reject nodes that belong to more than one group."""
+        seen: Dict[str, str] = {}
+        for name, group in self.groups.items():
+            for node_id in group.nodes:
+                if node_id in seen:
+                    raise ValueError(
+                        f"node {node_id} is in groups {seen[node_id]} and {name}",
+                    )
+                seen[node_id] = name
+        return self
+
+    @property
+    def version(self) -> str:
+        """Digest of the profiles, equal on every worker that loaded them."""
+        document = ujson.dumps(self.model_dump(mode="json"), sort_keys=True)
+        return hashlib.sha256(document.encode()).hexdigest()[:12]
+
+
+def default_bounds() -> MetricBounds:
+    """Get the thresholds configured in the settings."""
+    return {
+        "temperature": Bounds(max=settings.temperature_threshold),
+        "ph": Bounds(min=settings.ph_min_threshold, max=settings.ph_threshold),
+        # Low oxygen is what harms the water, so the legacy threshold is a floor
+        "dissolved_oxygen": Bounds(
+            min=(
+                settings.oxygen_min_threshold
+                if settings.oxygen_min_threshold is not None
+                else settings.oxygen_threshold
+            ),
+        ),
+        "humidity": Bounds(max=settings.humidity_threshold),
+        "turbidity": Bounds(max=settings.turbidity_threshold),
+        "conductivity": Bounds(max=settings.conductivity_threshold),
+    }
+
+
+class Limits(NamedTuple):
+    """Compiled bounds of one metric."""
+
+    metric: str
+    low: Optional[float]
+    high: Optional[float]
+
+    def breached(self, value: float) -> bool:
+        """
+        Check whether a value is out of bounds.
+
+        :param value: reading of the metric.
+        :return: whether it is below the low or above the high bound.
+        """
+        return (self.high is not None and value > self.high) or (
+            self.low is not None and value < self.low
+        )
+
+    def threshold(self, value: float) -> Optional[float]:
+        """
+        Get the bound a value is checked against.
+
+        :param value: reading of the metric.
+        :return: the low bound if the value is below it, else the high
+            bound if there is one.
+        """
+        if self.low is not None and (value < self.low or self.high is None):
+            return self.low
+        return self.high
+
+
+class ThresholdTable:
+    """
+    Thresholds of every node, compiled for lookups.
+
+    Every distinct set of bounds is a row: the defaults first, then a row
+    per group and per node with overrides. A node maps to its row through
+    a single dictionary lookup, the limits of a row are kept both as
+    tuples for single readings and as arrays for whole batches.
+    """
+
+    def __init__(
+        self,
+        limits: List[Tuple[Limits, ...]],
+        rows: Dict[str, int],
+        version: str,
+    ) -> None:
+        self.limits = limits
+        self.version = version
+        self._rows = rows
+        # Open bounds are infinite, so whole batches compare without branches
+        self.low = np.full((len(limits), len(THRESHOLD_METRICS)), -math.inf)
+        self.high = np.full((len(limits), len(THRESHOLD_METRICS)), math.inf)
+        for row, row_limits in enumerate(limits):
+            for metric_limits in row_limits:
+                column = THRESHOLD_METRICS.index(metric_limits.metric)
+                if metric_limits.low is not None:
+                    self.low[row, column] = metric_limits.low
+                if metric_limits.high is not None:
+                    self.high[row, column] = metric_limits.high
+
+    @classmethod
+    def compile(cls, profiles: ThresholdProfiles) -> "ThresholdTable":
+        """
+        Resolve the profiles into a row per distinct set of bounds.
+
+        :param profiles: thresholds of every node.
+        :return: compiled table.
+        """
+        default = {**default_bounds(), **profiles.default}
+        limits = [_limits(default)]
+        rows: Dict[str, int] = {}
+        groups: Dict[str, MetricBounds] = {}
+        for group in profiles.groups.values():
+            bounds = {**default, **group.thresholds}
+            limits.append(_limits(bounds))
+            for node_id in group.nodes:
+                rows[node_id] = len(limits) - 1
+                groups[node_id] = bounds
+        for node_id, overrides in profiles.nodes.items():
+            limits.append(_limits({**groups.get(node_id, default), **overrides}))
+            rows[node_id] = len(limits) - 1
+        return cls(limits, rows, profiles.version)
+
+    def __len__(self) -> int:
+        return len(self.limits)
+
+    def row(self, node_id: str) -> int:
+        """
+        Get the row of a node.
+
+        :param node_id: node identifier.
+        :return: row of its bounds, 0 for nodes without overrides.
+        """
+        return self._rows.get(node_id, 0)
+
+    def rows(self, node_ids: Sequence[str]) -> NDArray[np.int64]:
+        """
+        Get the rows of several nodes.
+
+        :param node_ids: node identifiers.
+        :return: row of each node.
+        """
+        return np.fromiter(
+            (self._rows.get(node_id, 0) for node_id in node_ids),
+            dtype=np.int64,
+            count=len(node_ids),
+        )
+
+    def node_limits(self, node_id: str) -> Tuple[Limits, ...]:
+        """
+        Get the checked metrics of a node.
+
+        :param node_id: node identifier.
+        :return: limits of every metric with at least one bound.
+        """
+        return self.limits[self._rows.get(node_id, 0)]
+
+    def bounds(
+        self,
+        node_id: Optional[str] = None,
+    ) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Get the effective thresholds of a node.
+
+        :param node_id: node identifier, None for the defaults.
+        :return: bounds of every checked metric.
+        """
+        row = self.limits[0] if node_id is None else self.node_limits(node_id)
+        return {
+            limits.metric: {"min": limits.low, "max": limits.high} for limits in row
+        }
+
+
+def _limits(bounds: MetricBounds) -> Tuple[Limits, ...]:
+    return tuple(
+        Limits(metric, bounds[metric].min, bounds[metric].max)
+        for metric in THRESHOLD_METRICS
+        if metric in bounds
+        and (bounds[metric].min is not None or bounds[metric].max is not None)
+    )
+
+
+class ThresholdStore:
+    """
+    Holds the compiled thresholds every checker reads.
+
+    Profiles are read from ``path``, a JSON document as described by
+    :class:`ThresholdProfiles`. A reload sends them to every worker
+    through the fan-out channel, where they are compiled and swapped in
+    at once, so checks never see a half-built table and consumers keep
+    running.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or settings.threshold_profiles_file
+        self.profiles = ThresholdProfiles()
+        self.table = ThresholdTable.compile(self.profiles)
+        self.loads = 0
+
+    def read(self) -> ThresholdProfiles:
+        """
+        Read the profiles file.
+
+        :raises ValueError: if the file is not valid JSON or not valid profiles.
+        :return: profiles, empty if no file is configured.
+        """
+        if self.path is None:
+            return ThresholdProfiles()
+        return ThresholdProfiles.model_validate_json(self.path.read_bytes())
+
+    def load(self, profiles: ThresholdProfiles) -> ThresholdTable:
+        """
+        Compile profiles and use them for every following check.
+
+        :param profiles: thresholds of every node.
+        :return: compiled table.
+        """
+        table = ThresholdTable.compile(profiles)
+        self.profiles, self.table = profiles, table
+        self.loads += 1
+        return table
+
+    def apply(self, data: Dict[str, Any]) -> None:
+        """
+        Load profiles sent by another worker.
+
+        :param data: profiles as JSON data.
+        """
+        self.load(ThresholdProfiles.model_validate(data))
+
+    async def reload(self) -> ThresholdProfiles:
+        """
+        Read the profiles file again and load it on every worker.
+
+        :raises ValueError: if the file is not valid.
+        :return: profiles read.
+        """
+        profiles = self.read()
+        await fanout.publish("thresholds", profiles.model_dump(mode="json"))
+        return profiles
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return threshold store statistics.
+
+        :return: version and size of the loaded profiles.
+        """
+        return {
+            "version": self.table.version,
+            "path": str(self.path) if self.path is not None else None,
+            "loads": self.loads,
+            "groups": len(self.profiles.groups),
+            "nodes": len(self.profiles.nodes),
+            "rows": len(self.table),
+        }
+
+
+threshold_store = ThresholdStore()
+fanout.subscribe("thresholds", threshold_store.apply)
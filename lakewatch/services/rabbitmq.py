@@ -1,15 +1,41 @@
-from typing import AsyncGenerator
+import time
+from typing import Any, AsyncGenerator, Dict, List, cast
 import aio_pika
 from aio_pika import Connection, Channel, Queue
 from aio_pika.abc import AbstractIncomingMessage, AbstractConnection
-import sqlite3
-import json
 from loguru import logger
 
-from lakewatch.services.threshold import threshold_check
-from lakewatch.services.outlier import process_outliers
+from lakewatch.services.flow import flow_controller
+from lakewatch.services.messages import dead_letters, decode_message, describe_error
+from lakewatch.services.metrics import ingest_stage, registry
+from lakewatch.services.routing import alert_router
+from lakewatch.services.writer import ingest_writer
 from lakewatch.settings import settings
 
+MESSAGES = "lakewatch_ingest_messages"
+MESSAGES_DOCUMENTATION = "Messages consumed from the ingest queue by outcome."
+
+decode_seconds = ingest_stage("decode")
+messages_processed = registry.counter(
+    MESSAGES,
+    MESSAGES_DOCUMENTATION,
+    labels={"result": "processed"},
+)
+messages_rejected = registry.counter(
+    MESSAGES,
+    MESSAGES_DOCUMENTATION,
+    labels={"result": "rejected"},
+)
+messages_failed = registry.counter(
+    MESSAGES,
+    MESSAGES_DOCUMENTATION,
+    labels={"result": "failed"},
+)
+readings_processed = registry.counter(
+    "lakewatch_ingest_readings",
+    "Readings committed from consumed messages, replays included.",
+)
+
 
 async def get_rabbitmq_connection() -> AsyncGenerator[AbstractConnection, None]:
     """Create and yield RabbitMQ connection."""
@@ -24,95 +50,57 @@ async def get_rabbitmq_connection() -> AsyncGenerator[AbstractConnection, None]:
 
 
 async def process_message(message: AbstractIncomingMessage) -> None:
-    """Process incoming RabbitMQ message and save to SQLite."""
-    async with message.process():
-        try:
-            # Parse message
-            data = json.loads(message.body.decode())
-
-            # Connect to SQLite
-            conn = sqlite3.connect(settings.db_file)
-            cursor = conn.cursor()
-
-            # Create data table if not exists
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS node_data (
-                    node_id TEXT,
-                    timestamp INTEGER,
-                    temperature REAL,
-                    ph REAL,
-                    dissolved_oxygen REAL, 
-                    PRIMARY KEY (node_id, timestamp)
-                )
-            """
-            )
+    """
+    Process incoming RabbitMQ message and save to SQLite.
 
-            # Create node metadata table if not exists
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS node_metadata (
-                    node_id TEXT PRIMARY KEY,
-                    latitude REAL,
-                    longitude REAL,
-                    last_updated INTEGER,
-                    maintenance_required INTEGER,
-                    temperature REAL,
-                    dissolved_oxygen REAL,
-                    ph REAL,
-                    FOREIGN KEY (node_id) REFERENCES node_data (node_id)
-                )
-            """
-            )
+    The body is decoded according to the message content type, JSON,
+    MessagePack or CBOR, and validated against the reading schema. A
+    binary message may carry a whole batch of readings from a gateway.
+    Messages that do not match are moved to the dead-letter queue with
+    the reason attached. Valid readings are handed to the batched ingest
+    writer and the message is only acked once all of them have been
+    committed. If they cannot be committed, the message is retried at the
+    back of the queue, and moved to the dead-letter queue once it failed
+    ``rabbitmq_max_attempts`` times. Thresholds and outliers are checked
+    for the whole batch once it is committed. The flow controller caps
+    how many messages are processed at once, the others wait for a slot.
+    """
+    async with flow_controller.slot():
+        try:
+            # Rejected with requeue if it could not be retried either,
+            # redelivered readings that were committed after all are skipped
+            async with message.process(requeue=True):
+                try:
+                    await _process(message)
+                except Exception as e:
+                    messages_failed.inc()
+                    logger.error(f"Error processing message: {e}")
+                    await dead_letters.retry(message, settings.rabbitmq_queue, str(e))
+        except Exception as e:
+            logger.error(f"Error retrying message, requeued: {e}")
 
-            # Insert data
-            cursor.execute(
-                "INSERT INTO node_data (node_id, timestamp, temperature, ph, dissolved_oxygen) VALUES (?, ?, ?, ?, ?)",
-                (
-                    data["node_id"],
-                    data["timestamp"],
-                    data["temperature"],
-                    data["ph"],
-                    data["dissolved_oxygen"],
-                ),
-            )
 
-            # Insert or update node metadata
-            cursor.execute(
-                """
-                INSERT INTO node_metadata (node_id, latitude, longitude, last_updated, maintenance_required, temperature, ph, dissolved_oxygen)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(node_id) DO UPDATE SET
-                latitude = excluded.latitude,
-                longitude = excluded.longitude,
-                last_updated = excluded.last_updated,
-                maintenance_required = excluded.maintenance_required,
-                temperature = excluded.temperature,
-                ph = excluded.ph,
-                dissolved_oxygen = excluded.dissolved_oxygen
-                WHERE node_metadata.last_updated < excluded.last_updated
-                OR node_metadata.maintenance_required != excluded.maintenance_required
-                """,
-                (
-                    data["node_id"],
-                    data["latitude"],
-                    data["longitude"],
-                    data["timestamp"],
-                    data["maintenance_required"],
-                    data["temperature"],
-                    data["ph"],
-                    data["dissolved_oxygen"],
-                ),
-            )
+async def _process(message: AbstractIncomingMessage) -> None:
+    started = time.perf_counter()
+    try:
+        readings = decode_message(message.body, message.content_type)
+    except ValueError as e:
+        messages_rejected.inc()
+        await dead_letters.publish(message, describe_error(e))
+        return
+    finally:
+        decode_seconds.observe(time.perf_counter() - started)
 
-            cursor.close()
-            conn.commit()
-            conn.close()
+    # Wait for the batches holding these readings to be committed
+    await ingest_writer.submit_many(cast(List[Dict[str, Any]], readings))
+    messages_processed.inc()
+    readings_processed.inc(len(readings))
 
-            logger.info(f"Processed message from node {data['node_id']}")
+    if len(readings) == 1:
+        logger.info(f"Processed message from node {readings[0]['node_id']}")
+    else:
+        logger.info(f"Processed message with {len(readings)} readings")
 
-            await threshold_check(data)
-            await process_outliers(data)
 
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
+# Alerts are raised by the worker owning the node of the readings
+ingest_writer.on_commit(alert_router.route)
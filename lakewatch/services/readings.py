@@ -0,0 +1,34 @@
+import enum
+
+
+class Metric(str, enum.Enum):
+    """Sensor metrics stored for every reading."""
+
+    TEMPERATURE = "temperature"
+    PH = "ph"
+    DISSOLVED_OXYGEN = "dissolved_oxygen"
+
+
+METRICS = tuple(metric.value for metric in Metric)
+
+
+class BucketSize(str, enum.Enum):
+    """Supported aggregation bucket sizes."""
+
+    MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    HOUR = "1h"
+    DAY = "1d"
+
+    @property
+    def seconds(self) -> int:
+        """Width of the bucket in seconds."""
+        return BUCKET_SECONDS[self]
+
+
+BUCKET_SECONDS = {
+    BucketSize.MINUTE: 60,
+    BucketSize.FIVE_MINUTES: 5 * 60,
+    BucketSize.HOUR: 60 * 60,
+    BucketSize.DAY: 24 * 60 * 60,
+}
@@ -0,0 +1,54 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from lakewatch.services.fanout import fanout
+from lakewatch.settings import settings
+
+# Reports of workers that stopped reporting for this many intervals are dropped
+STALE_TICKS = 3
+
+
+class WorkerReports:
+    """
+    Keeps the latest report every worker sent through the fan-out channel.
+
+    Workers report every ``interval`` seconds, so a worker that missed a
+    few reports has stopped and is left out.
+    """
+
+    def __init__(self, interval: Optional[float] = None) -> None:
+        self.interval = (
+            interval
+            if interval is not None
+            else settings.ingest_flow_interval_ms / 1000
+        )
+        self._reports: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def apply(self, data: Dict[str, Any]) -> None:
+        """
+        Keep the report sent by a worker.
+
+        :param data: report holding the ``worker`` it came from.
+        """
+        self._reports[data["worker"]] = (time.monotonic(), data)
+
+    def latest(self) -> List[Dict[str, Any]]:
+        """
+        Get the latest report of every running worker.
+
+        :return: reports received recently, sorted by worker.
+        """
+        cutoff = time.monotonic() - STALE_TICKS * self.interval
+        for worker, (received, _) in list(self._reports.items()):
+            if received < cutoff:
+                del self._reports[worker]
+        return [report for _, (_, report) in sorted(self._reports.items())]
+
+    def clear(self) -> None:
+        """Forget every report."""
+        self._reports.clear()
+
+
+# Writer, retention, dead-letter and routing statistics of the ingest workers
+ingest_reports = WorkerReports()
+fanout.subscribe("ingest", ingest_reports.apply)
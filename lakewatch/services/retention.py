@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import sqlite3
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.services.readings import BucketSize
+from lakewatch.settings import settings
+
+# Walks the (node_id, timestamp) index, so every chunk touches only the
+# rows it deletes instead of scanning the table.
+DELETE_EXPIRED_CHUNK = """
+    DELETE FROM node_data WHERE rowid IN (
+        SELECT rowid FROM node_data
+        WHERE node_id = ? AND timestamp < ?
+        LIMIT ?
+    )
+"""
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def retention_cutoff(now: Optional[float] = None) -> Optional[int]:
+    """
+    Get the timestamp raw readings before which are pruned.
+
+    :param now: current time, defaults to the wall clock.
+    :return: the cutoff, or None if retention is disabled.
+    """
+    if settings.raw_retention_days <= 0:
+        return None
+    retention = settings.raw_retention_days * BucketSize.DAY.seconds
+    return int(now if now is not None else time.time()) - retention
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int) -> int:
+    """
+    Return up to ``pages`` free pages to the file system.
+
+    Does nothing unless the database was created with incremental
+    auto-vacuum.
+
+    :param conn: writer connection.
+    :param pages: maximum number of pages to release.
+    :return: number of pages released.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return int(before - conn.execute("PRAGMA freelist_count").fetchone()[0])
+
+
+class RetentionWorker:
+    """
+    Periodically prunes raw readings older than the retention period.
+
+    Rows are deleted per node in small chunks, each in its own short
+    transaction queued behind ingest batches on the database writer, so
+    pruning never holds the write lock for long. Rollup tables are kept
+    indefinitely.
+    """
+
+    def __init__(self) -> None:
+        self.total_pruned = 0
+        self.last_run: Dict[str, Any] = {}
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Start the periodic pruning task unless retention is disabled."""
+        if settings.raw_retention_days <= 0:
+            logger.info("Raw data retention disabled, keeping all readings")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic pruning task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return retention statistics.
+
+        :return: total rows pruned and details of the last run.
+        """
+        return {"total_pruned": self.total_pruned, "last_run": self.last_run}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Error pruning expired readings: {e}")
+            await asyncio.sleep(settings.retention_interval_seconds)
+
+    async def prune(self, now: Optional[float] = None) -> int:
+        """
+        Delete raw readings older than the retention period.
+
+        :param now: current time, defaults to the wall clock.
+        :return: number of rows deleted.
+        """
+        cutoff = retention_cutoff(now)
+        if cutoff is None:
+            return 0
+        started = time.perf_counter()
+        chunk = settings.retention_chunk_size
+
+        pruned = 0
+        nodes = await database.fetch("SELECT node_id FROM node_metadata")
+        for node in nodes:
+            while True:
+                deleted = await database.execute(
+                    DELETE_EXPIRED_CHUNK,
+                    (node["node_id"], cutoff, chunk),
+                )
+                pruned += deleted
+                if deleted < chunk:
+                    break
+        vacuumed = await database.transaction(
+            lambda conn: incremental_vacuum(conn, settings.retention_vacuum_pages),
+        )
+
+        elapsed = time.perf_counter() - started
+        self.total_pruned += pruned
+        self.last_run = {
+            "cutoff": cutoff,
+            "pruned": pruned,
+            "vacuumed_pages": vacuumed,
+            "seconds": elapsed,
+            "finished_at": int(time.time()),
+        }
+        logger.info(
+            f"Pruned {pruned} readings older than {cutoff} and released "
+            f"{vacuumed} pages in {elapsed:.2f}s",
+        )
+        return pruned
+
+
+def enable_incremental_vacuum(path: Path) -> None:
+    """
+    Switch an existing database to incremental auto-vacuum.
+
+    This rewrites the whole file with VACUUM, so run it while the
+    application is stopped.
+
+    :param path: database file.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Prune expired readings once.
+
+    :param argv: command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m lakewatch.services.retention",
+        description="Delete raw readings older than the retention period.",
+    )
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="Convert the database to incremental auto-vacuum first (runs VACUUM).",
+    )
+    args = parser.parse_args(argv)
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(settings.db_file)
+
+    async def run() -> None:
+        await database.migrate()
+        try:
+            await RetentionWorker().prune()
+        finally:
+            database.close()
+
+    asyncio.run(run())
+
+
+retention_worker = RetentionWorker()
+
+
+if __name__ == "__main__":
+    main()
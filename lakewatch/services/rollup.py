@@ -0,0 +1,216 @@
+import argparse
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from lakewatch.db.migrations import apply_pragmas, migrate
+from lakewatch.services.readings import METRICS, BucketSize
+from lakewatch.services.retention import retention_cutoff
+from lakewatch.settings import settings
+
+# Rollup tables maintained at ingest time, finest first
+ROLLUP_TABLES = {
+    BucketSize.MINUTE: "node_rollup_1m",
+    BucketSize.HOUR: "node_rollup_1h",
+    BucketSize.DAY: "node_rollup_1d",
+}
+
+ROLLUP_COLUMNS = ["count"] + [
+    f"{metric}_{field}"
+    for metric in METRICS
+    for field in ("count", "sum", "min", "max")
+]
+
+DAY = BucketSize.DAY.seconds
+
+
+def _merge(column: str) -> str:
+    if column.endswith("_min") or column.endswith("_max"):
+        func = column[-3:]
+        # Scalar min()/max() return NULL if any argument is NULL
+        return (
+            f"{column} = coalesce({func}({column}, excluded.{column}), "
+            f"{column}, excluded.{column})"
+        )
+    return f"{column} = {column} + excluded.{column}"
+
+
+def _upsert_sql(table: str) -> str:
+    columns = ", ".join(ROLLUP_COLUMNS)
+    placeholders = ", ".join("?" for _ in range(len(ROLLUP_COLUMNS) + 2))
+    updates = ",\n        ".join(_merge(column) for column in ROLLUP_COLUMNS)
+    return f"""
+        INSERT INTO {table} (node_id, bucket, {columns})
+        VALUES ({placeholders})
+        ON CONFLICT (node_id, bucket) DO UPDATE SET
+        {updates}
+    """  # noqa: S608
+
+
+def _rebuild_sql(table: str, width: int) -> str:
+    columns = ", ".join(ROLLUP_COLUMNS)
+    aggregates = ",\n            ".join(
+        f"COUNT({metric}), TOTAL({metric}), MIN({metric}), MAX({metric})"
+        for metric in METRICS
+    )
+    return f"""
+        INSERT INTO {table} (node_id, bucket, {columns})
+        SELECT
+            node_id,
+            (timestamp / {width}) * {width} AS bucket,
+            COUNT(*),
+            {aggregates}
+        FROM node_data
+        WHERE timestamp >= ? AND timestamp < ?
+        GROUP BY node_id, bucket
+    """
+
+
+UPSERT_ROLLUP = {size: _upsert_sql(table) for size, table in ROLLUP_TABLES.items()}
+REBUILD_ROLLUP = {
+    size: _rebuild_sql(table, size.seconds) for size, table in ROLLUP_TABLES.items()
+}
+
+
+def accumulate(
+    readings: Iterable[Sequence[Any]],
+) -> Dict[BucketSize, List[Tuple[Any, ...]]]:
+    """
+    Pre-aggregate readings per node and bucket of every rollup table.
+
+    :param readings: node_data rows as (node_id, timestamp, *metrics).
+    :return: upsert parameters per rollup bucket size.
+    """
+    buckets: Dict[BucketSize, Dict[Tuple[str, int], List[Any]]] = {
+        size: {} for size in ROLLUP_TABLES
+    }
+    for node_id, timestamp, *values in readings:
+        for size, acc in buckets.items():
+            key = (node_id, (timestamp // size.seconds) * size.seconds)
+            stats = acc.get(key)
+            if stats is None:
+                stats = acc[key] = [0] + [0, 0.0, None, None] * len(METRICS)
+            stats[0] += 1
+            for offset, value in zip(range(1, len(stats), 4), values):
+                if value is None:
+                    continue
+                stats[offset] += 1
+                stats[offset + 1] += value
+                low, high = stats[offset + 2], stats[offset + 3]
+                stats[offset + 2] = value if low is None else min(low, value)
+                stats[offset + 3] = value if high is None else max(high, value)
+    return {
+        size: [(*key, *stats) for key, stats in acc.items()]
+        for size, acc in buckets.items()
+    }
+
+
+def apply_rollups(conn: sqlite3.Connection, readings: Iterable[Sequence[Any]]) -> None:
+    """
+    Fold freshly inserted readings into every rollup table.
+
+    Must run in the same transaction that inserted the readings.
+
+    :param conn: writer connection.
+    :param readings: node_data rows as (node_id, timestamp, *metrics).
+    """
+    for size, params in accumulate(readings).items():
+        if params:
+            conn.executemany(UPSERT_ROLLUP[size], params)
+
+
+def rebuild_day(conn: sqlite3.Connection, day: int) -> None:
+    """
+    Recompute every rollup bucket of a single day from node_data.
+
+    :param conn: writer connection inside a transaction.
+    :param day: timestamp of the start of the day.
+    """
+    for size, table in ROLLUP_TABLES.items():
+        conn.execute(
+            f"DELETE FROM {table} WHERE bucket >= ? AND bucket < ?",  # noqa: S608
+            (day, day + DAY),
+        )
+        conn.execute(REBUILD_ROLLUP[size], (day, day + DAY))
+
+
+def rebuild_rollups(
+    conn: sqlite3.Connection,
+    since: Optional[int] = None,
+    cutoff: Optional[int] = None,
+) -> int:
+    """
+    Rebuild the rollup tables from the raw readings.
+
+    Work is split into one transaction per day so concurrent ingest is
+    only ever blocked briefly. Rollups of days before ``since`` (or
+    before the oldest raw reading) are left untouched, so history whose
+    raw data has already been pruned survives a rebuild. Neither is the
+    day of the oldest raw reading if it starts before ``cutoff``, the
+    readings pruned from its start are only left in its rollups.
+
+    :param conn: writer connection in autocommit mode.
+    :param since: first timestamp to rebuild, defaults to the oldest reading.
+    :param cutoff: raw readings before it may have been pruned, None if
+        none were.
+    :return: number of days rebuilt.
+    """
+    first, last = conn.execute(
+        "SELECT MIN(timestamp), MAX(timestamp) FROM node_data WHERE timestamp >= ?",
+        (since or 0,),
+    ).fetchone()
+    if first is None:
+        return 0
+
+    start = (first // DAY) * DAY
+    if cutoff is not None and start < cutoff:
+        # Start at the first day fully covered by raw data
+        start = -(-first // DAY) * DAY
+    days = 0
+    for day in range(start, last + 1, DAY):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rebuild_day(conn, day)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        days += 1
+    return days
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Backfill the rollup tables from historical readings.
+
+    :param argv: command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m lakewatch.services.rollup",
+        description="Rebuild the rollup tables from node_data.",
+    )
+    parser.add_argument(
+        "--since",
+        type=int,
+        default=None,
+        help="Unix timestamp to rebuild from, defaults to the oldest reading.",
+    )
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(settings.db_file, isolation_level=None)
+    try:
+        apply_pragmas(conn)
+        migrate(conn)
+        started = time.perf_counter()
+        days = rebuild_rollups(conn, args.since, retention_cutoff())
+        logger.info(
+            f"Rebuilt rollups for {days} days in {time.perf_counter() - started:.1f}s",
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
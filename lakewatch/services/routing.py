@@ -0,0 +1,179 @@
+import asyncio
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import aio_pika
+import ujson
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractExchange,
+    AbstractIncomingMessage,
+    AbstractQueue,
+)
+from loguru import logger
+
+from lakewatch.services.evaluate import evaluate_batch
+from lakewatch.services.messages import dead_letters
+from lakewatch.settings import settings
+
+# Committed readings waiting for their owner, small batches are enough
+ROUTED_PREFETCH = 16
+
+
+def owner(node_id: str, workers: int) -> int:
+    """
+    Get the worker that checks the alerts of a node.
+
+    Stable across processes and restarts, unlike ``hash``.
+
+    :param node_id: node of the readings.
+    :param workers: number of ingest workers.
+    :return: index of the owning worker.
+    """
+    return zlib.crc32(node_id.encode()) % workers
+
+
+class AlertRouter:
+    """
+    Checks every node's readings for alerts on a single worker.
+
+    Ingest workers compete for messages, so the readings of a node are
+    committed by whichever worker received them. Alert state, cooldowns
+    and outlier windows are kept in memory, so they are checked by the
+    worker owning the node instead. Committed readings of nodes owned by
+    another worker are published to its durable queue on a direct
+    exchange, keyed by the worker index. The owner checks them in the
+    order they arrive, one batch at a time. Batches that fail to be
+    checked are retried a few times, then dead-lettered. With a single worker, or
+    without a channel, every batch is checked in-process.
+
+    Changing the number of workers moves nodes to other workers, and
+    their alert state starts over.
+    """
+
+    def __init__(self, exchange: Optional[str] = None) -> None:
+        self.exchange_name = exchange or settings.rabbitmq_alert_exchange
+        self.index = 0
+        self.workers = 1
+        self.forwarded = 0
+        self.received = 0
+        self._lock = asyncio.Lock()
+        self._channel: Optional[AbstractChannel] = None
+        self._exchange: Optional[AbstractExchange] = None
+        self._queue: Optional[AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+
+    async def start(self, channel: AbstractChannel, index: int, workers: int) -> None:
+        """
+        Consume the readings of the nodes this worker owns.
+
+        :param channel: channel dedicated to routed readings.
+        :param index: index of this worker.
+        :param workers: number of ingest workers.
+        """
+        self.index = index
+        self.workers = workers
+        self._channel = channel
+        await channel.set_qos(prefetch_count=ROUTED_PREFETCH)
+        self._exchange = await channel.declare_exchange(
+            self.exchange_name,
+            aio_pika.ExchangeType.DIRECT,
+            durable=True,
+        )
+        self._queue = await channel.declare_queue(
+            f"{settings.rabbitmq_queue}.alerts.{index}",
+            durable=True,
+        )
+        await self._queue.bind(self._exchange, routing_key=str(index))
+        self._consumer_tag = await self._queue.consume(self._on_message)
+        logger.info(f"Checking alerts of nodes owned by worker {index}/{workers}")
+
+    async def stop(self) -> None:
+        """Stop consuming, routed readings not acked yet are redelivered."""
+        if self._queue is not None and self._consumer_tag is not None:
+            await self._queue.cancel(self._consumer_tag)
+        if self._channel is not None:
+            await self._channel.close()
+        self._channel = None
+        self._exchange = None
+        self._queue = None
+        self._consumer_tag = None
+        self.index = 0
+        self.workers = 1
+
+    async def route(
+        self,
+        readings: List[Dict[str, Any]],
+        late: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """
+        Check committed readings here or hand them to the owning workers.
+
+        Registered as a commit hook of the ingest writer.
+
+        :param readings: committed sensor readings in arrival order.
+        :param late: committed readings older than the latest of their node.
+        """
+        late = late or []
+        if self._exchange is None:
+            await self._evaluate(readings, late)
+            return
+        owned: Dict[int, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+        for group, batch in enumerate((readings, late)):
+            for data in batch:
+                index = owner(data["node_id"], self.workers)
+                owned.setdefault(index, ([], []))[group].append(data)
+        for index, (new, old) in owned.items():
+            if index == self.index:
+                await self._evaluate(new, old)
+                continue
+            await self._exchange.publish(
+                aio_pika.Message(
+                    ujson.dumps({"readings": new, "late": old}).encode(),
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=str(index),
+            )
+            self.forwarded += len(new) + len(old)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return routing statistics.
+
+        :return: worker index and count, readings forwarded to other
+            workers and received from them.
+        """
+        return {
+            "index": self.index,
+            "workers": self.workers,
+            "forwarded": self.forwarded,
+            "received": self.received,
+        }
+
+    async def _on_message(self, message: AbstractIncomingMessage) -> None:
+        # Checks that keep failing are parked instead of retried forever
+        async with message.process(requeue=True):
+            body = ujson.loads(message.body)
+            # Lists were sent before late readings were routed as well
+            readings = body if isinstance(body, list) else body["readings"]
+            late = [] if isinstance(body, list) else body["late"]
+            self.received += len(readings) + len(late)
+            try:
+                await self._evaluate(readings, late)
+            except Exception as e:
+                logger.error(f"Error checking routed readings: {e}")
+                queue = self._queue.name if self._queue is not None else ""
+                await dead_letters.retry(message, queue, str(e))
+
+    async def _evaluate(
+        self,
+        readings: List[Dict[str, Any]],
+        late: List[Dict[str, Any]],
+    ) -> None:
+        # Batches of the writer and of other workers must not interleave
+        async with self._lock:
+            await evaluate_batch(readings, late)
+
+
+alert_router = AlertRouter()
@@ -0,0 +1,236 @@
+import enum
+import itertools
+import math
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from pydantic import BaseModel, field_validator, model_validator
+
+from lakewatch.settings import settings
+
+Key = TypeVar("Key", bound=Hashable)
+Cell = Tuple[int, int]
+
+# Alert fields clients can filter on by exact value
+FILTER_FIELDS = {"node_id": "node_ids", "metric": "metrics", "severity": "severities"}
+
+
+class Severity(str, enum.Enum):
+    """Severity of an alert."""
+
+    INFO = "info"
+    WARNING = "warning"
+    CRITICAL = "critical"
+
+
+class Subscription(BaseModel):
+    """
+    Alerts a WebSocket client wants to receive.
+
+    Every filter left unset matches everything, so the default
+    subscription receives every alert. ``bbox`` is given as
+    ``[min_longitude, min_latitude, max_longitude, max_latitude]``.
+    """
+
+    node_ids: Optional[FrozenSet[str]] = None
+    metrics: Optional[FrozenSet[str]] = None
+    severities: Optional[FrozenSet[str]] = None
+    bbox: Optional[Tuple[float, float, float, float]] = None
+
+    @field_validator("severities")
+    @classmethod
+    def check_severities(
+        cls,
+        value: Optional[FrozenSet[str]],
+    ) -> Optional[FrozenSet[str]]:
+        """Only accept known severities, kept as plain strings for lookups."""
+        if value is not None:
+            for severity in value:
+                Severity(severity)
+        return value
+
+    @model_validator(mode="after")
+    def check_bbox(self) -> "Subscription":
+        """Reject bounding boxes whose corners are swapped."""
+        if self.bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            if min_lon > max_lon or min_lat > max_lat:
+                raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat]")
+        return self
+
+    def matches(self, alert: Dict[str, Any]) -> bool:
+        """
+        Check whether an alert passes every filter.
+
+        :param alert: alert metadata.
+        :return: whether the alert should be delivered.
+        """
+        for field, attribute in FILTER_FIELDS.items():
+            values = getattr(self, attribute)
+            if values is not None and alert.get(field) not in values:
+                return False
+        if self.bbox is not None:
+            lat, lon = alert.get("latitude"), alert.get("longitude")
+            if lat is None or lon is None:
+                return False
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+        return True
+
+
+class SubscriptionIndex(Generic[Key]):
+    """
+    Finds the subscribers of an alert without visiting every subscriber.
+
+    Every filter field keeps the subscribers per accepted value next to
+    the subscribers that accept any value. Bounding boxes are indexed on
+    a grid of ``cell_degrees`` cells, and boxes spanning more than
+    ``max_cells`` cells are kept aside and checked one by one. A lookup
+    only walks the smallest of these candidate sets and checks the full
+    subscription of each candidate, so its cost follows the number of
+    matching clients rather than the number of connected ones.
+    """
+
+    def __init__(
+        self,
+        cell_degrees: Optional[float] = None,
+        max_cells: Optional[int] = None,
+    ) -> None:
+        self.cell_degrees = cell_degrees or settings.ws_bbox_cell_degrees
+        self.max_cells = max_cells or settings.ws_bbox_max_cells
+        self._subscriptions: Dict[Key, Subscription] = {}
+        self._exact: Dict[str, Dict[Any, Set[Key]]] = {
+            field: {} for field in FILTER_FIELDS
+        }
+        self._any: Dict[str, Set[Key]] = {field: set() for field in FILTER_FIELDS}
+        self._cells: Dict[Cell, Set[Key]] = {}
+        self._large: Set[Key] = set()
+        self._anywhere: Set[Key] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def get(self, key: Key) -> Optional[Subscription]:
+        """
+        Get the subscription of a subscriber.
+
+        :param key: subscriber.
+        :return: its subscription, or None if it is not subscribed.
+        """
+        return self._subscriptions.get(key)
+
+    def add(self, key: Key, subscription: Subscription) -> None:
+        """
+        Subscribe, replacing any previous subscription of the same key.
+
+        :param key: subscriber.
+        :param subscription: alerts to deliver to it.
+        """
+        self.remove(key)
+        self._subscriptions[key] = subscription
+        for field, attribute in FILTER_FIELDS.items():
+            values = getattr(subscription, attribute)
+            if values is None:
+                self._any[field].add(key)
+                continue
+            for value in values:
+                self._exact[field].setdefault(value, set()).add(key)
+        cells = self._bbox_cells(subscription)
+        if subscription.bbox is None:
+            self._anywhere.add(key)
+        elif cells is None:
+            self._large.add(key)
+        else:
+            for cell in cells:
+                self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: Key) -> None:
+        """
+        Unsubscribe.
+
+        :param key: subscriber.
+        """
+        subscription = self._subscriptions.pop(key, None)
+        if subscription is None:
+            return
+        for field, attribute in FILTER_FIELDS.items():
+            values = getattr(subscription, attribute)
+            if values is None:
+                self._any[field].discard(key)
+                continue
+            for value in values:
+                _discard(self._exact[field], value, key)
+        self._anywhere.discard(key)
+        self._large.discard(key)
+        for cell in self._bbox_cells(subscription) or ():
+            _discard(self._cells, cell, key)
+
+    def match(self, alert: Dict[str, Any]) -> List[Key]:
+        """
+        Find every subscriber of an alert.
+
+        :param alert: alert metadata.
+        :return: subscribers whose subscription matches the alert.
+        """
+        candidates: List[Tuple[int, Iterable[Key]]] = []
+        for field in FILTER_FIELDS:
+            exact = self._exact[field].get(alert.get(field), _EMPTY)
+            anything = self._any[field]
+            candidates.append(
+                (len(exact) + len(anything), itertools.chain(exact, anything)),
+            )
+        cell = self._cell(alert.get("latitude"), alert.get("longitude"))
+        placed = self._cells.get(cell, _EMPTY) if cell is not None else _EMPTY
+        large = self._large if cell is not None else _EMPTY
+        candidates.append(
+            (
+                len(placed) + len(large) + len(self._anywhere),
+                itertools.chain(placed, large, self._anywhere),
+            ),
+        )
+        _, smallest = min(candidates, key=lambda candidate: candidate[0])
+        return [key for key in smallest if self._subscriptions[key].matches(alert)]
+
+    def _cell(self, lat: Optional[float], lon: Optional[float]) -> Optional[Cell]:
+        if lat is None or lon is None:
+            return None
+        return (
+            math.floor(lon / self.cell_degrees),
+            math.floor(lat / self.cell_degrees),
+        )
+
+    def _bbox_cells(self, subscription: Subscription) -> Optional[List[Cell]]:
+        if subscription.bbox is None:
+            return []
+        min_lon, min_lat, max_lon, max_lat = subscription.bbox
+        low = self._cell(min_lat, min_lon)
+        high = self._cell(max_lat, max_lon)
+        assert low is not None and high is not None  # noqa: S101
+        columns = range(low[0], high[0] + 1)
+        rows = range(low[1], high[1] + 1)
+        if len(columns) * len(rows) > self.max_cells:
+            return None
+        return [(column, row) for column in columns for row in rows]
+
+
+_EMPTY: FrozenSet[Any] = frozenset()
+
+
+def _discard(index: Dict[Any, Set[Key]], value: Any, key: Key) -> None:
+    keys = index.get(value)
+    if keys is None:
+        return
+    keys.discard(key)
+    if not keys:
+        del index[value]
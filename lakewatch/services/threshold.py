@@ -1,52 +1,153 @@
 from loguru import logger
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from lakewatch.settings import settings
+from lakewatch.services.alerts import (
+    AlertKind,
+    AlertState,
+    Transition,
+    alert_engine,
+    describe,
+)
+from lakewatch.services.outlier import ALERT_LABELS
+from lakewatch.services.profiles import Limits, threshold_store
+from lakewatch.services.subscriptions import Severity
+from lakewatch.services.writer import ingest_writer
 from lakewatch.web.api.monitoring.views import send_threshold_alert
 
+# Human readable name of every metric with thresholds
+THRESHOLD_LABELS = {
+    "temperature": "Temperature",
+    "ph": "pH",
+    "dissolved_oxygen": "Oxygen",
+    "humidity": "Humidity",
+    "turbidity": "Turbidity",
+    "conductivity": "Conductivity",
+}
 
-async def threshold_check(payload: Dict[str, Any]) -> None:
+
+def cleared(limits: Limits, value: float) -> bool:
     """
-    Check if sensor readings exceed threshold values and send alerts if needed.
+    Check whether a value is far enough inside its bounds to clear an alert.
 
     Args:
-        payload: Dictionary containing sensor data with node information and readings
+        limits: Bounds of the metric
+        value: Reading of the metric
+
+    Returns:
+        Whether the value is within both bounds by the hysteresis margin
     """
-    # Extract the node information
-    node_id = payload.get("node_id")
-    latitude = payload.get("latitude")
-    longitude = payload.get("longitude")
-    timestamp = payload.get("timestamp")
+    return (limits.high is None or value <= alert_engine.clear_below(limits.high)) and (
+        limits.low is None or value >= alert_engine.clear_above(limits.low)
+    )
 
-    if (
-        "temperature" in payload
-        and payload["temperature"] > settings.temperature_threshold
-    ):
-        await send_threshold_alert(
-            message=f"Temperature threshold exceeded: {payload['temperature']}"
-        )
-        logger.info(
-            f"Node {node_id}: Temperature threshold exceeded: {payload['temperature']}"
+
+def transition_message(
+    transition: Transition,
+    payload: Dict[str, Any],
+    threshold: Optional[float] = None,
+) -> str:
+    """
+    Render the alert text of a transition.
+
+    Args:
+        transition: Alert transition
+        payload: Reading that caused it
+        threshold: Threshold the value was checked against
+
+    Returns:
+        Message for clients
+    """
+    if transition.kind is AlertKind.MAINTENANCE:
+        node_id = transition.node_id
+        if transition.state is AlertState.RESOLVED:
+            return f"Maintenance completed for node {node_id}"
+        latitude = payload.get("latitude")
+        longitude = payload.get("longitude")
+        return (
+            f"Maintenance required for node {node_id} "
+            f"at location ({latitude}, {longitude})"
         )
+    if transition.kind is AlertKind.OUTLIER:
+        label = ALERT_LABELS[transition.metric]
+        return describe(transition, f"Outlier detected in {label}", label)
+    label = THRESHOLD_LABELS[transition.metric]
+    if threshold is not None and transition.value < threshold:
+        return describe(transition, f"{label} below threshold", label)
+    return describe(transition, f"{label} threshold exceeded", label)
+
 
-    if "ph" in payload and payload["ph"] > settings.ph_threshold:
-        await send_threshold_alert(message=f"pH threshold exceeded: {payload['ph']}")
-        logger.info(f"Node {node_id}: pH threshold exceeded: {payload['ph']}")
+async def notify(
+    transition: Transition,
+    payload: Dict[str, Any],
+    threshold: Optional[float] = None,
+) -> None:
+    """
+    Record an alert transition and send it to the subscribed clients.
 
+    Args:
+        transition: Alert transition
+        payload: Reading that caused it
+        threshold: Threshold the value was checked against
+    """
+    ingest_writer.record_alert(transition.event(payload.get("timestamp"), threshold))
+    message = transition_message(transition, payload, threshold)
     if (
-        "dissolved_oxygen" in payload
-        and payload["dissolved_oxygen"] > settings.oxygen_threshold
+        transition.kind is AlertKind.MAINTENANCE
+        or transition.state is AlertState.RESOLVED
     ):
-        await send_threshold_alert(
-            message=f"Oxygen threshold exceeded: {payload['dissolved_oxygen']}"
-        )
-        logger.info(
-            f"Node {node_id}: Oxygen threshold exceeded: {payload['dissolved_oxygen']}"
+        severity = Severity.INFO
+    else:
+        severity = Severity.WARNING
+    await send_threshold_alert(
+        message=message,
+        node_id=transition.node_id,
+        metric=transition.metric,
+        severity=severity,
+        latitude=payload.get("latitude"),
+        longitude=payload.get("longitude"),
+    )
+    logger.info(f"Node {transition.node_id}: {message}")
+
+
+async def threshold_check(payload: Dict[str, Any]) -> None:
+    """
+    Check if sensor readings exceed threshold values and send alerts if needed.
+
+    Alerts are only sent when they open, resolve or are due for a digest,
+    see :class:`~lakewatch.services.alerts.AlertEngine`. The bounds of
+    the node come from the loaded threshold profiles. A reading clears an
+    alert once it is inside its bounds by the hysteresis margin.
+
+    Args:
+        payload: Dictionary containing sensor data with node information and readings
+    """
+    node_id = payload["node_id"]
+
+    for limits in threshold_store.table.node_limits(node_id):
+        value = payload.get(limits.metric)
+        if value is None:
+            continue
+        transition = alert_engine.observe(
+            node_id,
+            limits.metric,
+            AlertKind.THRESHOLD,
+            value,
+            breached=limits.breached(value),
+            cleared=cleared(limits, value),
         )
+        if transition is not None:
+            await notify(transition, payload, limits.threshold(value))
 
-    # Check if maintenance is required
-    if payload.get("maintenance_required", 0) == 1:
-        await send_threshold_alert(
-            message=f"Maintenance required for node {node_id} at location ({latitude}, {longitude})"
+    # Check if maintenance is required, a missing or null flag is not reported
+    if payload.get("maintenance_required") is not None:
+        required = payload["maintenance_required"] == 1
+        transition = alert_engine.observe(
+            node_id,
+            "maintenance_required",
+            AlertKind.MAINTENANCE,
+            payload["maintenance_required"],
+            breached=required,
+            cleared=not required,
         )
-        logger.warning(f"Maintenance required for node {node_id}")
+        if transition is not None:
+            await notify(transition, payload)
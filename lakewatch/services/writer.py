@@ -0,0 +1,585 @@
+import asyncio
+import sqlite3
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+import ujson
+from loguru import logger
+
+from lakewatch.db import database
+from lakewatch.services.alerts import AlertEvent
+from lakewatch.services.metrics import Histogram, ingest_stage, registry
+from lakewatch.services.fanout import fanout
+from lakewatch.services.rollup import apply_rollups
+from lakewatch.settings import settings
+
+INSERT_NODE_DATA = """
+    INSERT INTO node_data (node_id, timestamp, temperature, ph, dissolved_oxygen)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (node_id, timestamp) DO NOTHING
+"""
+
+SELECT_STORED_READINGS = """
+    SELECT node_id, timestamp FROM node_data
+    WHERE (node_id, timestamp) IN (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+        FROM json_each(?)
+    )
+"""
+
+SELECT_LAST_UPDATED = """
+    SELECT node_id, last_updated FROM node_metadata
+    WHERE node_id IN (SELECT value FROM json_each(?))
+"""
+
+UPSERT_NODE_METADATA = """
+    INSERT INTO node_metadata (
+        node_id, latitude, longitude, last_updated, maintenance_required,
+        temperature, ph, dissolved_oxygen
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(node_id) DO UPDATE SET
+    latitude = excluded.latitude,
+    longitude = excluded.longitude,
+    last_updated = excluded.last_updated,
+    maintenance_required = excluded.maintenance_required,
+    temperature = excluded.temperature,
+    ph = excluded.ph,
+    dissolved_oxygen = excluded.dissolved_oxygen
+    WHERE node_metadata.last_updated < excluded.last_updated
+    OR node_metadata.maintenance_required != excluded.maintenance_required
+"""
+
+INSERT_ALERT_EVENT = """
+    INSERT INTO alert_events (node_id, metric, kind, state, value, threshold, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_ALERT_COUNT = """
+    INSERT INTO alert_counts (node_id, metric, kind, state, count, last_timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (node_id, metric, kind, state) DO UPDATE SET
+    count = count + excluded.count,
+    last_timestamp = max(last_timestamp, excluded.last_timestamp)
+"""
+
+FLUSH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+FLUSH_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+PendingItem = Tuple[Dict[str, Any], "asyncio.Future[None]"]
+QueueItem = Union[PendingItem, AlertEvent]
+# Called with the new readings of a batch and the late ones
+CommitHook = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Awaitable[Any]]
+Rows = Dict[int, Tuple[Tuple[Any, ...], Tuple[Any, ...]]]
+
+# Observed on the database writer thread, once per batch
+insert_seconds = ingest_stage("insert")
+upsert_seconds = ingest_stage("upsert")
+rollup_seconds = ingest_stage("rollup")
+# From the end of the batch to the flush task resuming, mostly the commit
+commit_seconds = ingest_stage("commit")
+
+
+class Replays(NamedTuple):
+    """
+    Readings of a batch that were not new, by position in the batch.
+
+    ``written`` is the ``perf_counter`` time the batch was written at,
+    before it was committed.
+    """
+
+    duplicates: Set[int]
+    late: Set[int]
+    written: float = 0.0
+
+
+def _node_data_row(data: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        data["node_id"],
+        data["timestamp"],
+        data["temperature"],
+        data["ph"],
+        data["dissolved_oxygen"],
+    )
+
+
+def _node_metadata_row(data: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        data["node_id"],
+        data["latitude"],
+        data["longitude"],
+        data["timestamp"],
+        data["maintenance_required"],
+        data["temperature"],
+        data["ph"],
+        data["dissolved_oxygen"],
+    )
+
+
+def count_alerts(alerts: List[AlertEvent]) -> List[Tuple[Any, ...]]:
+    """
+    Pre-aggregate alert events into alert_counts increments.
+
+    :param alerts: alert history rows.
+    :return: upsert parameters per node, metric, kind and state.
+    """
+    counts: Dict[Tuple[str, str, str, str], List[int]] = {}
+    for event in alerts:
+        key = (event.node_id, event.metric, event.kind, event.state)
+        count = counts.get(key)
+        if count is None:
+            counts[key] = [1, event.timestamp]
+        else:
+            count[0] += 1
+            count[1] = max(count[1], event.timestamp)
+    return [(*key, *count) for key, count in counts.items()]
+
+
+class IngestWriter:
+    """
+    Collects incoming readings and writes them to SQLite in batches.
+
+    Readings are buffered until either ``batch_size`` of them are pending
+    or ``flush_interval`` seconds have passed since the first one arrived.
+    The whole batch is then written with ``executemany`` in a single
+    transaction on the database writer thread, together with the
+    incremental update of the rollup tables and any alert events recorded
+    meanwhile. ``submit`` only returns once the batch holding the reading
+    has been committed, so callers can ack the source message afterwards.
+
+    Ingest is idempotent: a reading already stored, e.g. redelivered by
+    the broker after a restart, is a duplicate and only counted. A reading
+    older than the latest one of its node is late, it is stored but does
+    not update the node metadata. Neither is published to the other
+    workers nor passed to the commit hooks, so replays raise no alerts.
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ) -> None:
+        self.batch_size = batch_size or settings.ingest_batch_size
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else settings.ingest_flush_interval_ms / 1000
+        )
+        self.flush_size = Histogram(
+            "lakewatch_ingest_flush_size",
+            "Number of readings written per batch.",
+            FLUSH_SIZE_BUCKETS,
+        )
+        self.flush_latency = Histogram(
+            "lakewatch_ingest_flush_latency_seconds",
+            "Time spent writing and committing a batch.",
+            FLUSH_LATENCY_BUCKETS,
+        )
+        self.alerts_written = 0
+        self.duplicates = 0
+        self.late = 0
+        self._hooks: List[CommitHook] = []
+        self._queue: "Optional[asyncio.Queue[Optional[QueueItem]]]" = None
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Start the background flush task if it is not running yet."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(self._queue))
+
+    async def stop(self) -> None:
+        """Flush every pending reading and alert and stop the background task."""
+        if self._task is not None and self._queue is not None:
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+
+    async def submit(self, data: Dict[str, Any]) -> None:
+        """
+        Queue a reading and wait until its batch is committed.
+
+        :param data: decoded sensor message.
+        :raises Exception: if the reading could not be written.
+        """
+        self.start()
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))  # type: ignore[union-attr]
+        await future
+
+    async def submit_many(self, readings: Sequence[Dict[str, Any]]) -> None:
+        """
+        Queue several readings and wait until all of them are committed.
+
+        :param readings: decoded sensor readings.
+        :raises Exception: the first error of a reading that could not be
+            written, after every reading was handled.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        futures: "List[asyncio.Future[None]]" = []
+        for data in readings:
+            futures.append(loop.create_future())
+            await self._queue.put((data, futures[-1]))  # type: ignore[union-attr]
+        for error in await asyncio.gather(*futures, return_exceptions=True):
+            if error is not None:
+                raise error
+
+    def on_commit(self, hook: CommitHook) -> None:
+        """
+        Register a coroutine called with the readings of every committed batch.
+
+        Hooks run on the flush task after the submitters were released, one
+        batch at a time, so they see the readings in commit order.
+        Duplicates are left out. Readings older than the latest of their
+        node are passed separately, so they are still checked for alerts
+        without moving the state of their node backwards.
+
+        :param hook: called with the new and the late committed readings,
+            each in arrival order.
+        """
+        self._hooks.append(hook)
+
+    def record_alert(self, event: AlertEvent) -> None:
+        """
+        Queue an alert event to be written with the next batch.
+
+        Does not wait for the write, alerts are not acknowledged anywhere.
+
+        :param event: alert history row.
+        """
+        self.start()
+        self._queue.put_nowait(event)  # type: ignore[union-attr]
+
+    @property
+    def pending(self) -> int:
+        """Number of readings and alert events waiting to be written."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return writer statistics.
+
+        :return: flush-size and flush-latency histograms, queue depth and
+            the number of duplicate and late readings.
+        """
+        return {
+            "pending": self.pending,
+            "alerts_written": self.alerts_written,
+            "duplicates": self.duplicates,
+            "late": self.late,
+            "flush_size": self.flush_size.snapshot(),
+            "flush_latency_seconds": self.flush_latency.snapshot(),
+        }
+
+    async def _run(self, queue: "asyncio.Queue[Optional[QueueItem]]") -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # Alerts raised by the hooks of the last batch are queued behind the
+        # stop marker, write them before the task ends
+        leftover = [item for item in _drain(queue) if item is not None]
+        if leftover:
+            await self._flush(leftover)
+
+    async def _flush(self, items: List[QueueItem]) -> None:
+        started = time.perf_counter()
+        batch, alerts, rows, errors = _parse(items)
+        replays = Replays(set(), set())
+        if rows or alerts:
+            replays = await self._write(batch, rows, errors, alerts)
+        if batch:
+            self.flush_size.observe(len(batch))
+            self.flush_latency.observe(time.perf_counter() - started)
+
+        # Every worker keeps its node cache current from the new readings
+        committed = [
+            data
+            for index, ((data, _), error) in enumerate(zip(batch, errors))
+            if error is None
+            and index not in replays.duplicates
+            and index not in replays.late
+        ]
+        late = [
+            data
+            for index, ((data, _), error) in enumerate(zip(batch, errors))
+            if error is None and index in replays.late
+        ]
+        if committed:
+            await _publish(committed)
+        _resolve(batch, errors)
+        if committed or late:
+            await self._run_hooks(committed, late)
+
+    async def _write(
+        self,
+        batch: List[PendingItem],
+        rows: Rows,
+        errors: List[Optional[Exception]],
+        alerts: List[AlertEvent],
+    ) -> Replays:
+        """
+        Write a batch in one transaction and count what it skipped.
+
+        :param batch: readings of the batch with their futures.
+        :param rows: database rows of the readings that could be parsed.
+        :param errors: error of every reading, updated in place.
+        :param alerts: alert events to write with the readings.
+        :return: readings that were not new, none if the batch failed.
+        """
+        try:
+            replays = await database.transaction(
+                lambda conn: self._write_batch(conn, rows, errors, alerts),
+            )
+        except Exception as e:
+            logger.error(f"Failed to write batch of {len(batch)} readings: {e}")
+            errors[:] = [error or e for error in errors]
+            return Replays(set(), set())
+        commit_seconds.observe(time.perf_counter() - replays.written)
+        self.alerts_written += len(alerts)
+        self.duplicates += len(replays.duplicates)
+        self.late += len(replays.late)
+        if replays.duplicates or replays.late:
+            logger.info(
+                f"Skipped {len(replays.duplicates)} duplicate readings, "
+                f"kept the node state for {len(replays.late)} late readings",
+            )
+        return replays
+
+    async def _run_hooks(
+        self,
+        committed: List[Dict[str, Any]],
+        late: List[Dict[str, Any]],
+    ) -> None:
+        for hook in self._hooks:
+            try:
+                await hook(committed, late)
+            except Exception as e:
+                logger.error(f"Error handling {len(committed)} committed readings: {e}")
+
+    @staticmethod
+    def _write_batch(
+        conn: sqlite3.Connection,
+        rows: Rows,
+        errors: List[Optional[Exception]],
+        alerts: List[AlertEvent],
+    ) -> Replays:
+        started = time.perf_counter()
+        duplicates = _repeated(rows)
+        for index in duplicates:
+            del rows[index]
+        conn.execute("SAVEPOINT batch")
+        changes = conn.total_changes
+        try:
+            conn.executemany(INSERT_NODE_DATA, [data for data, _ in rows.values()])
+        except (sqlite3.Error, OverflowError):
+            conn.execute("ROLLBACK TO batch")
+            duplicates.update(_insert_each(conn, rows, errors))
+        else:
+            if conn.total_changes - changes < len(rows):
+                # Some readings were stored before, insert the others again
+                # so the rollups only count readings stored by this batch.
+                conn.execute("ROLLBACK TO batch")
+                stored = _stored(conn, rows)
+                duplicates.update(stored)
+                for index in stored:
+                    del rows[index]
+                conn.executemany(
+                    INSERT_NODE_DATA,
+                    [data for data, _ in rows.values()],
+                )
+
+        inserted = time.perf_counter()
+        insert_seconds.observe(inserted - started)
+
+        late = _late(conn, rows)
+        conn.executemany(
+            UPSERT_NODE_METADATA,
+            [meta for index, (_, meta) in rows.items() if index not in late],
+        )
+        upserted = time.perf_counter()
+        upsert_seconds.observe(upserted - inserted)
+
+        apply_rollups(conn, [data for data, _ in rows.values()])
+        rollup_seconds.observe(time.perf_counter() - upserted)
+
+        if alerts:
+            conn.executemany(INSERT_ALERT_EVENT, alerts)
+            conn.executemany(UPSERT_ALERT_COUNT, count_alerts(alerts))
+        conn.execute("RELEASE batch")
+        return Replays(duplicates, late, time.perf_counter())
+
+
+def _parse(
+    items: List[QueueItem],
+) -> Tuple[
+    List[PendingItem],
+    List[AlertEvent],
+    Rows,
+    List[Optional[Exception]],
+]:
+    """
+    Split queued items into readings and alerts, and build the readings' rows.
+
+    :param items: readings with their futures and alert events.
+    :return: readings, alerts, rows by reading position and the error of
+        every reading that could not be parsed.
+    """
+    batch: List[PendingItem] = []
+    alerts: List[AlertEvent] = []
+    for item in items:
+        if isinstance(item, AlertEvent):
+            alerts.append(item)
+        else:
+            batch.append(item)
+    errors: List[Optional[Exception]] = [None] * len(batch)
+    rows: Rows = {}
+    for index, (data, _) in enumerate(batch):
+        try:
+            rows[index] = (_node_data_row(data), _node_metadata_row(data))
+        except (KeyError, TypeError) as e:
+            errors[index] = e
+    return batch, alerts, rows, errors
+
+
+async def _publish(committed: List[Dict[str, Any]]) -> None:
+    try:
+        await fanout.publish("readings", committed)
+    except Exception as e:
+        logger.error(f"Failed to publish {len(committed)} readings: {e}")
+
+
+def _resolve(batch: List[PendingItem], errors: List[Optional[Exception]]) -> None:
+    for (_, future), error in zip(batch, errors):
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+
+def _drain(queue: "asyncio.Queue[Optional[QueueItem]]") -> List[Optional[QueueItem]]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def _repeated(rows: Rows) -> Set[int]:
+    seen: Set[Tuple[Any, Any]] = set()
+    repeated = set()
+    for index, (data, _) in rows.items():
+        key = (data[0], data[1])
+        if key in seen:
+            repeated.add(index)
+        seen.add(key)
+    return repeated
+
+
+def _stored(conn: sqlite3.Connection, rows: Rows) -> Set[int]:
+    keys = ujson.dumps([data[:2] for data, _ in rows.values()])
+    stored = {(row[0], row[1]) for row in conn.execute(SELECT_STORED_READINGS, (keys,))}
+    return {index for index, (data, _) in rows.items() if data[:2] in stored}
+
+
+def _insert_each(
+    conn: sqlite3.Connection,
+    rows: Rows,
+    errors: List[Optional[Exception]],
+) -> Set[int]:
+    # A single bad row must not sink the whole batch, so insert row by row
+    # and drop the ones that do not fit or were stored before.
+    duplicates = set()
+    for index, (data, _) in list(rows.items()):
+        try:
+            inserted = conn.execute(INSERT_NODE_DATA, data).rowcount
+        except (sqlite3.Error, OverflowError) as e:
+            errors[index] = e
+            del rows[index]
+        else:
+            if not inserted:
+                duplicates.add(index)
+                del rows[index]
+    return duplicates
+
+
+def _late(conn: sqlite3.Connection, rows: Rows) -> Set[int]:
+    nodes = ujson.dumps(list({data[0] for data, _ in rows.values()}))
+    latest: Dict[str, int] = {
+        row[0]: row[1]
+        for row in conn.execute(SELECT_LAST_UPDATED, (nodes,))
+        if row[1] is not None
+    }
+    late = set()
+    for index, (data, _) in rows.items():
+        node_id, timestamp = data[0], data[1]
+        if node_id in latest and timestamp < latest[node_id]:
+            late.add(index)
+        else:
+            latest[node_id] = timestamp
+    return late
+
+
+ingest_writer = IngestWriter()
+registry.register(ingest_writer.flush_size, ingest_writer.flush_latency)
+registry.gauge(
+    "lakewatch_ingest_writer_pending",
+    "Readings and alert events waiting to be written.",
+    function=lambda: ingest_writer.pending,
+)
+registry.counter(
+    "lakewatch_ingest_replayed_readings",
+    "Readings that were not new when written.",
+    labels={"reason": "duplicate"},
+    function=lambda: ingest_writer.duplicates,
+)
+registry.counter(
+    "lakewatch_ingest_replayed_readings",
+    "Readings that were not new when written.",
+    labels={"reason": "late"},
+    function=lambda: ingest_writer.late,
+)
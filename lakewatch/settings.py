@@ -1,6 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
+from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
@@ -19,6 +20,22 @@ class LogLevel(str, enum.Enum):
     FATAL = "FATAL"
 
 
+class SynchronousMode(str, enum.Enum):
+    """Possible values of SQLite's synchronous pragma."""
+
+    OFF = "OFF"
+    NORMAL = "NORMAL"
+    FULL = "FULL"
+    EXTRA = "EXTRA"
+
+
+class SlowConsumerPolicy(str, enum.Enum):
+    """What to do with a WebSocket client whose outbound queue is full."""
+
+    DROP_OLDEST = "drop_oldest"
+    DISCONNECT = "disconnect"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -41,11 +58,98 @@ class Settings(BaseSettings):
     # Variables for the database
     db_file: Path = TEMP_DIR / "db.sqlite3"
     db_echo: bool = False
+    # Read-only connections serving API queries
+    db_read_pool_size: int = 4
+    # Log a warning once this many operations are waiting on one pool
+    db_queue_warn_depth: int = 50
+    # Connection pragmas. NORMAL is durable across application crashes in WAL
+    # mode and only risks the last transactions on power loss.
+    db_synchronous: SynchronousMode = SynchronousMode.NORMAL
+    db_busy_timeout_ms: int = 5000
+    db_cache_size_kib: int = 64 * 1024
+    db_mmap_size: int = 256 * 1024 * 1024
+
+    # Page sizes of list endpoints
+    api_page_size: int = 1000
+    api_max_page_size: int = 10000
+    # Readings fetched per query while streaming an export
+    export_chunk_size: int = 5000
+    # Raw readings loaded at most for a single downsampling request
+    downsample_max_input: int = 1_000_000
+
+    # Raw readings older than this are pruned, 0 keeps them forever.
+    # Rollups are always kept.
+    raw_retention_days: int = 30
+    retention_interval_seconds: int = 60 * 60
+    # Rows deleted per transaction while pruning
+    retention_chunk_size: int = 5000
+    # Free pages released per incremental vacuum
+    retention_vacuum_pages: int = 10000
 
     # RabbitMQ settings
     rabbitmq_host: str = "localhost"
     rabbitmq_port: int = 5672
     rabbitmq_queue: str = "node_data"
+    # Messages that fail validation are moved here with the reason attached
+    rabbitmq_dead_letter_queue: str = "node_data.dead"
+    # Messages that failed this many times are moved there as well, instead
+    # of being retried forever
+    rabbitmq_max_attempts: int = 5
+    # Unacked messages the broker may push to the consumer at once. Keep it at
+    # least as large as the ingest batch so batches can actually fill up.
+    # This is where the flow controller starts, it adapts the prefetch between
+    # ``ingest_prefetch_min`` and ``ingest_prefetch_max`` from then on.
+    rabbitmq_prefetch_count: int = 500
+    # Exchange every worker binds to share alerts and node updates
+    rabbitmq_fanout_exchange: str = "lakewatch.fanout"
+    # Exchange routing committed readings to the ingest worker owning the node
+    rabbitmq_alert_exchange: str = "lakewatch.alerts"
+
+    # Ingest writer settings
+    ingest_batch_size: int = 500
+    ingest_flush_interval_ms: int = 50
+    # Processes started by ``python -m lakewatch.ingest``
+    ingest_workers: int = 1
+    # Bounds of the messages a consumer may hold, and the mean commit latency
+    # above which the flow controller backs off, checked every interval.
+    ingest_prefetch_min: int = 50
+    ingest_prefetch_max: int = 5000
+    ingest_commit_target_ms: int = 100
+    ingest_flow_interval_ms: int = 1000
+    # Ingest workers have no API, worker N serves ``/metrics`` on this port
+    # plus N. 0 disables it, the API always serves ``/metrics``.
+    ingest_metrics_port: int = 0
+    # How long a stopping process waits for messages in flight to be committed
+    # and for queued WebSocket messages to be sent before closing anyway.
+    shutdown_timeout_seconds: float = 10.0
+    # Also consume readings in the API process. Off by default, readings are
+    # ingested by ``python -m lakewatch.ingest`` and the API only serves them.
+    api_ingest: bool = False
+
+    # WebSocket fan-out settings
+    ws_queue_size: int = 100
+    ws_slow_consumer_policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST
+    # A client that does not accept a single message for this long is dropped
+    ws_send_timeout_seconds: float = 10.0
+    # Grid used to index the bounding boxes of client subscriptions. Boxes
+    # covering more cells than this are matched one by one instead.
+    ws_bbox_cell_degrees: float = 0.1
+    ws_bbox_max_cells: int = 400
+    # Compress WebSocket messages, which mostly repeat the same JSON keys
+    ws_per_message_deflate: bool = True
+
+    # Live readings are coalesced per node and sent once per tick
+    live_tick_ms: int = 250
+
+    # Alerts are sent when they open and resolve, plus a digest of ongoing
+    # alerts at most this often
+    alert_digest_seconds: int = 15 * 60
+    # An alert opening again this soon after the last one is not sent
+    alert_cooldown_seconds: int = 5 * 60
+    # Readings in a row needed to resolve an alert
+    alert_clear_count: int = 3
+    # Threshold alerts clear this fraction below the threshold
+    alert_hysteresis: float = 0.02
 
     # Thresholds
     temperature_threshold: float = 30.0
@@ -53,7 +157,23 @@ class Settings(BaseSettings):
     ph_threshold: float = 7.0
     turbidity_threshold: float = 100.0
     conductivity_threshold: float = 100.0
+    # Dissolved oxygen alerts below this, it used to alert above it
     oxygen_threshold: float = 5.0
+    # Lower bounds, unchecked unless set
+    ph_min_threshold: Optional[float] = None
+    # Overrides oxygen_threshold as the lower bound of dissolved oxygen
+    oxygen_min_threshold: Optional[float] = None
+    # JSON file with per-node and per-group threshold overrides
+    threshold_profiles_file: Optional[Path] = None
+
+    # Outlier detection over the last readings of every node
+    outlier_window: int = 5
+    outlier_factor: float = 1.7
+    # Readings a metric needs before it is checked at all
+    outlier_min_history: int = 3
+    # Node windows are evicted after this long without readings
+    outlier_idle_seconds: int = 60 * 60
+    outlier_max_nodes: int = 10000
 
     @property
     def db_url(self) -> URL:
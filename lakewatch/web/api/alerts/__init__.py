@@ -0,0 +1,5 @@
+"""API for querying the alert history."""
+
+from lakewatch.web.api.alerts.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,145 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from lakewatch.db import database
+from lakewatch.services.alerts import AlertKind, AlertState
+from lakewatch.settings import settings
+
+router = APIRouter()
+
+ALERT_COLUMNS = "id, node_id, metric, kind, state, value, threshold, timestamp"
+
+# Position of the last alert of a page, its timestamp and ID
+CURSOR_PATTERN = r"^-?\d+:\d+$"
+
+
+@router.get("")
+async def get_alerts(
+    node_id: Optional[str] = Query(None, description="Only alerts of this node."),
+    metric: Optional[str] = Query(None, description="Only alerts on this metric."),
+    kind: Optional[AlertKind] = Query(None, description="Only this kind of alert."),
+    state: Optional[AlertState] = Query(
+        None,
+        description="Only alerts that reached this state.",
+    ),
+    start: Optional[int] = Query(None, description="Unix timestamp, inclusive."),
+    end: Optional[int] = Query(None, description="Unix timestamp, inclusive."),
+    limit: int = Query(
+        settings.api_page_size,
+        ge=1,
+        le=settings.api_max_page_size,
+        description="Maximum number of alerts to return.",
+    ),
+    before: Optional[str] = Query(
+        None,
+        pattern=CURSOR_PATTERN,
+        description="Return alerts older than this cursor, use next_before of the previous page.",
+    ),
+) -> Dict[str, Any]:
+    """
+    Get recorded alert events, newest first.
+
+    Every filter is optional. When more alerts are available,
+    ``next_before`` holds the value to pass as ``before`` for the next
+    page. Alerts are ordered by timestamp, then ID, like the indexes, so
+    a page starts where the previous one stopped without a sort.
+
+    :param node_id: node identifier.
+    :param metric: checked metric.
+    :param kind: what raised the alert.
+    :param state: alert state of the event.
+    :param start: first timestamp of the range.
+    :param end: last timestamp of the range.
+    :param limit: page size.
+    :param before: ``timestamp:id`` of the last alert of the previous page.
+    :raises HTTPException: if the range is empty.
+    :return: matching alert events.
+    """
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    # Only the given filters end up in the query, so SQLite can pick the
+    # (node_id, metric, timestamp) or timestamp index for them.
+    conditions: List[str] = []
+    params: Dict[str, Any] = {"limit": limit}
+    filters = {
+        "node_id = :node_id": ("node_id", node_id),
+        "metric = :metric": ("metric", metric),
+        "kind = :kind": ("kind", kind.value if kind is not None else None),
+        "state = :state": ("state", state.value if state is not None else None),
+        "timestamp >= :start": ("start", start),
+        "timestamp <= :end": ("end", end),
+    }
+    for condition, (name, value) in filters.items():
+        if value is not None:
+            conditions.append(condition)
+            params[name] = value
+    if before is not None:
+        # Bounds the index range by the timestamp, ties are broken by ID
+        before_timestamp, before_id = before.split(":")
+        conditions.append(
+            "timestamp <= :before_timestamp"
+            " AND (timestamp < :before_timestamp OR id < :before_id)",
+        )
+        params["before_timestamp"] = int(before_timestamp)
+        params["before_id"] = int(before_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    rows = await database.fetch(
+        f"SELECT {ALERT_COLUMNS} FROM alert_events {where} "  # noqa: S608
+        "ORDER BY timestamp DESC, id DESC LIMIT :limit",
+        params,
+    )
+    alerts = [dict(row) for row in rows]
+    return {
+        "count": len(alerts),
+        "data": alerts,
+        "next_before": (
+            f"{alerts[-1]['timestamp']}:{alerts[-1]['id']}"
+            if len(alerts) == limit
+            else None
+        ),
+    }
+
+
+@router.get("/summary")
+async def get_alert_summary(
+    node_id: Optional[str] = Query(None, description="Only this node."),
+) -> Dict[str, Any]:
+    """
+    Get the number of alert events per node.
+
+    Served from counters maintained as alerts are written, not by
+    counting the history.
+
+    :param node_id: node identifier.
+    :return: totals and counts per metric, kind and state of every node.
+    """
+    rows = await database.fetch(
+        """
+        SELECT node_id, metric, kind, state, count, last_timestamp
+        FROM alert_counts
+        WHERE ? IS NULL OR node_id = ?
+        ORDER BY node_id, metric, kind, state
+        """,
+        (node_id, node_id),
+    )
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        node = nodes.setdefault(
+            row["node_id"],
+            {"node_id": row["node_id"], "total": 0, "last_timestamp": 0, "counts": []},
+        )
+        node["total"] += row["count"]
+        node["last_timestamp"] = max(node["last_timestamp"], row["last_timestamp"])
+        node["counts"].append(
+            {
+                "metric": row["metric"],
+                "kind": row["kind"],
+                "state": row["state"],
+                "count": row["count"],
+                "last_timestamp": row["last_timestamp"],
+            },
+        )
+    return {"count": len(nodes), "data": list(nodes.values())}
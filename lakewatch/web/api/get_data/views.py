@@ -1,56 +1,387 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import csv
+import enum
+import io
 import sqlite3
-import json
+import time
+import zlib
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
+import ujson
+
+from lakewatch.services.aggregate import aggregate_readings, load_series, lttb
+from lakewatch.services.readings import BucketSize, Metric
+
+from lakewatch.db import database
 from lakewatch.settings import settings
 
 router = APIRouter()
 
+DEFAULT_WINDOW = timedelta(hours=24)
+
+# Served entirely from ix_node_data_node_timestamp, without touching the table
+READINGS_QUERY = """
+    SELECT timestamp, temperature, ph, dissolved_oxygen
+    FROM node_data
+    WHERE node_id = ? AND timestamp >= ? AND timestamp <= ?
+    ORDER BY timestamp
+    LIMIT ?
+"""
+
+
+EXPORT_COLUMNS = ("node_id", "timestamp", "temperature", "ph", "dissolved_oxygen")
+
+
+class ExportFormat(str, enum.Enum):
+    """Supported export formats."""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def resolve_range(
+    start: Optional[int],
+    end: Optional[int],
+    after: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Resolve the requested time range into inclusive bounds.
+
+    :param start: first timestamp, defaults to 24 hours before ``end``.
+    :param end: last timestamp, defaults to now.
+    :param after: timestamp of the last row already returned.
+    :raises HTTPException: if the range is empty.
+    :return: inclusive lower and upper timestamps.
+    """
+    if end is None:
+        end = int(time.time())
+    if start is None:
+        start = end - int(DEFAULT_WINDOW.total_seconds())
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if after is not None:
+        start = max(start, after + 1)
+    return start, end
+
 
 @router.get("/{node_id}")
-def get_data(node_id: str) -> Dict[str, Any]:
+async def get_data(
+    node_id: str,
+    start: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the first reading, defaults to 24 hours ago.",
+    ),
+    end: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the last reading, defaults to now.",
+    ),
+    limit: int = Query(
+        settings.api_page_size,
+        ge=1,
+        le=settings.api_max_page_size,
+        description="Maximum number of readings to return.",
+    ),
+    after: Optional[int] = Query(
+        None,
+        description="Return readings after this timestamp, use next_after of the previous page.",
+    ),
+) -> Dict[str, Any]:
     """
-    Get data from the node for the last 24 hours.
+    Get readings of the node within a time range.
+
+    Readings are ordered by timestamp. When more readings are available,
+    ``next_after`` holds the value to pass as ``after`` for the next page.
 
     :param node_id: node identifier.
-    :return: data from the node for the last 24 hours.
+    :param start: first timestamp of the range, defaults to 24 hours ago.
+    :param end: last timestamp of the range, defaults to now.
+    :param limit: page size.
+    :param after: timestamp of the last reading of the previous page.
+    :return: readings of the node within the range.
     """
+    lower, upper = resolve_range(start, end, after)
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(str(settings.db_file))
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # Execute query to get data for the specified node_id in the last 24 hours
-        cursor.execute("SELECT * FROM node_data WHERE node_id = ?", (node_id,))
-
-        rows = cursor.fetchall()
+        rows = await database.fetch(READINGS_QUERY, (node_id, lower, upper, limit))
 
         # Process the results
-        result = []
+        result: List[Dict[str, Any]] = []
         for row in rows:
-            data = {
-                "node_id": row["node_id"],
-                # "timestamp": row["timestamp"],
-                # "datetime": datetime.fromtimestamp(row["timestamp"]).isoformat(),
-                "payload": json.loads(row["data"]),
-            }
-            result.append(data)
-
-        conn.close()
+            result.append(
+                {
+                    "node_id": node_id,
+                    "timestamp": row["timestamp"],
+                    "datetime": datetime.fromtimestamp(row["timestamp"]).isoformat(),
+                    "temperature": row["temperature"],
+                    "ph": row["ph"],
+                    "dissolved_oxygen": row["dissolved_oxygen"],
+                },
+            )
 
         if not result:
             return {
                 "node_id": node_id,
-                "message": "No data found for the last 24 hours",
+                "message": "No data found for the requested range",
                 "data": [],
             }
 
-        return {"node_id": node_id, "count": len(result), "data": result}
+        return {
+            "node_id": node_id,
+            "count": len(result),
+            "data": result,
+            "next_after": result[-1]["timestamp"] if len(result) == limit else None,
+        }
 
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving data: {str(e)}")
+
+
+async def iter_readings(
+    node_id: str,
+    lower: int,
+    upper: int,
+    chunk_size: int,
+) -> AsyncIterator[List[sqlite3.Row]]:
+    """
+    Iterate over the readings of a node in chunks.
+
+    Every chunk is a short keyset query continuing after the last
+    timestamp of the previous one. Memory stays bounded by the chunk
+    size and no read transaction is held open while the client is slow.
+
+    :param node_id: node identifier.
+    :param lower: first timestamp, inclusive.
+    :param upper: last timestamp, inclusive.
+    :param chunk_size: readings fetched per query.
+    :yield: chunks of rows ordered by timestamp.
+    """
+    while lower <= upper:
+        rows = await database.fetch(READINGS_QUERY, (node_id, lower, upper, chunk_size))
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        lower = rows[-1]["timestamp"] + 1
+
+
+def format_ndjson(node_id: str, rows: List[sqlite3.Row]) -> str:
+    """
+    Format readings as newline-delimited JSON.
+
+    :param node_id: node identifier.
+    :param rows: readings to format.
+    :return: one JSON document per line.
+    """
+    return "".join(
+        ujson.dumps(
+            {
+                "node_id": node_id,
+                "timestamp": row["timestamp"],
+                "temperature": row["temperature"],
+                "ph": row["ph"],
+                "dissolved_oxygen": row["dissolved_oxygen"],
+            },
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def format_csv(node_id: str, rows: List[sqlite3.Row]) -> str:
+    """
+    Format readings as CSV lines without a header.
+
+    :param node_id: node identifier.
+    :param rows: readings to format.
+    :return: one CSV line per reading.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(
+        (
+            node_id,
+            row["timestamp"],
+            row["temperature"],
+            row["ph"],
+            row["dissolved_oxygen"],
+        )
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def export_chunks(
+    node_id: str,
+    lower: int,
+    upper: int,
+    export_format: ExportFormat,
+    compress: bool,
+) -> AsyncIterator[bytes]:
+    """
+    Produce the encoded body of an export.
+
+    :param node_id: node identifier.
+    :param lower: first timestamp, inclusive.
+    :param upper: last timestamp, inclusive.
+    :param export_format: output format.
+    :param compress: whether to gzip the output.
+    :yield: encoded body chunks.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    if export_format is ExportFormat.CSV:
+        yield encode(",".join(EXPORT_COLUMNS) + "\n")
+    formatter = format_csv if export_format is ExportFormat.CSV else format_ndjson
+    async for rows in iter_readings(node_id, lower, upper, settings.export_chunk_size):
+        chunk = encode(formatter(node_id, rows))
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/{node_id}/export")
+async def export_data(
+    node_id: str,
+    start: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the first reading, defaults to 24 hours ago.",
+    ),
+    end: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the last reading, defaults to now.",
+    ),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    gzip: bool = Query(False, description="Compress the response with gzip."),
+) -> StreamingResponse:
+    """
+    Stream every reading of the node within a time range.
+
+    The response is produced chunk by chunk while the range is read, so
+    memory use does not depend on the size of the range.
+
+    :param node_id: node identifier.
+    :param start: first timestamp of the range, defaults to 24 hours ago.
+    :param end: last timestamp of the range, defaults to now.
+    :param export_format: ndjson or csv.
+    :param gzip: whether to gzip the response.
+    :return: streaming response with the readings.
+    """
+    lower, upper = resolve_range(start, end)
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="{node_id}-{lower}-{upper}.{export_format.value}"'
+        ),
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_chunks(node_id, lower, upper, export_format, gzip),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+
+@router.get("/{node_id}/aggregate")
+async def get_aggregate(
+    node_id: str,
+    bucket: BucketSize = Query(BucketSize.FIVE_MINUTES),
+    start: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the first reading, defaults to 24 hours ago.",
+    ),
+    end: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the last reading, defaults to now.",
+    ),
+) -> Dict[str, Any]:
+    """
+    Get min, max, mean and count of every metric per time bucket.
+
+    :param node_id: node identifier.
+    :param bucket: bucket size.
+    :param start: first timestamp of the range, defaults to 24 hours ago.
+    :param end: last timestamp of the range, defaults to now.
+    :return: aggregated readings of the node.
+    """
+    lower, upper = resolve_range(start, end)
+    if (upper - lower) // bucket.seconds >= settings.api_max_page_size:
+        raise HTTPException(
+            status_code=400,
+            detail="Range holds too many buckets, use a larger bucket size",
+        )
+    try:
+        result = await aggregate_readings(node_id, bucket, lower, upper)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return {
+        "node_id": node_id,
+        "bucket": bucket.value,
+        "count": len(result),
+        "data": result,
+    }
+
+
+@router.get("/{node_id}/downsample")
+async def get_downsampled(
+    node_id: str,
+    metric: Metric = Query(...),
+    points: int = Query(500, ge=3, le=settings.api_max_page_size),
+    start: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the first reading, defaults to 24 hours ago.",
+    ),
+    end: Optional[int] = Query(
+        None,
+        description="Unix timestamp of the last reading, defaults to now.",
+    ),
+) -> Dict[str, Any]:
+    """
+    Get one metric downsampled to at most ``points`` readings with LTTB.
+
+    :param node_id: node identifier.
+    :param metric: metric to downsample.
+    :param points: maximum number of readings to return.
+    :param start: first timestamp of the range, defaults to 24 hours ago.
+    :param end: last timestamp of the range, defaults to now.
+    :return: selected readings of the metric.
+    """
+    lower, upper = resolve_range(start, end)
+    max_input = settings.downsample_max_input
+    try:
+        timestamps, values = await database.read(
+            lambda conn: load_series(conn, node_id, metric, lower, upper, max_input),
+        )
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if len(timestamps) > max_input:
+        raise HTTPException(
+            status_code=400,
+            detail="Range holds too many readings, use the aggregate endpoint",
+        )
+
+    selected = await asyncio.to_thread(lttb, timestamps, values, points)
+    return {
+        "node_id": node_id,
+        "metric": metric.value,
+        "count": len(selected),
+        "data": [
+            {"timestamp": int(timestamp), "value": float(value)}
+            for timestamp, value in zip(timestamps[selected], values[selected])
+        ],
+    }
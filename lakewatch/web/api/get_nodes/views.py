@@ -1,58 +1,45 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 import sqlite3
-from datetime import datetime
-from typing import Dict, Any
-from loguru import logger
 
-from lakewatch.settings import settings
+from lakewatch.services.node_cache import node_cache
 
 router = APIRouter()
 
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+
+    :param if_none_match: value of the If-None-Match header.
+    :param etag: current ETag.
+    :return: whether the client already has the current version.
+    """
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
 @router.get("/")
-def get_data() -> Dict[str, Any]:
+async def get_data(request: Request) -> Response:
     """
-    Get node info from the database.
-    :return: node info from the database.
+    Get node info from the in-memory node state cache.
+
+    The response carries an ETag; a request whose If-None-Match matches
+    it gets an empty 304 response.
+
+    :param request: incoming request.
+    :return: node info.
     """
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(str(settings.db_file))
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM node_metadata")
-
-        rows = cursor.fetchall()
-
-        result = []
-        for row in rows:
-            try:
-                data = {
-                    "node_id": row["node_id"],
-                    "timestamp": row["last_updated"],
-                    "datetime": datetime.fromtimestamp(row["last_updated"]).isoformat(),
-                    "latitude": row["latitude"],
-                    "longitude": row["longitude"],
-                    "temperature": row["temperature"],
-                    "ph": row["ph"],
-                    "dissolved_oxygen": row["dissolved_oxygen"],
-                    "maintenance_required": row["maintenance_required"],
-                }
-                result.append(data)
-            except KeyError as e:
-                logger.error(f"Error processing node data: {e} for row: {dict(row)}")
-                continue
-        conn.close()
-
-        if not result:
-            return {
-                "message": "No nodes found",
-            }
-
-        return {"count": len(result), "data": result}
-
+        if not node_cache.ready:
+            await node_cache.warm()
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving data: {str(e)}")
+
+    body, etag = node_cache.render()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
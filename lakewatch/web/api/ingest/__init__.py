@@ -0,0 +1,5 @@
+"""API for inspecting the ingest pipeline."""
+
+from lakewatch.web.api.ingest.views import router
+
+__all__ = ["router"]
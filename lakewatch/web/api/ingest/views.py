@@ -0,0 +1,39 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from lakewatch.db import database
+from lakewatch.services.flow import flow_controller
+from lakewatch.services.reports import ingest_reports
+
+router = APIRouter()
+
+
+@router.get("/stats")
+def get_ingest_stats() -> Dict[str, Any]:
+    """
+    Get the ingest statistics of every ingest worker.
+
+    Workers report every flow interval through the fan-out channel, the
+    statistics of this process are included when it consumes readings
+    itself.
+
+    :return: database pools of this process, and writer histograms,
+        pending readings, database queue depths, retention results,
+        rejected messages and routed readings per worker.
+    """
+    return {"database": database.stats(), "workers": ingest_reports.latest()}
+
+
+@router.get("/status")
+def get_ingest_status() -> Dict[str, Any]:
+    """
+    Get the flow control state of every ingest worker.
+
+    Workers report every flow interval through the fan-out channel, the
+    status of this process is included when it consumes readings itself.
+
+    :return: prefetch, messages in flight, commit latency, writer backlog
+        and queue depth per worker.
+    """
+    return {"workers": flow_controller.workers()}
@@ -1,36 +1,193 @@
+import time
+from typing import Any, Dict, Optional
+
+import ujson
 from fastapi import WebSocket, APIRouter, WebSocketDisconnect
-import asyncio
 from loguru import logger
+from pydantic import ValidationError
+
+from lakewatch.services.alerts import alert_engine
+from lakewatch.services.broadcast import Client, broadcaster
+from lakewatch.services.fanout import fanout
+from lakewatch.services.live import live_feed
+from lakewatch.services.metrics import registry
+from lakewatch.services.subscriptions import Severity, Subscription
 
 router = APIRouter()
 
-connections = set()
+ALERTS = "lakewatch_alerts"
+ALERTS_DOCUMENTATION = "Alerts handed to the fan-out channel by outcome."
+
+alerts_sent = registry.counter(ALERTS, ALERTS_DOCUMENTATION, labels={"result": "sent"})
+alerts_failed = registry.counter(
+    ALERTS,
+    ALERTS_DOCUMENTATION,
+    labels={"result": "failed"},
+)
+alerts_skipped = registry.counter(
+    ALERTS,
+    ALERTS_DOCUMENTATION,
+    labels={"result": "skipped"},
+)
+alert_fanout_seconds = registry.histogram(
+    "lakewatch_alert_fanout_seconds",
+    "Time spent publishing an alert to the fan-out channel.",
+)
+
+
+def deliver_alert(alert: Dict[str, Any]) -> None:
+    """
+    Queue an alert raised by any worker for the clients of this one.
+
+    :param alert: alert text and metadata.
+    """
+    broadcaster.publish(alert["message"], alert)
+
+
+fanout.subscribe("alert", deliver_alert)
+
+
+def handle_command(client: Client, text: str) -> str:
+    """
+    Apply a command sent by a WebSocket client.
+
+    ``{"type": "subscribe", ...}`` replaces the client's subscription with
+    the given ``node_ids``, ``metrics``, ``severities`` and ``bbox``
+    filters, and ``{"type": "unsubscribe"}`` goes back to every alert.
+
+    :param client: client that sent the command.
+    :param text: raw command.
+    :return: JSON reply for the client.
+    """
+    try:
+        command = ujson.loads(text)
+        kind = command.pop("type")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return ujson.dumps({"type": "error", "detail": "Invalid command"})
+
+    if kind == "unsubscribe":
+        subscription = Subscription()
+    elif kind == "subscribe":
+        try:
+            subscription = Subscription.model_validate(command)
+        except ValidationError as e:
+            return ujson.dumps(
+                {"type": "error", "detail": e.errors(include_url=False)},
+                default=str,
+            )
+    else:
+        return ujson.dumps({"type": "error", "detail": f"Unknown command: {kind}"})
+
+    broadcaster.subscribe(client, subscription)
+    return ujson.dumps(
+        {
+            "type": "subscribed",
+            "subscription": subscription.model_dump(mode="json", exclude_none=True),
+        },
+    )
 
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
     await websocket.accept()
-    connections.add(websocket)
+    client = broadcaster.connect(websocket)
     logger.info("Client connected via WebSocket")
 
     try:
+        # Alerts are sent by the client's writer task, replies to commands
+        # are queued behind them
         while True:
-            await asyncio.sleep(10)
+            text = await websocket.receive_text()
+            broadcaster.send(client, handle_command(client, text))
     except WebSocketDisconnect:
-        connections.remove(websocket)
         logger.info("Client disconnected")
+    finally:
+        await broadcaster.disconnect(client)
 
 
-async def send_threshold_alert(message: str) -> bool:
-    if not connections:
+@router.websocket("/live")
+async def live_endpoint(websocket: WebSocket) -> None:
+    """
+    Stream node readings.
+
+    The first message is a ``snapshot`` of every node, followed by one
+    ``delta`` message per tick with only the fields that changed.
+    """
+    await websocket.accept()
+    live_feed.start()
+    client = live_feed.connect(websocket)
+
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await live_feed.broadcaster.disconnect(client)
+
+
+@router.get("/stats")
+def get_monitoring_stats() -> Dict[str, Any]:
+    """
+    Get WebSocket fan-out statistics.
+
+    :return: message totals, delivery lag, per-client queue state,
+        cross-worker fan-out counters and live feed statistics.
+    """
+    return {
+        **broadcaster.stats(),
+        "fanout": fanout.stats(),
+        "live": live_feed.stats(),
+        "alerts": alert_engine.stats(),
+    }
+
+
+async def send_threshold_alert(
+    message: str,
+    node_id: Optional[str] = None,
+    metric: Optional[str] = None,
+    severity: Severity = Severity.WARNING,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+) -> bool:
+    """
+    Queue an alert for the subscribed WebSocket clients of every worker.
+
+    The alert goes through the fan-out channel, so each worker delivers
+    it once to its own clients. Clients receive the message text, the
+    other arguments are only used to match their subscriptions. Returns
+    without waiting for any client to receive it.
+
+    :param message: alert text.
+    :param node_id: node that raised the alert.
+    :param metric: reading the alert is about.
+    :param severity: severity of the alert.
+    :param latitude: latitude of the node.
+    :param longitude: longitude of the node.
+    :return: whether the alert was handed to the fan-out channel.
+    """
+    if not fanout.distributed and not len(broadcaster):
         logger.warning("No active clients to send the alert.")
+        alerts_skipped.inc()
         return False
 
     logger.info(f"Sending alert to clients: {message}")
-    for connection in list(connections):
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            logger.error(f"Failed to send message: {e}")
-            connections.remove(connection)
+    alert = {
+        "message": message,
+        "node_id": node_id,
+        "metric": metric,
+        "severity": severity.value,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+    started = time.perf_counter()
+    try:
+        await fanout.publish("alert", alert)
+    except Exception as e:
+        alerts_failed.inc()
+        logger.error(f"Failed to publish alert: {e}")
+        return False
+    finally:
+        alert_fanout_seconds.observe(time.perf_counter() - started)
+    alerts_sent.inc()
     return True
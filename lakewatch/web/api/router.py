@@ -3,8 +3,14 @@ from fastapi.routing import APIRouter
 from lakewatch.web.api.get_data import router as get_data_router
 from lakewatch.web.api.monitoring import router as ws_router
 from lakewatch.web.api.get_nodes import router as get_nodes_router
+from lakewatch.web.api.ingest import router as ingest_router
+from lakewatch.web.api.alerts import router as alerts_router
+from lakewatch.web.api.thresholds import router as thresholds_router
 
 api_router = APIRouter()
 api_router.include_router(get_data_router, prefix="/get_data", tags=["get_data"])
 api_router.include_router(ws_router, prefix="/monitoring", tags=["WebSockets"])
 api_router.include_router(get_nodes_router, prefix="/get_nodes", tags=["get_nodes"])
+api_router.include_router(ingest_router, prefix="/ingest", tags=["ingest"])
+api_router.include_router(alerts_router, prefix="/alerts", tags=["alerts"])
+api_router.include_router(thresholds_router, prefix="/thresholds", tags=["thresholds"])
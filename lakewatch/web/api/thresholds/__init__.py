@@ -0,0 +1,5 @@
+"""API for inspecting and reloading threshold profiles."""
+
+from lakewatch.web.api.thresholds.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,71 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+from loguru import logger
+from pydantic import ValidationError
+
+from lakewatch.services.profiles import threshold_store
+
+router = APIRouter()
+
+
+@router.get("")
+async def get_thresholds() -> Dict[str, Any]:
+    """
+    Get the loaded threshold profiles.
+
+    :return: version of the profiles, the profiles and the defaults.
+    """
+    return {
+        "version": threshold_store.table.version,
+        "defaults": threshold_store.table.bounds(),
+        "profiles": threshold_store.profiles.model_dump(mode="json"),
+    }
+
+
+@router.post("/reload")
+async def reload_thresholds() -> Dict[str, Any]:
+    """
+    Read the threshold profiles file again and load it on every worker.
+
+    Consumers pick up the new thresholds with the next reading, there
+    is no need to restart them.
+
+    :raises HTTPException: if no file is configured or it is not valid.
+    :return: version of the profiles now loading.
+    """
+    if threshold_store.path is None:
+        raise HTTPException(
+            status_code=409,
+            detail="No threshold profiles file is configured",
+        )
+    try:
+        profiles = await threshold_store.reload()
+    except OSError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=e.errors(include_url=False, include_context=False),
+        ) from e
+    logger.info(f"Reloaded threshold profiles {profiles.version}")
+    return {
+        "version": profiles.version,
+        "groups": len(profiles.groups),
+        "nodes": len(profiles.nodes),
+    }
+
+
+@router.get("/{node_id}")
+async def get_node_thresholds(node_id: str) -> Dict[str, Any]:
+    """
+    Get the thresholds a node is checked against.
+
+    :param node_id: node identifier.
+    :return: bounds of every checked metric of the node.
+    """
+    return {
+        "node_id": node_id,
+        "version": threshold_store.table.version,
+        "thresholds": threshold_store.table.bounds(node_id),
+    }
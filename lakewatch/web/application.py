@@ -6,6 +6,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from lakewatch.log import configure_logging
 from lakewatch.web.api.router import api_router
 from lakewatch.web.lifespan import lifespan_setup
+from lakewatch.web.metrics import RequestMetrics
+from lakewatch.web.metrics import router as metrics_router
 
 
 def get_app() -> FastAPI:
@@ -36,6 +38,10 @@ def get_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Outermost, so the time spent in the other middleware is included
+    app.add_middleware(RequestMetrics)
+
     app.include_router(api_router, prefix="/api")
+    app.include_router(metrics_router)
 
     return app
@@ -1,37 +1,78 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from fastapi import FastAPI
 import aio_pika
 from loguru import logger
 
+from lakewatch.db import database
+from lakewatch.ingest import IngestService
 from lakewatch.settings import settings
-from lakewatch.services.rabbitmq import process_message
+from lakewatch.services.broadcast import broadcaster
+from lakewatch.services.fanout import fanout
+from lakewatch.services.live import live_feed
+from lakewatch.services.node_cache import node_cache
+from lakewatch.services.profiles import threshold_store
+
+
+async def close_clients() -> None:
+    """
+    Send the messages queued for the WebSocket clients and disconnect them.
+
+    Waits up to ``shutdown_timeout_seconds`` for the clients, and does
+    nothing once they are closed.
+    """
+    await asyncio.gather(
+        live_feed.stop(settings.shutdown_timeout_seconds),
+        broadcaster.close(settings.shutdown_timeout_seconds),
+    )
 
 
 @asynccontextmanager
 async def lifespan_setup(app: FastAPI) -> AsyncGenerator[None, None]:
     """Setup lifespan events."""
+    # Create or upgrade the schema before anything touches the database
+    version = await database.migrate()
+    logger.info(f"Database schema at version {version}")
+
+    # Serve /api/get_nodes from memory from the first request on
+    await node_cache.warm()
+
+    # Thresholds shown by the API, and used if this process ingests too
+    threshold_store.load(threshold_store.read())
+
     # Connect to RabbitMQ
     connection = await aio_pika.connect_robust(
         host=settings.rabbitmq_host,
         port=settings.rabbitmq_port,
     )
 
-    # Create channel
-    channel = await connection.channel()
-    await channel.set_qos(prefetch_count=100)
+    # Receive alerts and node updates from the ingest workers
+    await fanout.start(await connection.channel(publisher_confirms=False))
 
-    # Declare queue
-    queue = await channel.declare_queue(settings.rabbitmq_queue, durable=True)
+    # Readings are normally consumed by ``python -m lakewatch.ingest``
+    ingest = IngestService() if settings.api_ingest else None
+    if ingest is not None:
+        await ingest.start(connection)
+        logger.info("RabbitMQ consumer started")
 
-    # Start consuming messages
-    await queue.consume(process_message)
-    logger.info("RabbitMQ consumer started")
+    # Start streaming live readings
+    live_feed.start()
 
     app.state.rabbitmq_connection = connection
 
     yield
 
-    # Cleanup
+    # Cleanup: finish the messages in flight, then stop receiving events
+    # and send what is left to the WebSocket clients before closing them.
+    # Under ``python -m lakewatch`` the clients were closed before uvicorn
+    # started shutting down, see :class:`~lakewatch.web.server.Server`.
+    if ingest is not None:
+        await ingest.stop()
+    await fanout.stop()
+    await close_clients()
     await connection.close()
     logger.info("RabbitMQ connection closed")
+
+    database.close()
+    logger.info("Database connections closed")
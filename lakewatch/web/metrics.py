@@ -0,0 +1,72 @@
+"""Prometheus metrics of the web application."""
+
+import time
+from typing import Dict, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from lakewatch.services.metrics import (
+    CONTENT_TYPE,
+    LATENCY_BUCKETS,
+    Histogram,
+    registry,
+)
+
+router = APIRouter()
+
+# Shared by every app, the registry only takes each route once
+request_durations: Dict[Tuple[str, str], Histogram] = {}
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics() -> PlainTextResponse:
+    """
+    Get every metric of this worker for Prometheus to scrape.
+
+    :return: metrics in the text exposition format.
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+class RequestMetrics:
+    """
+    Times every HTTP request by method and route.
+
+    Requests are labelled with the route template, e.g.
+    ``/api/get_data/{node_id}``, so the number of histograms is bounded
+    by the routes of the app. Requests no route matched are not timed.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Set by the router on the same scope once a route matched
+            route = scope.get("route")
+            if route is not None:
+                _duration(scope["method"], route.path).observe(
+                    time.perf_counter() - started,
+                )
+
+
+def _duration(method: str, handler: str) -> Histogram:
+    histogram = request_durations.get((method, handler))
+    if histogram is None:
+        histogram = Histogram(
+            "lakewatch_http_request_duration_seconds",
+            "Time spent handling HTTP requests.",
+            LATENCY_BUCKETS,
+            labels={"method": method, "handler": handler},
+        )
+        registry.register(histogram)
+        request_durations[(method, handler)] = histogram
+    return histogram
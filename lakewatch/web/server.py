@@ -0,0 +1,32 @@
+import socket
+from typing import List, Optional
+
+import uvicorn
+
+from lakewatch.web.lifespan import close_clients
+
+
+class Server(uvicorn.Server):
+    """
+    Uvicorn server that closes WebSocket clients itself on shutdown.
+
+    Uvicorn closes every open WebSocket with 1012 (service restart) and
+    waits for the connections to end before the lifespan shutdown runs,
+    so clients would miss the messages still queued for them. Once the
+    server stops accepting connections, the queued messages are sent and
+    the clients are closed with 1001 (going away), then uvicorn shuts
+    down as usual.
+    """
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        """
+        Drain the WebSocket clients, then shut the server down.
+
+        :param sockets: listening sockets shared with other workers.
+        """
+        for server in self.servers:
+            server.close()
+        for sock in sockets or []:
+            sock.close()
+        await close_clients()
+        await super().shutdown(sockets)
@@ -0,0 +1,161 @@
+"""Tests for the alert history API."""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lakewatch.db import Database
+from lakewatch.services.alerts import AlertEvent
+from lakewatch.services.writer import count_alerts
+from lakewatch.web.application import get_app
+
+EVENTS = [
+    AlertEvent("node1", "ph", "threshold", "open", 8.5, 8.0, 1000),
+    AlertEvent("node1", "ph", "threshold", "resolved", 7.5, 8.0, 1100),
+    AlertEvent("node1", "temperature", "outlier", "open", 35.0, None, 1200),
+    AlertEvent("node2", "ph", "threshold", "open", 9.0, 8.0, 1300),
+]
+
+
+@pytest.fixture
+def client() -> TestClient:
+    """Create a test client for the app."""
+    return TestClient(get_app())
+
+
+@pytest.fixture
+def alerts(temp_database: Database) -> Database:
+    """Fill the temporary database with alert events and counters."""
+    conn = sqlite3.connect(temp_database.path)
+    conn.executemany(
+        "INSERT INTO alert_events (node_id, metric, kind, state, value, threshold,"
+        " timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        EVENTS,
+    )
+    conn.executemany(
+        "INSERT INTO alert_counts VALUES (?, ?, ?, ?, ?, ?)",
+        count_alerts(EVENTS),
+    )
+    conn.commit()
+    conn.close()
+    return temp_database
+
+
+def test_get_alerts_newest_first(client: TestClient, alerts: Database) -> None:
+    """Test every alert is returned, newest first."""
+    response = client.get("/api/alerts")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 4
+    assert [alert["timestamp"] for alert in data["data"]] == [1300, 1200, 1100, 1000]
+    assert data["data"][0] == {
+        "id": 4,
+        "node_id": "node2",
+        "metric": "ph",
+        "kind": "threshold",
+        "state": "open",
+        "value": 9.0,
+        "threshold": 8.0,
+        "timestamp": 1300,
+    }
+    assert data["next_before"] is None
+
+
+def test_get_alerts_filters(client: TestClient, alerts: Database) -> None:
+    """Test alerts can be filtered by node, metric, kind, state and time."""
+    response = client.get(
+        "/api/alerts",
+        params={"node_id": "node1", "metric": "ph", "start": 1050},
+    )
+    assert [alert["state"] for alert in response.json()["data"]] == ["resolved"]
+
+    response = client.get("/api/alerts", params={"kind": "outlier"})
+    assert [alert["node_id"] for alert in response.json()["data"]] == ["node1"]
+
+    response = client.get("/api/alerts", params={"state": "open", "end": 1250})
+    assert [alert["timestamp"] for alert in response.json()["data"]] == [1200, 1000]
+
+    response = client.get("/api/alerts", params={"kind": "unknown"})
+    assert response.status_code == 422
+
+
+def test_get_alerts_pagination(client: TestClient, alerts: Database) -> None:
+    """Test pages continue where the previous one stopped."""
+    first = client.get("/api/alerts", params={"limit": 3}).json()
+    second = client.get(
+        "/api/alerts",
+        params={"limit": 3, "before": first["next_before"]},
+    ).json()
+
+    assert first["next_before"] == "1100:2"
+    assert [alert["id"] for alert in second["data"]] == [1]
+    assert second["next_before"] is None
+
+
+def test_get_alerts_pagination_follows_timestamps(
+    client: TestClient,
+    alerts: Database,
+) -> None:
+    """Test alerts recorded late and ties on the timestamp are paged in order."""
+    conn = sqlite3.connect(alerts.path)
+    conn.executemany(
+        "INSERT INTO alert_events (node_id, metric, kind, state, value, threshold,"
+        " timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            AlertEvent("node3", "ph", "threshold", "open", 9.0, 8.0, 1100),
+            AlertEvent("node3", "ph", "threshold", "resolved", 7.0, 8.0, 1050),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    ids = []
+    before = None
+    while True:
+        params = {"limit": 2, **({"before": before} if before else {})}
+        page = client.get("/api/alerts", params=params).json()
+        ids += [alert["id"] for alert in page["data"]]
+        before = page["next_before"]
+        if before is None:
+            break
+
+    assert ids == [4, 3, 5, 2, 6, 1]
+
+
+def test_get_alerts_invalid_cursor(client: TestClient) -> None:
+    """Test a cursor that is not a next_before value is rejected."""
+    response = client.get("/api/alerts", params={"before": "12"})
+
+    assert response.status_code == 422
+
+
+def test_get_alerts_invalid_range(client: TestClient) -> None:
+    """Test an empty range is rejected."""
+    response = client.get("/api/alerts", params={"start": 10, "end": 5})
+
+    assert response.status_code == 400
+
+
+def test_get_alert_summary(client: TestClient, alerts: Database) -> None:
+    """Test per-node alert counts."""
+    response = client.get("/api/alerts/summary")
+
+    assert response.status_code == 200
+    nodes = {node["node_id"]: node for node in response.json()["data"]}
+    assert nodes["node1"]["total"] == 3
+    assert nodes["node1"]["last_timestamp"] == 1200
+    assert nodes["node2"]["total"] == 1
+
+    response = client.get("/api/alerts/summary", params={"node_id": "node2"})
+    assert response.json()["count"] == 1
+    assert response.json()["data"][0]["counts"] == [
+        {
+            "metric": "ph",
+            "kind": "threshold",
+            "state": "open",
+            "count": 1,
+            "last_timestamp": 1300,
+        },
+    ]
@@ -3,10 +3,14 @@
 import json
 import pytest
 import sqlite3
-from unittest.mock import patch, MagicMock
+from datetime import datetime
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from typing import List, Dict, Any
 
+from lakewatch.db import Database, database
+from lakewatch.services.rollup import rebuild_rollups
+from lakewatch.web.api.get_data.views import READINGS_QUERY
 from lakewatch.web.application import get_app
 
 
@@ -17,27 +21,48 @@ def client() -> TestClient:
 
 
 @pytest.fixture
-def mock_db_data() -> List[Dict[str, str]]:
+def mock_db_data() -> List[Dict[str, Any]]:
     """Create mock data for database responses."""
+    timestamp = int(datetime.now().timestamp())
     return [
-        {"node_id": "node1", "data": json.dumps({"temperature": 25.6, "pH": 7.2})},
-        {"node_id": "node1", "data": json.dumps({"temperature": 25.8, "pH": 7.3})},
+        {
+            "timestamp": timestamp - 20,
+            "temperature": 25.6,
+            "ph": 7.2,
+            "dissolved_oxygen": 8.1,
+        },
+        {
+            "timestamp": timestamp - 10,
+            "temperature": 25.8,
+            "ph": 7.3,
+            "dissolved_oxygen": 8.0,
+        },
     ]
 
 
+@pytest.fixture
+def readings(temp_database: Database) -> Database:
+    """Fill the temporary database with one reading per minute for node1."""
+    conn = sqlite3.connect(temp_database.path)
+    conn.executemany(
+        "INSERT INTO node_data VALUES (?, ?, ?, ?, ?)",
+        [("node1", 1000 + 60 * i, 20.0 + i, 7.0, 8.0) for i in range(10)]
+        + [("node2", 1000, 30.0, 7.0, 8.0)],
+    )
+    conn.commit()
+    conn.isolation_level = None
+    rebuild_rollups(conn)
+    conn.close()
+    return temp_database
+
+
 def test_get_data_success(
-    client: TestClient, mock_db_data: List[Dict[str, str]]
+    client: TestClient, mock_db_data: List[Dict[str, Any]]
 ) -> None:
     """Test successful data retrieval for a node."""
-    with patch("sqlite3.connect") as mock_connect:
-        # Set up the mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-
-        # Mock fetchall to return our test data
-        mock_cursor.fetchall.return_value = mock_db_data
+    with patch.object(database, "fetch") as mock_fetch:
+        # Mock fetch to return our test data
+        mock_fetch.return_value = mock_db_data
 
         # Make the request
         response = client.get("/api/get_data/node1")
@@ -48,18 +73,16 @@ def test_get_data_success(
         assert data["node_id"] == "node1"
         assert data["count"] == 2
         assert len(data["data"]) == 2
+        assert data["data"][0]["temperature"] == 25.6
+        assert "datetime" in data["data"][0]
+        assert data["next_after"] is None
 
 
 def test_get_data_no_results(client: TestClient) -> None:
     """Test when no data is found for a node."""
-    with patch("sqlite3.connect") as mock_connect:
-        # Set up the mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-
-        # Mock fetchall to return empty results
-        mock_cursor.fetchall.return_value = []
+    with patch.object(database, "fetch") as mock_fetch:
+        # Mock fetch to return empty results
+        mock_fetch.return_value = []
 
         # Make the request
         response = client.get("/api/get_data/nonexistent_node")
@@ -68,15 +91,15 @@ def test_get_data_no_results(client: TestClient) -> None:
         assert response.status_code == 200
         data = response.json()
         assert data["node_id"] == "nonexistent_node"
-        assert data["message"] == "No data found for the last 24 hours"
+        assert data["message"] == "No data found for the requested range"
         assert data["data"] == []
 
 
 def test_get_data_db_error(client: TestClient) -> None:
     """Test database error handling."""
-    with patch("sqlite3.connect") as mock_connect:
+    with patch.object(database, "fetch") as mock_fetch:
         # Set up the mock to raise an error
-        mock_connect.side_effect = sqlite3.Error("Test database error")
+        mock_fetch.side_effect = sqlite3.Error("Test database error")
 
         # Make the request
         response = client.get("/api/get_data/node1")
@@ -85,3 +108,146 @@ def test_get_data_db_error(client: TestClient) -> None:
         assert response.status_code == 500
         data = response.json()
         assert "Database error" in data["detail"]
+
+
+def test_get_data_defaults_to_last_24_hours(client: TestClient) -> None:
+    """Test the range defaults to the last 24 hours."""
+    with patch.object(database, "fetch") as mock_fetch:
+        mock_fetch.return_value = []
+
+        client.get("/api/get_data/node1")
+
+        node_id, lower, upper, limit = mock_fetch.call_args[0][1]
+        assert node_id == "node1"
+        assert upper - lower == 24 * 60 * 60
+        assert limit == 1000
+
+
+def test_get_data_time_range(client: TestClient, readings: Database) -> None:
+    """Test only readings within the inclusive range are returned."""
+    response = client.get("/api/get_data/node1?start=1060&end=1180")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [row["timestamp"] for row in data["data"]] == [1060, 1120, 1180]
+    assert data["data"][0]["temperature"] == 21.0
+
+
+def test_get_data_keyset_pagination(client: TestClient, readings: Database) -> None:
+    """Test paging through a range with next_after."""
+    timestamps = []
+    after = None
+    while True:
+        url = "/api/get_data/node1?start=0&end=5000&limit=4"
+        if after is not None:
+            url += f"&after={after}"
+        data = client.get(url).json()
+        timestamps.extend(row["timestamp"] for row in data["data"])
+        after = data.get("next_after")
+        if after is None:
+            break
+
+    assert timestamps == [1000 + 60 * i for i in range(10)]
+
+
+def test_get_data_invalid_range(client: TestClient) -> None:
+    """Test an inverted range is rejected."""
+    response = client.get("/api/get_data/node1?start=2000&end=1000")
+
+    assert response.status_code == 400
+
+
+def test_get_data_limit_is_bounded(client: TestClient) -> None:
+    """Test the page size cannot exceed the configured maximum."""
+    response = client.get("/api/get_data/node1?limit=100000")
+
+    assert response.status_code == 422
+
+
+def test_readings_query_uses_covering_index(readings: Database) -> None:
+    """Test the readings query never has to read the table itself."""
+    conn = sqlite3.connect(readings.path)
+    plan = conn.execute(
+        f"EXPLAIN QUERY PLAN {READINGS_QUERY}",
+        ("node1", 0, 1, 1),
+    ).fetchall()
+    conn.close()
+
+    assert "COVERING INDEX ix_node_data_node_timestamp" in plan[0][3]
+
+
+def test_export_ndjson(client: TestClient, readings: Database) -> None:
+    """Test exporting a range as NDJSON across several chunks."""
+    with patch("lakewatch.web.api.get_data.views.settings") as mock_settings:
+        mock_settings.export_chunk_size = 3
+
+        response = client.get("/api/get_data/node1/export?start=0&end=5000")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["timestamp"] for line in lines] == [1000 + 60 * i for i in range(10)]
+    assert lines[0] == {
+        "node_id": "node1",
+        "timestamp": 1000,
+        "temperature": 20.0,
+        "ph": 7.0,
+        "dissolved_oxygen": 8.0,
+    }
+
+
+def test_export_csv(client: TestClient, readings: Database) -> None:
+    """Test exporting a range as CSV with a header."""
+    response = client.get("/api/get_data/node1/export?start=1000&end=1060&format=csv")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    assert response.text.splitlines() == [
+        "node_id,timestamp,temperature,ph,dissolved_oxygen",
+        "node1,1000,20.0,7.0,8.0",
+        "node1,1060,21.0,7.0,8.0",
+    ]
+
+
+def test_export_gzip(client: TestClient, readings: Database) -> None:
+    """Test the export can be gzip compressed."""
+    response = client.get("/api/get_data/node1/export?start=0&end=5000&gzip=true")
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    # The client transparently decompresses the body
+    assert len(response.text.splitlines()) == 10
+
+
+def test_get_aggregate(client: TestClient, readings: Database) -> None:
+    """Test readings are aggregated per bucket."""
+    response = client.get("/api/get_data/node1/aggregate?bucket=5m&start=0&end=5000")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["bucket"] == "5m"
+    assert sum(bucket["count"] for bucket in data["data"]) == 10
+    assert data["data"][0]["temperature"]["min"] == 20.0
+
+
+def test_get_aggregate_rejects_too_many_buckets(client: TestClient) -> None:
+    """Test a range with too many buckets is rejected."""
+    response = client.get(
+        "/api/get_data/node1/aggregate?bucket=1m&start=0&end=1000000000"
+    )
+
+    assert response.status_code == 400
+
+
+def test_get_downsampled(client: TestClient, readings: Database) -> None:
+    """Test a metric is downsampled to the requested number of points."""
+    response = client.get(
+        "/api/get_data/node1/downsample?metric=temperature&points=4&start=0&end=5000",
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 4
+    assert data["data"][0] == {"timestamp": 1000, "value": 20.0}
+    assert data["data"][-1] == {"timestamp": 1540, "value": 29.0}
@@ -0,0 +1,36 @@
+"""Tests for the Prometheus metrics endpoint."""
+
+from fastapi.testclient import TestClient
+
+from lakewatch.services.broadcast import broadcaster
+from lakewatch.services.metrics import CONTENT_TYPE
+from lakewatch.web.metrics import request_durations
+
+
+def test_get_metrics(client: TestClient) -> None:
+    """Test the metrics of the worker are served in the text format."""
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert "# TYPE lakewatch_ingest_flush_latency_seconds histogram" in lines
+    assert f'lakewatch_ws_connections{{feed="alerts"}} {len(broadcaster)}' in lines
+    assert 'lakewatch_ws_connections{feed="live"} 0' in lines
+
+
+def test_requests_are_timed_by_route(client: TestClient) -> None:
+    """Test requests are timed under their route template."""
+    timed = request_durations.get(("GET", "/api/ingest/status"))
+    before = timed.count if timed is not None else 0
+
+    client.get("/api/ingest/status")
+    client.get("/api/no/such/route")
+
+    assert request_durations[("GET", "/api/ingest/status")].count == before + 1
+    assert not any("/no/such/route" in handler for _, handler in request_durations)
+    response = client.get("/metrics")
+    assert (
+        'lakewatch_http_request_duration_seconds_count{method="GET",'
+        f'handler="/api/ingest/status"}} {before + 1}'
+    ) in response.text.splitlines()
@@ -3,17 +3,21 @@
 import pytest
 import sqlite3
 from datetime import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from fastapi.testclient import TestClient
-from typing import List, Dict, Any
+from typing import Generator, List, Dict, Any
 
+from lakewatch.db import database
+from lakewatch.services.node_cache import node_cache
 from lakewatch.web.application import get_app
 
 
 @pytest.fixture
-def client() -> TestClient:
-    """Create a test client for the app."""
-    return TestClient(get_app())
+def client() -> Generator[TestClient, None, None]:
+    """Create a test client for the app with a cold node cache."""
+    node_cache.clear()
+    yield TestClient(get_app())
+    node_cache.clear()
 
 
 @pytest.fixture
@@ -48,15 +52,10 @@ def test_get_nodes_success(
     client: TestClient, mock_node_data: List[Dict[str, Any]]
 ) -> None:
     """Test successful retrieval of all nodes."""
-    with patch("sqlite3.connect") as mock_connect:
-        # Set up the mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
+    with patch.object(database, "fetch") as mock_fetch:
 
-        # Mock fetchall to return our test data
-        mock_cursor.fetchall.return_value = mock_node_data
+        # Mock fetch to return our test data
+        mock_fetch.return_value = mock_node_data
 
         # Make the request
         response = client.get("/api/get_nodes/")
@@ -76,14 +75,10 @@ def test_get_nodes_success(
 
 def test_get_nodes_no_results(client: TestClient) -> None:
     """Test when no nodes are found."""
-    with patch("sqlite3.connect") as mock_connect:
-        # Set up the mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
+    with patch.object(database, "fetch") as mock_fetch:
 
-        # Mock fetchall to return empty results
-        mock_cursor.fetchall.return_value = []
+        # Mock fetch to return empty results
+        mock_fetch.return_value = []
 
         # Make the request
         response = client.get("/api/get_nodes/")
@@ -96,9 +91,9 @@ def test_get_nodes_no_results(client: TestClient) -> None:
 
 def test_get_nodes_db_error(client: TestClient) -> None:
     """Test database error handling."""
-    with patch("sqlite3.connect") as mock_connect:
+    with patch.object(database, "fetch") as mock_fetch:
         # Set up the mock to raise an error
-        mock_connect.side_effect = sqlite3.Error("Test database error")
+        mock_fetch.side_effect = sqlite3.Error("Test database error")
 
         # Make the request
         response = client.get("/api/get_nodes/")
@@ -111,12 +106,7 @@ def test_get_nodes_db_error(client: TestClient) -> None:
 
 def test_get_nodes_key_error_handling(client: TestClient) -> None:
     """Test handling of malformed data in the database."""
-    with patch("sqlite3.connect") as mock_connect:
-        # Set up the mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
+    with patch.object(database, "fetch") as mock_fetch:
 
         # Create malformed data (missing keys)
         malformed_data = [
@@ -133,7 +123,7 @@ def test_get_nodes_key_error_handling(client: TestClient) -> None:
             },
         ]
 
-        mock_cursor.fetchall.return_value = malformed_data
+        mock_fetch.return_value = malformed_data
 
         # Make the request
         response = client.get("/api/get_nodes/")
@@ -144,3 +134,39 @@ def test_get_nodes_key_error_handling(client: TestClient) -> None:
         assert data["count"] == 1  # Only one valid node
         assert len(data["data"]) == 1
         assert data["data"][0]["node_id"] == "node2"
+
+
+def test_get_nodes_served_from_cache(
+    client: TestClient, mock_node_data: List[Dict[str, Any]]
+) -> None:
+    """Test the database is only read to warm the cache."""
+    with patch.object(database, "fetch") as mock_fetch:
+        mock_fetch.return_value = mock_node_data
+
+        client.get("/api/get_nodes/")
+        response = client.get("/api/get_nodes/")
+
+        assert response.json()["count"] == 2
+        mock_fetch.assert_called_once()
+
+
+def test_get_nodes_not_modified(
+    client: TestClient, mock_node_data: List[Dict[str, Any]]
+) -> None:
+    """Test a matching If-None-Match returns 304 until a node changes."""
+    with patch.object(database, "fetch") as mock_fetch:
+        mock_fetch.return_value = mock_node_data
+
+        etag = client.get("/api/get_nodes/").headers["etag"]
+        response = client.get("/api/get_nodes/", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+        node_cache.update(
+            {**mock_node_data[0], "timestamp": mock_node_data[0]["last_updated"] + 10},
+        )
+        response = client.get("/api/get_nodes/", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
@@ -0,0 +1,71 @@
+"""Tests for the ingest status API."""
+
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lakewatch.ingest import IngestService
+from lakewatch.services.fanout import fanout
+from lakewatch.services.flow import flow_controller
+from lakewatch.services.reports import ingest_reports
+
+
+@pytest.fixture(autouse=True)
+def reset_workers() -> Generator[None, None, None]:
+    """Forget the statuses reported by other tests."""
+    flow_controller.reports.clear()
+    ingest_reports.clear()
+    yield
+    flow_controller.reports.clear()
+    ingest_reports.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_ingest_status(client: TestClient) -> None:
+    """Test the statuses the workers report through the fan-out are returned."""
+    status = {**flow_controller.status(), "worker": "ingest-1", "queue_depth": 7}
+    await fanout.publish("flow", status)
+
+    response = client.get("/api/ingest/status")
+
+    assert response.status_code == 200
+    assert response.json() == {"workers": [status]}
+
+
+@pytest.mark.asyncio
+async def test_get_ingest_stats(client: TestClient) -> None:
+    """Test the statistics the workers report are returned per worker."""
+    first = {**IngestService().stats(), "worker": "ingest-1"}
+    second = {**IngestService().stats(), "worker": "ingest-0"}
+    await fanout.publish("ingest", first)
+    await fanout.publish("ingest", second)
+
+    response = client.get("/api/ingest/stats")
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert set(stats) == {"database", "workers"}
+    assert [worker["worker"] for worker in stats["workers"]] == [
+        "ingest-0",
+        "ingest-1",
+    ]
+    assert set(stats["workers"][0]) >= {
+        "pending",
+        "retention",
+        "dead_letters",
+        "routing",
+    }
+
+
+@pytest.mark.asyncio
+async def test_ingest_stats_drop_stopped_workers(client: TestClient) -> None:
+    """Test workers that stopped reporting are left out."""
+    await fanout.publish("ingest", {"worker": "ingest-0"})
+    ingest_reports.interval = 0
+    try:
+        response = client.get("/api/ingest/stats")
+    finally:
+        ingest_reports.interval = flow_controller.interval
+
+    assert response.json()["workers"] == []
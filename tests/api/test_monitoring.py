@@ -1,12 +1,19 @@
 """Tests for the monitoring WebSocket API."""
 
+import asyncio
+from typing import Generator
+
 import pytest
+import ujson
 from fastapi.testclient import TestClient
-from fastapi.websockets import WebSocketDisconnect
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import AsyncMock, patch
 
 from lakewatch.web.application import get_app
-from lakewatch.web.api.monitoring.views import connections, send_threshold_alert
+from lakewatch.services.broadcast import broadcaster
+from lakewatch.services.subscriptions import Subscription, SubscriptionIndex
+from lakewatch.services.fanout import fanout
+from lakewatch.web.api.monitoring import views
+from lakewatch.web.api.monitoring.views import send_threshold_alert
 
 
 @pytest.fixture
@@ -15,6 +22,22 @@ def client() -> TestClient:
     return TestClient(get_app())
 
 
+@pytest.fixture(autouse=True)
+def reset_broadcaster() -> Generator[None, None, None]:
+    """Make sure no client leaks from one test into another."""
+    broadcaster._clients.clear()  # noqa: SLF001
+    broadcaster._index = SubscriptionIndex()  # noqa: SLF001
+    yield
+    broadcaster._clients.clear()  # noqa: SLF001
+    broadcaster._index = SubscriptionIndex()  # noqa: SLF001
+
+
+async def flush() -> None:
+    """Let the writer tasks run."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
 def test_websocket_connect(client: TestClient) -> None:
     """Test WebSocket connection is established."""
     with client.websocket_connect("/api/monitoring/ws") as websocket:
@@ -22,31 +45,89 @@ def test_websocket_connect(client: TestClient) -> None:
         pass
 
 
+def test_live_snapshot(client: TestClient) -> None:
+    """Test live clients start with a snapshot of every node."""
+    with client.websocket_connect("/api/monitoring/live") as websocket:
+        message = ujson.loads(websocket.receive_text())
+
+    assert message["type"] == "snapshot"
+    assert isinstance(message["nodes"], dict)
+
+
+def test_monitoring_stats(client: TestClient) -> None:
+    """Test fan-out statistics are exposed."""
+    response = client.get("/api/monitoring/stats")
+
+    assert response.status_code == 200
+    assert response.json()["connections"] == 0
+    assert response.json()["clients"] == []
+
+
 @pytest.mark.asyncio
 async def test_send_threshold_alert_with_connections() -> None:
     """Test sending threshold alert to active connections."""
-    # Mock a WebSocket connection
     mock_ws = AsyncMock()
+    broadcaster.connect(mock_ws)
 
-    # Store the mock in connections set
-    connections.clear()  # Clear any existing connections
-    connections.add(mock_ws)
-
-    # Send an alert
-    await send_threshold_alert("Test alert message")
+    assert await send_threshold_alert("Test alert message") is True
+    await flush()
 
     # Verify the message was sent
     mock_ws.send_text.assert_called_once_with("Test alert message")
+    await broadcaster.close()
+
+
+def test_websocket_subscribe(client: TestClient) -> None:
+    """Test clients can change and reset their subscription."""
+    with client.websocket_connect("/api/monitoring/ws") as websocket:
+        websocket.send_text(
+            ujson.dumps(
+                {"type": "subscribe", "node_ids": ["node1"], "bbox": [1, 2, 3, 4]}
+            ),
+        )
+        reply = ujson.loads(websocket.receive_text())
+        assert reply == {
+            "type": "subscribed",
+            "subscription": {"node_ids": ["node1"], "bbox": [1.0, 2.0, 3.0, 4.0]},
+        }
+
+        websocket.send_text(ujson.dumps({"type": "unsubscribe"}))
+        assert ujson.loads(websocket.receive_text())["subscription"] == {}
+
+        websocket.send_text(ujson.dumps({"type": "subscribe", "severities": ["x"]}))
+        assert ujson.loads(websocket.receive_text())["type"] == "error"
+
+        websocket.send_text("not json")
+        assert ujson.loads(websocket.receive_text())["type"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_send_threshold_alert_to_subscribers() -> None:
+    """Test alerts only reach clients whose subscription matches."""
+    node1_ws = AsyncMock()
+    other_ws = AsyncMock()
+    broadcaster.subscribe(
+        broadcaster.connect(node1_ws),
+        Subscription(node_ids={"node1"}),
+    )
+    broadcaster.subscribe(
+        broadcaster.connect(other_ws),
+        Subscription(node_ids={"node2"}),
+    )
+
+    await send_threshold_alert("pH threshold exceeded: 9.0", node_id="node1")
+    await flush()
+
+    node1_ws.send_text.assert_called_once_with("pH threshold exceeded: 9.0")
+    other_ws.send_text.assert_not_called()
+    await broadcaster.close()
 
 
 @pytest.mark.asyncio
 async def test_send_threshold_alert_no_connections() -> None:
     """Test sending threshold alert when there are no connections."""
-    # Clear all connections
-    connections.clear()
-
     # Send an alert (should not raise exceptions)
-    await send_threshold_alert("Test alert message")
+    assert await send_threshold_alert("Test alert message") is False
 
 
 @pytest.mark.asyncio
@@ -55,13 +136,33 @@ async def test_send_threshold_alert_with_exception() -> None:
     # Mock a WebSocket connection that raises an exception
     mock_ws = AsyncMock()
     mock_ws.send_text.side_effect = Exception("Connection error")
+    broadcaster.connect(mock_ws)
 
-    # Store the mock in connections set
-    connections.clear()
-    connections.add(mock_ws)
-
-    # Send an alert
     await send_threshold_alert("Test alert message")
+    await flush()
 
     # Verify the connection was removed due to the exception
-    assert len(connections) == 0
+    assert len(broadcaster) == 0
+    await broadcaster.close()
+
+
+@pytest.mark.asyncio
+async def test_send_threshold_alert_counts_outcomes() -> None:
+    """Test alerts are counted by outcome and their fan-out timed."""
+    sent = views.alerts_sent.value
+    failed = views.alerts_failed.value
+    skipped = views.alerts_skipped.value
+    published = views.alert_fanout_seconds.count
+
+    await send_threshold_alert("Nobody listens")
+    broadcaster.connect(AsyncMock())
+    await send_threshold_alert("Delivered")
+    await flush()
+    with patch.object(fanout, "publish", AsyncMock(side_effect=RuntimeError("down"))):
+        assert await send_threshold_alert("Lost") is False
+
+    assert views.alerts_skipped.value == skipped + 1
+    assert views.alerts_sent.value == sent + 1
+    assert views.alerts_failed.value == failed + 1
+    assert views.alert_fanout_seconds.count == published + 2
+    await broadcaster.close()
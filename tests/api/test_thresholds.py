@@ -0,0 +1,58 @@
+"""Tests for the threshold profiles API."""
+
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from lakewatch.services.profiles import threshold_store
+
+
+def test_get_node_thresholds(client: TestClient) -> None:
+    """Test the effective thresholds of a node are returned."""
+    response = client.get("/api/thresholds/node1")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["node_id"] == "node1"
+    assert data["thresholds"]["temperature"] == {"min": None, "max": 30.0}
+
+
+def test_reload_thresholds(client: TestClient, tmp_path: Path) -> None:
+    """Test a reload loads the file for the following checks."""
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"nodes": {"node1": {"temperature": {"max": 20.0}}}}))
+
+    with patch.object(threshold_store, "path", path):
+        response = client.post("/api/thresholds/reload")
+
+    assert response.status_code == 200
+    assert response.json()["nodes"] == 1
+    assert response.json()["version"] == threshold_store.table.version
+    data = client.get("/api/thresholds/node1").json()
+    assert data["thresholds"]["temperature"] == {"min": None, "max": 20.0}
+    assert client.get("/api/thresholds").json()["profiles"]["nodes"] == {
+        "node1": {"temperature": {"min": None, "max": 20.0}},
+    }
+
+
+def test_reload_thresholds_invalid_file(client: TestClient, tmp_path: Path) -> None:
+    """Test an invalid file is rejected and the loaded profiles are kept."""
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"nodes": {"node1": {"salinity": {"max": 1.0}}}}))
+    version = threshold_store.table.version
+
+    with patch.object(threshold_store, "path", path):
+        response = client.post("/api/thresholds/reload")
+
+    assert response.status_code == 422
+    assert threshold_store.table.version == version
+
+
+def test_reload_thresholds_without_file(client: TestClient) -> None:
+    """Test a reload needs a configured file."""
+    with patch.object(threshold_store, "path", None):
+        response = client.post("/api/thresholds/reload")
+
+    assert response.status_code == 409
@@ -2,6 +2,7 @@
 
 import pytest
 import json
+import sqlite3
 import tempfile
 from datetime import datetime
 from pathlib import Path
@@ -9,10 +10,37 @@ from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from typing import Dict, Tuple, Generator, Any
 
+from lakewatch.db import Database, database
+from lakewatch.db.migrations import migrate
+from lakewatch.services.alerts import alert_engine
+from lakewatch.services.profiles import ThresholdProfiles, threshold_store
+from lakewatch.services.writer import ingest_writer
 from lakewatch.web.application import get_app
 from lakewatch.settings import Settings
 
 
+@pytest.fixture(autouse=True)
+def reset_alert_engine() -> Generator[None, None, None]:
+    """Start every test without open alerts."""
+    alert_engine.clear()
+    yield
+    alert_engine.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_thresholds() -> Generator[None, None, None]:
+    """Check every test against the thresholds from the settings."""
+    yield
+    threshold_store.load(ThresholdProfiles())
+
+
+@pytest.fixture(autouse=True)
+def no_alert_history() -> Generator[MagicMock, None, None]:
+    """Keep alerts raised by tests out of the shared ingest writer."""
+    with patch.object(ingest_writer, "record_alert") as record_alert:
+        yield record_alert
+
+
 @pytest.fixture
 def client() -> TestClient:
     """Create a test client for the app."""
@@ -22,8 +50,21 @@ def client() -> TestClient:
 @pytest.fixture
 def temp_db_path() -> Generator[Path, None, None]:
     """Create a temporary database file path."""
-    with tempfile.NamedTemporaryFile(suffix=".sqlite3") as temp_file:
-        yield Path(temp_file.name)
+    # A directory rather than a file, so the WAL side files are cleaned up too
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield Path(temp_dir) / "db.sqlite3"
+
+
+@pytest.fixture
+def temp_database(temp_db_path: Path) -> Generator[Database, None, None]:
+    """Point the shared database at a migrated temporary file."""
+    database.close()
+    conn = sqlite3.connect(temp_db_path, isolation_level=None)
+    migrate(conn)
+    conn.close()
+    with patch.object(database, "_path", temp_db_path):
+        yield database
+        database.close()
 
 
 @pytest.fixture
@@ -0,0 +1,82 @@
+"""Tests for the async database layer."""
+
+import asyncio
+import sqlite3
+import threading
+import pytest
+
+from lakewatch.db import Database
+
+
+async def create_table(db: Database) -> Database:
+    """Create a scratch table in the database."""
+    await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    return db
+
+
+@pytest.mark.asyncio
+async def test_execute_and_fetch(temp_database: Database) -> None:
+    """Test writes are visible to the read-only pool."""
+    table = await create_table(temp_database)
+    await table.executemany(
+        "INSERT INTO items (id, name) VALUES (?, ?)",
+        [(1, "a"), (2, "b")],
+    )
+
+    rows = await table.fetch("SELECT id, name FROM items ORDER BY id")
+    assert [dict(row) for row in rows] == [
+        {"id": 1, "name": "a"},
+        {"id": 2, "name": "b"},
+    ]
+    row = await table.fetchone("SELECT name FROM items WHERE id = ?", (2,))
+    assert row is not None
+    assert row["name"] == "b"
+
+
+@pytest.mark.asyncio
+async def test_transaction_rolls_back_on_error(temp_database: Database) -> None:
+    """Test a failing transaction leaves no partial writes behind."""
+    table = await create_table(temp_database)
+
+    def write(conn: sqlite3.Connection) -> None:
+        conn.execute("INSERT INTO items (id, name) VALUES (1, 'a')")
+        conn.execute("INSERT INTO items (id, name) VALUES (1, 'duplicate')")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        await table.transaction(write)
+
+    assert await table.fetch("SELECT * FROM items") == []
+
+
+@pytest.mark.asyncio
+async def test_writes_run_on_a_single_thread(temp_database: Database) -> None:
+    """Test every write is executed on the same dedicated thread."""
+    table = await create_table(temp_database)
+    threads = await asyncio.gather(
+        *(table.transaction(lambda _: threading.get_ident()) for _ in range(10)),
+    )
+
+    assert len(set(threads)) == 1
+    assert threads[0] != threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_readers_cannot_write(temp_database: Database) -> None:
+    """Test reader connections are opened read-only."""
+    table = await create_table(temp_database)
+    with pytest.raises(sqlite3.OperationalError):
+        await table.read(
+            lambda conn: conn.execute("INSERT INTO items (id, name) VALUES (1, 'a')"),
+        )
+
+
+@pytest.mark.asyncio
+async def test_stats_report_queue_depth(temp_database: Database) -> None:
+    """Test queue depth statistics are tracked per pool."""
+    table = await create_table(temp_database)
+    await table.fetch("SELECT * FROM items")
+
+    stats = table.stats()
+    assert stats["writer"]["size"] == 1
+    assert stats["writer"]["queue_depth"] == 0
+    assert stats["reader"]["peak_queue_depth"] >= 1
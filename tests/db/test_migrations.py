@@ -0,0 +1,76 @@
+"""Tests for the schema migrations."""
+
+import sqlite3
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+from lakewatch.db.migrations import MIGRATIONS, Migration, migrate, schema_version
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Open an autocommit connection."""
+    return sqlite3.connect(path, isolation_level=None)
+
+
+def test_migrate_fresh_database(temp_db_path: Path) -> None:
+    """Test a fresh database gets the full schema and WAL enabled."""
+    conn = connect(temp_db_path)
+
+    version = migrate(conn)
+
+    assert version == MIGRATIONS[-1].version
+    assert schema_version(conn) == version
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    tables = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    assert {"node_data", "node_metadata"} <= tables
+    conn.close()
+
+
+def test_migrate_is_idempotent(temp_db_path: Path) -> None:
+    """Test running migrations again is a no-op."""
+    conn = connect(temp_db_path)
+    version = migrate(conn)
+
+    assert migrate(conn) == version
+    conn.close()
+
+
+def test_migrate_adopts_legacy_database(temp_db_path: Path) -> None:
+    """Test a database created before migrations keeps its data."""
+    conn = connect(temp_db_path)
+    conn.execute(
+        "CREATE TABLE node_data (node_id TEXT, timestamp INTEGER, temperature REAL,"
+        " ph REAL, dissolved_oxygen REAL, PRIMARY KEY (node_id, timestamp))",
+    )
+    conn.execute("INSERT INTO node_data VALUES ('node1', 1, 25.0, 7.0, 8.0)")
+
+    migrate(conn)
+
+    assert conn.execute("SELECT COUNT(*) FROM node_data").fetchone()[0] == 1
+    conn.close()
+
+
+def test_failed_migration_is_rolled_back(temp_db_path: Path) -> None:
+    """Test a failing migration leaves the previous version in place."""
+    conn = connect(temp_db_path)
+    version = migrate(conn)
+    broken = Migration(
+        version + 1,
+        "broken",
+        ["CREATE TABLE broken (id INTEGER)", "THIS IS NOT SQL"],
+    )
+
+    with patch("lakewatch.db.migrations.MIGRATIONS", [*MIGRATIONS, broken]):
+        with pytest.raises(sqlite3.OperationalError):
+            migrate(conn)
+
+    assert schema_version(conn) == version
+    assert conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'broken'",
+    ).fetchone() == (0,)
+    conn.close()
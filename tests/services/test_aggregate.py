@@ -0,0 +1,73 @@
+"""Tests for the aggregation and downsampling service."""
+
+import sqlite3
+import numpy as np
+import pytest
+
+from lakewatch.db import Database
+from lakewatch.services.aggregate import aggregate_readings, lttb, rollup_source
+from lakewatch.services.readings import BucketSize
+from lakewatch.services.rollup import rebuild_rollups
+
+
+@pytest.mark.asyncio
+async def test_aggregate_readings(temp_database: Database) -> None:
+    """Test readings are grouped into epoch-aligned buckets."""
+    conn = sqlite3.connect(temp_database.path)
+    conn.executemany(
+        "INSERT INTO node_data VALUES (?, ?, ?, ?, ?)",
+        [
+            ("node1", 0, 20.0, 7.0, 8.0),
+            ("node1", 30, 22.0, 7.2, 7.0),
+            ("node1", 300, 25.0, 6.8, 6.0),
+            ("node2", 30, 99.0, 9.0, 1.0),
+        ],
+    )
+    conn.commit()
+    conn.isolation_level = None
+    rebuild_rollups(conn)
+    conn.close()
+
+    buckets = await aggregate_readings("node1", BucketSize.FIVE_MINUTES, 0, 600)
+
+    assert [bucket["bucket"] for bucket in buckets] == [0, 300]
+    assert buckets[0]["count"] == 2
+    assert buckets[0]["temperature"] == {"min": 20.0, "max": 22.0, "mean": 21.0}
+    assert buckets[1]["dissolved_oxygen"] == {"min": 6.0, "max": 6.0, "mean": 6.0}
+
+
+def test_lttb_keeps_endpoints_and_order() -> None:
+    """Test LTTB returns the requested number of ascending indices."""
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+
+    selected = lttb(x, y, 50)
+
+    assert len(selected) == 50
+    assert selected[0] == 0
+    assert selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_spikes() -> None:
+    """Test a single spike survives downsampling."""
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[517] = 100.0
+
+    assert 517 in lttb(x, y, 20)
+
+
+def test_lttb_short_series_is_untouched() -> None:
+    """Test series shorter than the threshold are returned whole."""
+    x = np.arange(10, dtype=np.float64)
+
+    assert list(lttb(x, x, 20)) == list(range(10))
+
+
+def test_rollup_source_picks_coarsest_table() -> None:
+    """Test every bucket size is served from the coarsest fitting rollup."""
+    assert rollup_source(BucketSize.MINUTE) == BucketSize.MINUTE
+    assert rollup_source(BucketSize.FIVE_MINUTES) == BucketSize.MINUTE
+    assert rollup_source(BucketSize.HOUR) == BucketSize.HOUR
+    assert rollup_source(BucketSize.DAY) == BucketSize.DAY
@@ -0,0 +1,133 @@
+from typing import List, Optional
+
+from lakewatch.services.alerts import (
+    AlertEngine,
+    AlertKind,
+    AlertState,
+    Transition,
+    describe,
+)
+
+
+def observe(
+    engine: AlertEngine,
+    value: float,
+    now: float,
+    threshold: float = 30.0,
+) -> Optional[Transition]:
+    """Feed a temperature reading of node1 to the engine."""
+    return engine.observe(
+        "node1",
+        "temperature",
+        AlertKind.THRESHOLD,
+        value,
+        breached=value > threshold,
+        cleared=value <= engine.clear_below(threshold),
+        now=now,
+    )
+
+
+def states(transitions: List[Optional[Transition]]) -> List[Optional[AlertState]]:
+    """Get the state of every transition."""
+    return [t.state if t is not None else None for t in transitions]
+
+
+def test_alert_lifecycle() -> None:
+    """Test an alert is only notified when it opens and resolves."""
+    engine = AlertEngine(cooldown=0, digest_interval=3600, clear_count=2)
+
+    transitions = [
+        observe(engine, value, now)
+        for now, value in enumerate([25.0, 31.0, 32.0, 33.0, 25.0, 25.0, 25.0])
+    ]
+
+    assert states(transitions) == [
+        None,
+        AlertState.OPEN,
+        None,
+        None,
+        None,
+        AlertState.RESOLVED,
+        None,
+    ]
+    assert engine.stats()["emitted"] == {"open": 1, "ongoing": 0, "resolved": 1}
+    assert engine.stats()["suppressed"] == 2
+
+
+def test_hysteresis() -> None:
+    """Test values just below the threshold do not resolve the alert."""
+    engine = AlertEngine(cooldown=0, clear_count=1, hysteresis=0.1)
+
+    assert observe(engine, 31.0, 0) is not None
+    assert observe(engine, 29.0, 1) is None
+    assert engine.state("node1", "temperature", AlertKind.THRESHOLD) is (
+        AlertState.OPEN
+    )
+    assert observe(engine, 26.0, 2) is not None
+    assert engine.state("node1", "temperature", AlertKind.THRESHOLD) is (
+        AlertState.RESOLVED
+    )
+
+
+def test_cooldown() -> None:
+    """Test an alert reopening within the cooldown is tracked silently."""
+    engine = AlertEngine(cooldown=600, clear_count=1)
+
+    assert states(
+        [observe(engine, value, now) for now, value in [(0, 31), (10, 20)]],
+    ) == [AlertState.OPEN, AlertState.RESOLVED]
+    # Neither the flap nor its resolution is notified
+    assert states(
+        [observe(engine, value, now) for now, value in [(20, 31), (30, 20)]],
+    ) == [None, None]
+    assert observe(engine, 31.0, 700) is not None
+
+
+def test_cooldown_notifies_alert_still_open_afterwards() -> None:
+    """Test an alert reopened during the cooldown is notified once it ends."""
+    engine = AlertEngine(cooldown=600, digest_interval=60, clear_count=1)
+
+    transitions = [
+        observe(engine, value, now)
+        for now, value in [(0, 31), (10, 20)] + [(t, 31) for t in range(60, 7201, 60)]
+    ]
+
+    notified = [t for t in transitions if t is not None]
+    assert [t.state for t in notified[:3]] == [
+        AlertState.OPEN,
+        AlertState.RESOLVED,
+        AlertState.OPEN,
+    ]
+    assert notified[2].at == 600
+    assert notified[2].since == 60
+    assert {t.state for t in notified[3:]} == {AlertState.ONGOING}
+    assert len(notified) == 3 + (7200 - 600) // 60
+
+
+def test_digest() -> None:
+    """Test ongoing alerts are summarised periodically."""
+    engine = AlertEngine(digest_interval=60)
+
+    observe(engine, 31.0, 0)
+    assert observe(engine, 31.0, 30) is None
+    digest = observe(engine, 32.0, 130)
+
+    assert digest is not None
+    assert digest.state is AlertState.ONGOING
+    assert digest.readings == 3
+    assert describe(digest, "Temperature threshold exceeded", "Temperature") == (
+        "Temperature threshold exceeded: 32.0 (ongoing for 2 min, 3 readings)"
+    )
+    assert observe(engine, 32.0, 140) is None
+
+
+def test_alerts_are_independent() -> None:
+    """Test nodes, metrics and kinds of alerts have separate state."""
+    engine = AlertEngine()
+
+    for node_id in ("node1", "node2"):
+        for kind in (AlertKind.THRESHOLD, AlertKind.OUTLIER):
+            assert (
+                engine.observe(node_id, "ph", kind, 9.0, True, False, now=0) is not None
+            )
+    assert engine.stats()["active"] == 4
@@ -0,0 +1,127 @@
+import asyncio
+from typing import List
+from unittest.mock import AsyncMock
+
+import pytest
+
+from lakewatch.services.broadcast import Broadcaster
+from lakewatch.settings import SlowConsumerPolicy
+
+
+async def flush() -> None:
+    """Let the writer tasks run."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+class BlockedWebSocket:
+    """WebSocket whose sends never complete until released."""
+
+    def __init__(self) -> None:
+        self.sent: List[str] = []
+        self.release = asyncio.Event()
+        self.close = AsyncMock()
+
+    async def send_text(self, message: str) -> None:
+        await self.release.wait()
+        self.sent.append(message)
+
+
+@pytest.mark.asyncio
+async def test_publish_does_not_wait_for_slow_clients() -> None:
+    """Test a blocked client does not delay the others."""
+    broadcaster = Broadcaster(queue_size=10)
+    slow = BlockedWebSocket()
+    fast = AsyncMock()
+    broadcaster.connect(slow)  # type: ignore[arg-type]
+    broadcaster.connect(fast)
+
+    assert broadcaster.publish("alert") == 2
+    await flush()
+
+    fast.send_text.assert_called_once_with("alert")
+    assert slow.sent == []
+
+    slow.release.set()
+    await flush()
+    assert slow.sent == ["alert"]
+    await broadcaster.close()
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy() -> None:
+    """Test a full queue drops its oldest messages and keeps the client."""
+    broadcaster = Broadcaster(queue_size=2, policy=SlowConsumerPolicy.DROP_OLDEST)
+    slow = BlockedWebSocket()
+    client = broadcaster.connect(slow)  # type: ignore[arg-type]
+    await flush()
+
+    # "a" is taken by the writer straight away and stays in flight
+    for message in ("a", "b", "c", "d"):
+        broadcaster.publish(message)
+        await flush()
+
+    stats = broadcaster.stats()
+    assert stats["dropped"] == 1
+    assert stats["clients"][0]["queued"] == 2
+    assert stats["clients"][0]["dropped"] == 1
+    assert client.dropped == 1
+
+    slow.release.set()
+    await flush()
+    assert slow.sent == ["a", "c", "d"]
+    assert broadcaster.stats()["clients"][0]["sent"] == 3
+    assert broadcaster.delivery_lag.count == 3
+    await broadcaster.close()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy() -> None:
+    """Test a client whose queue is full is disconnected."""
+    broadcaster = Broadcaster(queue_size=1, policy=SlowConsumerPolicy.DISCONNECT)
+    slow = BlockedWebSocket()
+    broadcaster.connect(slow)  # type: ignore[arg-type]
+    await flush()
+
+    broadcaster.publish("a")
+    await flush()
+    broadcaster.publish("b")
+    assert broadcaster.publish("c") == 0
+    await flush()
+
+    assert len(broadcaster) == 0
+    assert broadcaster.stats()["disconnected"] == 1
+    slow.close.assert_awaited_once_with(code=1013)
+    await broadcaster.close()
+
+
+@pytest.mark.asyncio
+async def test_close_disconnects_every_client() -> None:
+    """Test closing the broadcaster closes every connection."""
+    broadcaster = Broadcaster()
+    websocket = AsyncMock()
+    broadcaster.connect(websocket)
+
+    await broadcaster.close()
+
+    assert len(broadcaster) == 0
+    websocket.close.assert_awaited_once_with(code=1001)
+
+
+@pytest.mark.asyncio
+async def test_close_sends_queued_messages_first() -> None:
+    """Test closing waits for queued messages until the timeout."""
+    broadcaster = Broadcaster(queue_size=10)
+    fast = AsyncMock()
+    slow = BlockedWebSocket()
+    broadcaster.connect(fast)
+    broadcaster.connect(slow)  # type: ignore[arg-type]
+    broadcaster.publish("a")
+    broadcaster.publish("b")
+
+    await broadcaster.close(timeout=0.05)
+
+    assert [call.args[0] for call in fast.send_text.call_args_list] == ["a", "b"]
+    fast.close.assert_awaited_once_with(code=1001)
+    assert slow.sent == []
+    slow.close.assert_awaited_once_with(code=1001)
@@ -0,0 +1,268 @@
+"""Tests for the batch evaluation of thresholds and outliers."""
+
+import random
+import sqlite3
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from typing import Any, Dict, Generator, List
+
+import numpy as np
+
+from lakewatch.db import Database, database
+from lakewatch.services.alerts import AlertKind, AlertState, alert_engine
+from lakewatch.services.evaluate import (
+    ReadingBatch,
+    alert_records,
+    evaluate,
+    evaluate_batch,
+    rolling_outliers,
+)
+from lakewatch.services.profiles import (
+    Bounds,
+    NodeGroup,
+    ThresholdProfiles,
+    threshold_store,
+)
+from lakewatch.services.outlier import (
+    OutlierDetector,
+    is_outlier,
+    outlier_detector,
+    process_outliers,
+)
+from lakewatch.services.threshold import threshold_check
+
+
+@pytest.fixture(autouse=True)
+def reset_detector() -> Generator[None, None, None]:
+    """Start every test with no node windows in memory."""
+    outlier_detector.clear()
+    yield
+    outlier_detector.clear()
+
+
+def make_readings(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Build readings of a few nodes that now and then breach or jump."""
+    rng = random.Random(seed)
+    readings = []
+    for timestamp in range(count):
+        reading: Dict[str, Any] = {
+            "node_id": f"node{rng.randrange(4)}",
+            "timestamp": 1620000000 + timestamp,
+            "latitude": 12.345,
+            "longitude": 67.890,
+            "temperature": rng.choice((25.0, 25.5, 26.0, 31.0, 40.0)),
+            "ph": rng.choice((6.5, 6.8, 7.2)),
+            "dissolved_oxygen": rng.choice((4.0, 4.5, 6.0)),
+            "humidity": rng.choice((60.0, 75.0)),
+        }
+        if rng.random() < 0.8:
+            reading["maintenance_required"] = int(rng.random() < 0.2)
+        elif rng.random() < 0.5:
+            reading["maintenance_required"] = None
+        if rng.random() < 0.1:
+            del reading["ph"]
+        readings.append(reading)
+    return readings
+
+
+def test_rolling_outliers_matches_per_value_check() -> None:
+    """Test each value is checked against the values before it, history first."""
+    rng = random.Random(2)
+    histories: List[List[float]] = [[25.0, 25.2, 24.9], [], [1.0, 2.0, 3.0, 4.0, 5.0]]
+    node_index = np.array([rng.randrange(3) for _ in range(50)], dtype=np.int64)
+    values = np.array([rng.uniform(0, 30) for _ in range(50)])
+
+    outliers = rolling_outliers(values, node_index, histories, 5, 1.7, 3)
+
+    windows = [list(history) for history in histories]
+    expected = []
+    for node, value in zip(node_index.tolist(), values.tolist()):
+        window = windows[node][-5:]
+        expected.append(len(window) >= 3 and is_outlier(value, window, 1.7))
+        windows[node].append(value)
+    assert outliers.tolist() == expected
+
+
+@pytest.mark.asyncio
+async def test_evaluate_extends_node_windows() -> None:
+    """Test the detector windows hold the batch afterwards."""
+    readings = [
+        {"node_id": "node1", "timestamp": ts, "temperature": float(ts)}
+        for ts in range(1, 8)
+    ]
+    with patch.object(database, "fetch", return_value=[]) as mock_fetch:
+        await evaluate(ReadingBatch.from_readings(readings))
+        window = await outlier_detector.node_window("node1", None)
+
+    mock_fetch.assert_called_once()
+    assert list(window.values["temperature"]) == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert list(window.values["ph"]) == []
+
+
+@pytest.mark.asyncio
+async def test_evaluate_seeds_new_nodes_with_one_query(
+    temp_database: Database,
+) -> None:
+    """Test every new node is seeded by one query, from its own readings."""
+    conn = sqlite3.connect(temp_database._path)
+    conn.executemany(
+        "INSERT INTO node_data (node_id, timestamp, temperature) VALUES (?, ?, ?)",
+        [("node1", ts, 10.0 + ts) for ts in range(1, 6)]
+        + [("node2", ts, 20.0 + ts) for ts in range(1, 4)],
+    )
+    conn.commit()
+    conn.close()
+    detector = OutlierDetector(window=2)
+    readings = [
+        {"node_id": "node1", "timestamp": 4, "temperature": 14.0},
+        {"node_id": "node2", "timestamp": 9, "temperature": 29.0},
+        {"node_id": "node3", "timestamp": 9, "temperature": 39.0},
+        {"node_id": "node1", "timestamp": 5, "temperature": 15.0},
+    ]
+
+    with patch.object(database, "fetch", wraps=database.fetch) as fetch:
+        await evaluate(ReadingBatch.from_readings(readings), detector=detector)
+
+    fetch.assert_called_once()
+    windows = await detector.node_windows([("node1", None), ("node2", None)])
+    assert [list(window.values["temperature"]) for window in windows] == [
+        [14.0, 15.0],
+        [23.0, 29.0],
+    ]
+    window = await detector.node_window("node3", None)
+    assert list(window.values["temperature"]) == [39.0]
+
+
+@pytest.mark.asyncio
+async def test_alert_records_skip_quiet_nodes() -> None:
+    """Test nodes without breaches or open alerts produce no records."""
+    readings = [
+        {"node_id": "node1", "timestamp": 1, "temperature": 25.0, "ph": 6.5},
+        {"node_id": "node2", "timestamp": 1, "temperature": 35.0, "ph": 6.5},
+    ]
+    with patch.object(database, "fetch", return_value=[]):
+        batch = ReadingBatch.from_readings(readings)
+        records = alert_records(batch, await evaluate(batch))
+
+    assert {record.node_id for record in records} == {"node2"}
+    breached = [record for record in records if record.breached]
+    assert [(r.metric, r.kind, r.threshold) for r in breached] == [
+        ("temperature", AlertKind.THRESHOLD, 30.0),
+    ]
+
+
+@pytest.mark.parametrize(
+    "profiles",
+    [
+        ThresholdProfiles(),
+        ThresholdProfiles(
+            default={"dissolved_oxygen": Bounds(min=4.2)},
+            groups={
+                "north": NodeGroup(
+                    nodes=frozenset({"node1", "node2"}),
+                    thresholds={"ph": Bounds(min=6.6, max=7.1)},
+                ),
+            },
+            nodes={"node2": {"temperature": Bounds()}, "node3": {"humidity": Bounds()}},
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_evaluate_batch_matches_per_message_path(
+    profiles: ThresholdProfiles,
+    no_alert_history: MagicMock,
+) -> None:
+    """Test a batch raises the same alerts as checking every reading."""
+    threshold_store.load(profiles)
+    readings = make_readings(400)
+
+    with patch.object(database, "fetch", return_value=[]), patch(
+        "lakewatch.services.threshold.send_threshold_alert",
+        new_callable=AsyncMock,
+    ) as threshold_alert, patch(
+        "lakewatch.services.outlier.send_threshold_alert",
+        new_callable=AsyncMock,
+    ) as outlier_alert:
+        for reading in readings:
+            await threshold_check(reading)
+            await process_outliers(reading)
+        expected = [call.kwargs for call in threshold_alert.call_args_list]
+        expected += [call.kwargs for call in outlier_alert.call_args_list]
+        expected_events = [call.args[0] for call in no_alert_history.call_args_list]
+
+        alert_engine.clear()
+        outlier_detector.clear()
+        threshold_alert.reset_mock()
+        no_alert_history.reset_mock()
+        transitions = await evaluate_batch(readings)
+        actual = [call.kwargs for call in threshold_alert.call_args_list]
+
+    assert len(transitions) == len(actual)
+    assert any(t.state is AlertState.RESOLVED for t in transitions)
+    assert {t.kind for t in transitions} == set(AlertKind)
+    key = lambda alert: sorted(alert.items())  # noqa: E731
+    assert sorted(actual, key=key) == sorted(expected, key=key)
+    events = [call.args[0] for call in no_alert_history.call_args_list]
+    assert sorted(events, key=repr) == sorted(expected_events, key=repr)
+
+
+@pytest.mark.asyncio
+async def test_null_maintenance_flag_is_not_reported(
+    no_alert_history: MagicMock,
+) -> None:
+    """Test both paths leave the maintenance alert open on a null flag."""
+    readings = [
+        {"node_id": "node1", "timestamp": 1, "maintenance_required": 1},
+        {"node_id": "node1", "timestamp": 2, "maintenance_required": None},
+    ]
+
+    with patch.object(database, "fetch", return_value=[]), patch(
+        "lakewatch.services.threshold.send_threshold_alert",
+        new_callable=AsyncMock,
+    ):
+        for reading in readings:
+            await threshold_check(reading)
+        per_message = alert_engine.state(
+            "node1", "maintenance_required", AlertKind.MAINTENANCE
+        )
+        alert_engine.clear()
+        await evaluate_batch(readings)
+        batch = alert_engine.state(
+            "node1", "maintenance_required", AlertKind.MAINTENANCE
+        )
+
+    assert per_message is batch is AlertState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_evaluate_batch_empty() -> None:
+    """Test an empty batch is a no-op."""
+    assert await evaluate_batch([]) == []
+
+
+@pytest.mark.asyncio
+async def test_evaluate_batch_alerts_on_late_breaches(
+    no_alert_history: MagicMock,
+) -> None:
+    """Test late breaches open alerts but late readings never resolve them."""
+    threshold_store.load(ThresholdProfiles(default={"ph": Bounds(max=8.0)}))
+    late = [
+        {"node_id": "node1", "timestamp": 1, "ph": 9.0, "maintenance_required": 1},
+        {"node_id": "node2", "timestamp": 1, "ph": 7.0},
+    ]
+
+    with patch.object(database, "fetch", return_value=[]) as fetch, patch(
+        "lakewatch.services.threshold.send_threshold_alert",
+        new_callable=AsyncMock,
+    ):
+        transitions = await evaluate_batch([], late)
+        transitions += await evaluate_batch([], [{**late[0], "ph": 7.0}] * 5)
+
+    fetch.assert_not_called()
+    assert [(t.node_id, t.metric, t.state) for t in transitions] == [
+        ("node1", "ph", AlertState.OPEN),
+        ("node1", "maintenance_required", AlertState.OPEN),
+    ]
+    assert alert_engine.state("node1", "ph", AlertKind.THRESHOLD) is AlertState.OPEN
+    assert len(no_alert_history.call_args_list) == 2
+    assert len(outlier_detector) == 0
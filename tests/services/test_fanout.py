@@ -0,0 +1,95 @@
+from typing import Any, Callable, List
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from lakewatch.services.fanout import Fanout
+
+
+class FakeBroker:
+    """Fanout exchange delivering every message to every bound worker."""
+
+    def __init__(self) -> None:
+        self.consumers: List[Callable[[Any], Any]] = []
+        self.exchange = MagicMock()
+        self.exchange.publish = AsyncMock(side_effect=self._deliver)
+
+    async def _deliver(self, message: Any, routing_key: str) -> None:
+        for consumer in self.consumers:
+            await consumer(message)
+
+    def channel(self) -> MagicMock:
+        queue = MagicMock()
+        queue.bind = AsyncMock()
+        queue.cancel = AsyncMock()
+
+        async def consume(callback: Callable[[Any], Any], no_ack: bool) -> str:
+            self.consumers.append(callback)
+            return f"ctag{len(self.consumers)}"
+
+        queue.consume = consume
+        channel = MagicMock()
+        channel.declare_exchange = AsyncMock(return_value=self.exchange)
+        channel.declare_queue = AsyncMock(return_value=queue)
+        return channel
+
+
+@pytest.mark.asyncio
+async def test_publish_in_process() -> None:
+    """Test events are dispatched locally without a broker."""
+    bus = Fanout("test")
+    received: List[Any] = []
+    bus.subscribe("alert", received.append)
+    bus.subscribe("other", lambda data: pytest.fail("wrong kind"))
+
+    await bus.publish("alert", "High temperature")
+
+    assert received == ["High temperature"]
+    assert bus.stats()["distributed"] is False
+    assert bus.stats()["published"] == 1
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_are_isolated() -> None:
+    """Test a failing handler does not stop the others."""
+    bus = Fanout("test")
+    received: List[Any] = []
+    bus.subscribe("alert", lambda data: 1 / 0)
+    bus.subscribe("alert", received.append)
+
+    await bus.publish("alert", "message")
+
+    assert received == ["message"]
+    assert bus.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_every_worker_receives_each_event_once() -> None:
+    """Test an event raised on one worker reaches every worker exactly once."""
+    broker = FakeBroker()
+    workers = [Fanout("test") for _ in range(3)]
+    received: List[List[Any]] = [[] for _ in workers]
+    for bus, events in zip(workers, received):
+        bus.subscribe("alert", events.append)
+        await bus.start(broker.channel())
+
+    await workers[0].publish("alert", "Outlier detected in pH: 9.5")
+
+    assert received == [["Outlier detected in pH: 9.5"]] * 3
+    broker.exchange.publish.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stop_falls_back_to_in_process() -> None:
+    """Test events are dispatched locally again after unbinding."""
+    broker = FakeBroker()
+    bus = Fanout("test")
+    received: List[Any] = []
+    bus.subscribe("alert", received.append)
+    await bus.start(broker.channel())
+
+    await bus.stop()
+    await bus.publish("alert", "message")
+
+    assert received == ["message"]
+    broker.exchange.publish.assert_not_awaited()
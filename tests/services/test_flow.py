@@ -0,0 +1,141 @@
+"""Tests for the adaptive ingest flow control."""
+
+import asyncio
+from typing import List
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from lakewatch.services.flow import FlowController
+from lakewatch.services.metrics import Histogram
+
+
+def make_writer(pending: int = 0) -> MagicMock:
+    """Build an ingest writer that only reports latency and backlog."""
+    writer = MagicMock()
+    writer.flush_latency = Histogram("latency", "Commit latency.", (0.1,))
+    writer.pending = pending
+    writer.batch_size = 100
+    return writer
+
+
+def make_channel() -> MagicMock:
+    """Build a channel whose queue reports a depth of 42."""
+    channel = MagicMock()
+    channel.set_qos = AsyncMock()
+    queue = MagicMock()
+    queue.declare = AsyncMock(return_value=MagicMock(message_count=42))
+    return channel, queue
+
+
+@pytest.mark.asyncio
+async def test_slots_cap_messages_in_flight() -> None:
+    """Test messages wait for a slot once the limit is reached."""
+    flow = FlowController(minimum=2, maximum=2, writer=make_writer())
+    started: List[int] = []
+    done = asyncio.Event()
+
+    async def process(index: int) -> None:
+        async with flow.slot():
+            started.append(index)
+            await done.wait()
+
+    tasks = [asyncio.create_task(process(index)) for index in range(3)]
+    await asyncio.sleep(0)
+    assert started == [0, 1]
+    assert flow.status()["waiting"] == 1
+
+    done.set()
+    await asyncio.gather(*tasks)
+    assert started == [0, 1, 2]
+    assert flow.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place() -> None:
+    """Test a message cancelled while waiting does not hold a slot."""
+    flow = FlowController(minimum=1, maximum=1, writer=make_writer())
+    await flow.acquire()
+    waiter = asyncio.create_task(flow.acquire())
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    flow.release()
+
+    assert flow.in_flight == 0
+    await asyncio.wait_for(flow.acquire(), 1)
+
+
+@pytest.mark.asyncio
+async def test_tick_grows_limit_while_saturated_and_fast() -> None:
+    """Test the limit grows additively while commits are fast."""
+    writer = make_writer()
+    flow = FlowController(minimum=10, maximum=25, target=0.1, writer=writer)
+    flow.limit = 10
+    channel, queue = make_channel()
+    with patch.object(flow, "_run", AsyncMock()):
+        await flow.start(channel, queue)
+    for _ in range(10):
+        await flow.acquire()
+    writer.flush_latency.observe(0.01)
+
+    assert await flow.tick() == 20
+    for _ in range(10):
+        flow.release()
+    # Nothing is in flight anymore, so the limit stays
+    assert await flow.tick() == 20
+    channel.set_qos.assert_awaited_with(prefetch_count=20, global_=True)
+    assert flow.status()["queue_depth"] == 42
+    assert flow.status()["commit_latency_ms"] is None
+    await flow.stop()
+
+
+@pytest.mark.parametrize(
+    "latency, pending",
+    [(0.5, 0), (0.01, 101)],
+)
+@pytest.mark.asyncio
+async def test_tick_halves_limit_when_writer_falls_behind(
+    latency: float,
+    pending: int,
+) -> None:
+    """Test slow commits or a writer backlog halve the limit."""
+    writer = make_writer(pending)
+    flow = FlowController(minimum=10, maximum=1000, target=0.1, writer=writer)
+    flow.limit = 100
+    for _ in range(100):
+        await flow.acquire()
+    writer.flush_latency.observe(latency)
+
+    assert await flow.tick() == 50
+    assert flow.status()["decreases"] == 1
+    flow.limit = 15
+    assert await flow.tick() == 10
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_messages_in_flight() -> None:
+    """Test draining returns once every slot is released or the time is up."""
+    flow = FlowController(minimum=1, maximum=1, writer=make_writer())
+    await flow.acquire()
+    waiting = asyncio.create_task(flow.acquire())
+    await asyncio.sleep(0)
+
+    assert await flow.drain(0.01) == 2
+    asyncio.get_running_loop().call_later(0.01, flow.release)
+    asyncio.get_running_loop().call_later(0.02, flow.release)
+    assert await flow.drain(1) == 0
+    await waiting
+
+
+def test_workers_drop_stale_statuses() -> None:
+    """Test only workers that reported recently are listed."""
+    flow = FlowController(interval=1.0, writer=make_writer())
+    flow.apply({"worker": "b", "prefetch": 10})
+    flow.apply({"worker": "a", "prefetch": 20})
+    assert [status["worker"] for status in flow.workers()] == ["a", "b"]
+
+    with patch("lakewatch.services.reports.time.monotonic", return_value=1e12):
+        assert flow.workers() == []
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Dict, Generator
+from unittest.mock import AsyncMock
+
+import pytest
+import ujson
+
+from lakewatch.services.live import LiveFeed, diff
+from lakewatch.services.node_cache import node_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_node_cache() -> Generator[None, None, None]:
+    """Start every test without known nodes."""
+    node_cache.clear()
+    yield
+    node_cache.clear()
+
+
+def reading(**fields: Any) -> Dict[str, Any]:
+    """Build a committed sensor reading."""
+    return {
+        "node_id": "node1",
+        "timestamp": 1620000000,
+        "latitude": 12.95,
+        "longitude": 77.65,
+        "temperature": 25.0,
+        "ph": 7.0,
+        "dissolved_oxygen": 8.0,
+        "maintenance_required": 0,
+        **fields,
+    }
+
+
+async def flush() -> None:
+    """Let the writer tasks run."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def sent(websocket: AsyncMock) -> Any:
+    """Decode every message sent to a websocket."""
+    return [ujson.loads(call.args[0]) for call in websocket.send_text.call_args_list]
+
+
+def test_diff() -> None:
+    """Test only changed fields end up in a delta."""
+    previous = {"timestamp": 1, "ph": 7.0, "temperature": 25.0}
+
+    assert diff(None, previous) == previous
+    assert diff(previous, {"timestamp": 2, "ph": 7.0, "temperature": 25.5}) == {
+        "timestamp": 2,
+        "temperature": 25.5,
+    }
+
+
+@pytest.mark.asyncio
+async def test_snapshot_then_deltas() -> None:
+    """Test a client gets every node first and then only the changes."""
+    node_cache.update(reading())
+    feed = LiveFeed(tick=60)
+    websocket = AsyncMock()
+    feed.connect(websocket)
+
+    feed.apply([reading(timestamp=1620000060, temperature=26.0)])
+    feed.flush()
+    await flush()
+
+    snapshot, delta = sent(websocket)
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["nodes"]["node1"]["temperature"] == 25.0
+    assert delta == {
+        "type": "delta",
+        "nodes": {"node1": {"timestamp": 1620000060, "temperature": 26.0}},
+    }
+    await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_updates_are_coalesced_per_tick() -> None:
+    """Test only the latest reading of a node within a tick is sent."""
+    feed = LiveFeed(tick=60)
+    websocket = AsyncMock()
+    feed.connect(websocket)
+
+    feed.apply([reading(ph=7.1), reading(node_id="node2")])
+    feed.apply([reading(timestamp=1620000060, ph=7.2)])
+    feed.apply([reading(timestamp=1619999940, ph=6.0)])
+    assert feed.flush() == 2
+    # Nothing changed since the last tick
+    assert feed.flush() == 0
+    await flush()
+
+    _, delta = sent(websocket)
+    assert delta["nodes"]["node1"]["ph"] == 7.2
+    assert set(delta["nodes"]) == {"node1", "node2"}
+    assert feed.stats()["node_updates"] == 2
+    await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_tick_task_sends_updates() -> None:
+    """Test pending updates are flushed periodically."""
+    feed = LiveFeed(tick=0.01)
+    websocket = AsyncMock()
+    feed.connect(websocket)
+    feed.start()
+
+    feed.apply([reading()])
+    await asyncio.sleep(0.05)
+
+    assert [message["type"] for message in sent(websocket)] == ["snapshot", "delta"]
+    await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_sends_last_changes() -> None:
+    """Test changes of the last tick reach the clients before they are closed."""
+    feed = LiveFeed(tick=60)
+    websocket = AsyncMock()
+    feed.connect(websocket)
+    feed.start()
+
+    feed.apply([reading()])
+    await feed.stop(timeout=1)
+
+    assert [message["type"] for message in sent(websocket)] == ["snapshot", "delta"]
+    websocket.close.assert_awaited_once_with(code=1001)
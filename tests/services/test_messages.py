@@ -0,0 +1,328 @@
+"""Tests for decoding and dead-lettering sensor messages."""
+
+import json
+import sqlite3
+from typing import Any, Dict, Optional
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import cbor2
+import msgpack
+import pytest
+from aio_pika.message import ProcessContext
+from pydantic import ValidationError
+
+from lakewatch.services.messages import (
+    ATTEMPTS_HEADER,
+    REASON_HEADER,
+    DeadLetters,
+    dead_letters,
+    decode_message,
+    decode_reading,
+    describe_error,
+)
+from lakewatch.services import rabbitmq
+from lakewatch.services.rabbitmq import process_message
+from lakewatch.services.writer import ingest_writer
+
+READING: Dict[str, Any] = {
+    "node_id": "node1",
+    "timestamp": 1620000000,
+    "latitude": 12.345,
+    "longitude": 67.890,
+    "temperature": 25.0,
+    "ph": 7.0,
+    "dissolved_oxygen": 8.0,
+    "maintenance_required": 0,
+}
+
+
+def make_message(body: bytes, content_type: Optional[str] = None) -> MagicMock:
+    """Build an incoming message whose processing context does nothing."""
+    message = MagicMock()
+    message.body = body
+    message.headers = {"gateway": "gw1"}
+    message.content_type = content_type
+    message.content_encoding = None
+    message.message_id = "m1"
+    message.timestamp = None
+    message.processed = False
+    message.channel.is_closed = False
+    message.ack = AsyncMock()
+    message.reject = AsyncMock()
+    message.process.side_effect = lambda requeue=False: ProcessContext(
+        message,
+        requeue=requeue,
+        reject_on_redelivered=False,
+        ignore_processed=False,
+    )
+    return message
+
+
+def test_decode_reading_converts_and_drops_unknown_keys() -> None:
+    """Test a valid message is converted in one pass."""
+    body = json.dumps({**READING, "temperature": "25.5", "firmware": "1.2"})
+
+    data = decode_reading(body.encode())
+
+    assert data["temperature"] == 25.5
+    assert "firmware" not in data
+    assert "humidity" not in data
+
+
+@pytest.mark.parametrize(
+    "body, reason",
+    [
+        (b"{not json", "body: Invalid JSON"),
+        (json.dumps({**READING, "node_id": ""}).encode(), "node_id: String should"),
+        (json.dumps({k: v for k, v in READING.items() if k != "ph"}).encode(), "ph"),
+        (json.dumps({**READING, "latitude": 123.0}).encode(), "latitude: Input"),
+        (json.dumps({**READING, "maintenance_required": 2}).encode(), "maintenance"),
+        (json.dumps({**READING, "timestamp": 2**64}).encode(), "timestamp: Input"),
+    ],
+)
+def test_decode_reading_rejects_invalid_messages(body: bytes, reason: str) -> None:
+    """Test invalid messages fail with a readable reason."""
+    with pytest.raises(ValidationError) as error:
+        decode_reading(body)
+
+    assert describe_error(error.value).startswith(reason)
+
+
+@pytest.mark.parametrize(
+    "content_type, encode",
+    [
+        (None, lambda data: json.dumps(data).encode()),
+        ("application/json; charset=utf-8", lambda data: json.dumps(data).encode()),
+        ("application/msgpack", msgpack.packb),
+        ("application/x-msgpack", msgpack.packb),
+        ("application/cbor", cbor2.dumps),
+    ],
+)
+def test_decode_message_single_reading(
+    content_type: Optional[str], encode: Any
+) -> None:
+    """Test a reading decodes the same in every format."""
+    assert decode_message(encode(READING), content_type) == [READING]
+
+
+@pytest.mark.parametrize(
+    "content_type, encode",
+    [("application/msgpack", msgpack.packb), ("application/cbor", cbor2.dumps)],
+)
+def test_decode_message_envelope(content_type: str, encode: Any) -> None:
+    """Test a gateway envelope decodes into one reading per row."""
+    fields = list(READING)
+    envelope = {
+        "gateway": "gw1",
+        "fields": fields,
+        "readings": [
+            [READING[field] for field in fields],
+            [{**READING, "node_id": "node2"}[field] for field in fields],
+        ],
+    }
+
+    readings = decode_message(encode(envelope), content_type)
+
+    assert readings == [READING, {**READING, "node_id": "node2"}]
+
+
+@pytest.mark.parametrize(
+    "body, content_type, reason",
+    [
+        (msgpack.packb(READING), "text/plain", "content_type: unsupported text/plain"),
+        (b"\xc1", "application/msgpack", "body: invalid application/msgpack"),
+        (b"\xa1", "application/cbor", "body: invalid application/cbor"),
+        (
+            msgpack.packb({"fields": ["node_id"], "readings": [["node1"]]}),
+            "application/msgpack",
+            "0.timestamp: Field required",
+        ),
+        (
+            msgpack.packb({"fields": list(READING), "readings": "node1"}),
+            "application/msgpack",
+            "readings: Input should be a valid list",
+        ),
+        (
+            msgpack.packb(
+                {
+                    "fields": list(READING),
+                    "readings": [list(READING.values()), ["node2", 1620000000]],
+                },
+            ),
+            "application/msgpack",
+            "readings.1: 2 values for 8 fields",
+        ),
+    ],
+)
+def test_decode_message_rejects_invalid_messages(
+    body: bytes,
+    content_type: str,
+    reason: str,
+) -> None:
+    """Test undecodable messages and invalid envelopes fail with a reason."""
+    with pytest.raises(ValueError) as error:
+        decode_message(body, content_type)
+
+    assert describe_error(error.value).startswith(reason)
+
+
+@pytest.mark.asyncio
+async def test_dead_letters_keep_body_and_add_reason() -> None:
+    """Test rejected messages are republished with the reason attached."""
+    letters = DeadLetters("dead")
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock()
+    channel.default_exchange.publish = AsyncMock()
+    await letters.start(channel)
+
+    await letters.publish(make_message(b"{}"), "node_id: Field required")
+
+    channel.declare_queue.assert_awaited_once_with("dead", durable=True)
+    published = channel.default_exchange.publish.call_args
+    assert published.kwargs["routing_key"] == "dead"
+    assert published.args[0].body == b"{}"
+    assert published.args[0].headers == {
+        "gateway": "gw1",
+        REASON_HEADER: "node_id: Field required",
+    }
+    assert letters.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_process_message_requeues_when_dead_lettering_fails() -> None:
+    """Test an invalid message is not acked when it could not be parked."""
+    letters = DeadLetters("dead")
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock()
+    channel.default_exchange.publish = AsyncMock(side_effect=ConnectionError())
+    await letters.start(channel)
+    message = make_message(b'{"node_id": "node1"}')
+
+    with patch.object(rabbitmq, "dead_letters", letters):
+        await process_message(message)
+
+    assert letters.stats()["failed"] == 1
+    message.ack.assert_not_awaited()
+    message.reject.assert_awaited_once_with(requeue=True)
+
+
+@pytest.mark.asyncio
+async def test_process_message_dead_letters_invalid_reading() -> None:
+    """Test an invalid message never reaches the ingest writer."""
+    with patch.object(ingest_writer, "submit") as submit, patch.object(
+        dead_letters,
+        "publish",
+        AsyncMock(),
+    ) as publish:
+        await process_message(make_message(b'{"node_id": "node1"}'))
+
+    submit.assert_not_called()
+    publish.assert_awaited_once()
+    assert publish.call_args.args[1].startswith("timestamp: Field required")
+
+
+@pytest.mark.asyncio
+async def test_process_message_submits_valid_reading() -> None:
+    """Test a valid message is written, then acked."""
+    message = make_message(json.dumps(READING).encode())
+    with patch.object(ingest_writer, "submit_many", AsyncMock()) as submit:
+        await process_message(message)
+
+    submit.assert_awaited_once_with([READING])
+    message.ack.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_message_submits_envelope() -> None:
+    """Test every reading of an envelope is written before the message is acked."""
+    envelope = {"fields": list(READING), "readings": [list(READING.values())] * 3}
+    message = make_message(msgpack.packb(envelope), "application/msgpack")
+    with patch.object(ingest_writer, "submit_many", AsyncMock()) as submit:
+        await process_message(message)
+
+    submit.assert_awaited_once_with([READING] * 3)
+
+
+@pytest.mark.asyncio
+async def test_process_message_counts_outcomes() -> None:
+    """Test every message is counted by outcome and its decoding timed."""
+    processed = rabbitmq.messages_processed.value
+    rejected = rabbitmq.messages_rejected.value
+    failed = rabbitmq.messages_failed.value
+    readings = rabbitmq.readings_processed.value
+    decoded = rabbitmq.decode_seconds.count
+    envelope = {"fields": list(READING), "readings": [list(READING.values())] * 3}
+
+    with patch.object(ingest_writer, "submit_many", AsyncMock()), patch.object(
+        dead_letters,
+        "publish",
+        AsyncMock(),
+    ):
+        await process_message(
+            make_message(msgpack.packb(envelope), "application/msgpack")
+        )
+        await process_message(make_message(b"{}"))
+    with patch.object(
+        ingest_writer,
+        "submit_many",
+        AsyncMock(side_effect=RuntimeError("disk full")),
+    ):
+        await process_message(make_message(json.dumps(READING).encode()))
+
+    assert rabbitmq.messages_processed.value == processed + 1
+    assert rabbitmq.messages_rejected.value == rejected + 1
+    assert rabbitmq.messages_failed.value == failed + 1
+    assert rabbitmq.readings_processed.value == readings + 3
+    assert rabbitmq.decode_seconds.count == decoded + 3
+
+
+@pytest.mark.asyncio
+async def test_process_message_requeues_uncommitted_readings() -> None:
+    """Test a message is not acked when its readings could not be committed."""
+    message = make_message(json.dumps(READING).encode())
+    with patch.object(
+        ingest_writer,
+        "submit_many",
+        AsyncMock(side_effect=sqlite3.OperationalError("database is locked")),
+    ):
+        await process_message(message)
+
+    message.ack.assert_not_awaited()
+    message.reject.assert_awaited_once_with(requeue=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "failed, routing_key, headers",
+    [
+        (None, "node_data", {ATTEMPTS_HEADER: 1}),
+        (3, "node_data", {ATTEMPTS_HEADER: 4}),
+        (4, "dead", {ATTEMPTS_HEADER: 4, REASON_HEADER: "failed 5 times: disk full"}),
+    ],
+)
+async def test_process_message_retries_failed_messages(
+    failed: Optional[int],
+    routing_key: str,
+    headers: Dict[str, Any],
+) -> None:
+    """Test failed messages go to the back of the queue, then are parked."""
+    letters = DeadLetters("dead", max_attempts=5)
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock()
+    channel.default_exchange.publish = AsyncMock()
+    await letters.start(channel)
+    message = make_message(json.dumps(READING).encode())
+    message.headers = {} if failed is None else {ATTEMPTS_HEADER: failed}
+
+    with patch.object(rabbitmq, "dead_letters", letters), patch.object(
+        ingest_writer,
+        "submit_many",
+        AsyncMock(side_effect=OSError("disk full")),
+    ):
+        await process_message(message)
+
+    published = channel.default_exchange.publish.call_args
+    assert published.kwargs["routing_key"] == routing_key
+    assert published.args[0].headers == headers
+    message.ack.assert_awaited_once()
+    message.reject.assert_not_awaited()
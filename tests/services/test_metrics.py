@@ -0,0 +1,90 @@
+"""Tests for the in-process metrics."""
+
+import pytest
+
+from lakewatch.services.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+def test_histogram_cumulative_buckets() -> None:
+    """Test observations are counted in cumulative buckets."""
+    histogram = Histogram("test", "Test histogram.", [1, 5, 10])
+
+    for value in (0.5, 1, 3, 7, 50):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 2, "5": 3, "10": 4, "+Inf": 5}
+    assert snapshot["count"] == 5
+    assert snapshot["sum"] == 61.5
+
+
+def test_counter_and_gauge() -> None:
+    """Test counters only add up and gauges move both ways or are read live."""
+    counter = Counter("test", "Test counter.")
+    counter.inc()
+    counter.inc(2)
+    gauge = Gauge("test", "Test gauge.")
+    gauge.set(5)
+    gauge.dec(2)
+    gauge.inc()
+    items = [1, 2]
+    live = Gauge("test", "Test gauge.", function=lambda: len(items))
+    items.append(3)
+
+    assert counter.value == 3
+    assert gauge.value == 4
+    assert live.value == 3
+
+
+def test_registry_renders_families() -> None:
+    """Test metrics sharing a name are rendered under one HELP and TYPE."""
+    registry = Registry()
+    ok = registry.counter("test_messages", "Messages.", labels={"result": "ok"})
+    registry.counter(
+        "test_messages",
+        "Messages.",
+        labels={"result": "failed"},
+        function=lambda: 2,
+    )
+    histogram = registry.histogram("test_seconds", "Durations.", [0.1, 1])
+    registry.gauge("test_path", 'Escaped "labels".', labels={"path": 'a"b\\c\nd'})
+    ok.inc()
+    histogram.observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_messages Messages.",
+        "# TYPE test_messages counter",
+        'test_messages_total{result="ok"} 1',
+        'test_messages_total{result="failed"} 2',
+        '# HELP test_path Escaped "labels".',
+        "# TYPE test_path gauge",
+        'test_path{path="a\\"b\\\\c\\nd"} 0',
+        "# HELP test_seconds Durations.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 0',
+        'test_seconds_bucket{le="1"} 1',
+        'test_seconds_bucket{le="+Inf"} 1',
+        "test_seconds_sum 0.5",
+        "test_seconds_count 1",
+    ]
+
+
+def test_registry_rejects_conflicting_metrics() -> None:
+    """Test a name keeps a single type and every label set is unique."""
+    registry = Registry()
+    registry.counter("test", "Test.", labels={"result": "ok"})
+
+    with pytest.raises(ValueError, match="is a counter"):
+        registry.gauge("test", "Test.")
+    with pytest.raises(ValueError, match="already registered"):
+        registry.counter("test", "Test.", labels={"result": "ok"})
+
+
+def test_metric_requires_samples() -> None:
+    """Test a metric kind cannot be created without its samples."""
+
+    class Untyped(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Untyped("lakewatch_untyped", "Untyped.")  # type: ignore[abstract]
@@ -0,0 +1,66 @@
+"""Tests for the in-memory node state cache."""
+
+import pytest
+from typing import Any, Dict
+
+from lakewatch.db import Database
+from lakewatch.services.node_cache import NodeStateCache
+
+
+def make_reading(timestamp: int, maintenance_required: int = 0) -> Dict[str, Any]:
+    """Build a sensor reading."""
+    return {
+        "node_id": "node1",
+        "timestamp": timestamp,
+        "latitude": 12.345,
+        "longitude": 67.890,
+        "temperature": 25.0,
+        "ph": 7.0,
+        "dissolved_oxygen": 8.0,
+        "maintenance_required": maintenance_required,
+    }
+
+
+def test_update_keeps_latest_reading() -> None:
+    """Test older readings do not overwrite newer state."""
+    cache = NodeStateCache()
+
+    assert cache.update(make_reading(200))
+    assert not cache.update(make_reading(100))
+    assert cache.get("node1")["timestamp"] == 200  # type: ignore[index]
+
+
+def test_update_applies_maintenance_change() -> None:
+    """Test a maintenance flag change is applied even for an older reading."""
+    cache = NodeStateCache()
+    cache.update(make_reading(200))
+
+    assert cache.update(make_reading(100, maintenance_required=1))
+    assert cache.get("node1")["maintenance_required"] == 1  # type: ignore[index]
+
+
+def test_render_is_cached_until_change() -> None:
+    """Test the body is rendered once per change."""
+    cache = NodeStateCache()
+    assert cache.render()[0] == b'{"message":"No nodes found"}'
+
+    cache.update(make_reading(100))
+    first = cache.render()
+
+    assert cache.render() is first
+    cache.update(make_reading(200))
+    assert cache.render()[1] != first[1]
+
+
+@pytest.mark.asyncio
+async def test_warm_from_node_metadata(temp_database: Database) -> None:
+    """Test the cache is loaded from node_metadata."""
+    await temp_database.execute(
+        "INSERT INTO node_metadata VALUES ('node1', 1.0, 2.0, 100, 0, 25.0, 8.0, 7.0)",
+    )
+    cache = NodeStateCache()
+
+    await cache.warm()
+
+    assert cache.ready
+    assert cache.get("node1")["dissolved_oxygen"] == 8.0  # type: ignore[index]
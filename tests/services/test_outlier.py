@@ -4,9 +4,22 @@ import pytest
 import sqlite3
 from unittest.mock import patch, MagicMock, AsyncMock
 import json
-from typing import List, Tuple
+from typing import Generator, List, Tuple
 
-from lakewatch.services.outlier import process_outliers
+from lakewatch.db import database
+from lakewatch.services.outlier import (
+    OutlierDetector,
+    outlier_detector,
+    process_outliers,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_detector() -> Generator[None, None, None]:
+    """Start every test with no node windows in memory."""
+    outlier_detector.clear()
+    yield
+    outlier_detector.clear()
 
 
 @pytest.fixture
@@ -24,23 +37,17 @@ def mock_db_readings() -> List[Tuple[float, float, float]]:
 @pytest.mark.asyncio
 async def test_process_outliers_no_outliers() -> None:
     """Test normal data processing with no outliers."""
-    with patch("sqlite3.connect") as mock_connect, patch(
+    with patch.object(database, "fetch") as mock_fetch, patch(
         "lakewatch.services.outlier.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Set up database mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-
         # Mock historical readings (normal range)
-        mock_cursor.fetchall.return_value = [
-            (25.0, 7.0, 8.0),
-            (25.2, 7.1, 7.9),
-            (24.9, 6.9, 8.1),
-            (25.3, 7.0, 8.0),
-            (25.1, 7.2, 7.8),
+        mock_fetch.return_value = [
+            ("node1", 25.0, 7.0, 8.0),
+            ("node1", 25.2, 7.1, 7.9),
+            ("node1", 24.9, 6.9, 8.1),
+            ("node1", 25.3, 7.0, 8.0),
+            ("node1", 25.1, 7.2, 7.8),
         ]
 
         # Create a payload with values within normal range
@@ -61,23 +68,17 @@ async def test_process_outliers_no_outliers() -> None:
 @pytest.mark.asyncio
 async def test_process_outliers_temperature_outlier() -> None:
     """Test outlier detection for temperature values."""
-    with patch("sqlite3.connect") as mock_connect, patch(
+    with patch.object(database, "fetch") as mock_fetch, patch(
         "lakewatch.services.outlier.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Set up database mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-
         # Mock historical readings
-        mock_cursor.fetchall.return_value = [
-            (25.0, 7.0, 8.0),
-            (25.2, 7.1, 7.9),
-            (24.9, 6.9, 8.1),
-            (25.3, 7.0, 8.0),
-            (25.1, 7.2, 7.8),
+        mock_fetch.return_value = [
+            ("node1", 25.0, 7.0, 8.0),
+            ("node1", 25.2, 7.1, 7.9),
+            ("node1", 24.9, 6.9, 8.1),
+            ("node1", 25.3, 7.0, 8.0),
+            ("node1", 25.1, 7.2, 7.8),
         ]
 
         # Create a payload with an outlier temperature
@@ -98,23 +99,17 @@ async def test_process_outliers_temperature_outlier() -> None:
 @pytest.mark.asyncio
 async def test_process_outliers_multiple_outliers() -> None:
     """Test detection of multiple outliers in one payload."""
-    with patch("sqlite3.connect") as mock_connect, patch(
+    with patch.object(database, "fetch") as mock_fetch, patch(
         "lakewatch.services.outlier.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Set up database mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-
         # Mock historical readings
-        mock_cursor.fetchall.return_value = [
-            (25.0, 7.0, 8.0),
-            (25.2, 7.1, 7.9),
-            (24.9, 6.9, 8.1),
-            (25.3, 7.0, 8.0),
-            (25.1, 7.2, 7.8),
+        mock_fetch.return_value = [
+            ("node1", 25.0, 7.0, 8.0),
+            ("node1", 25.2, 7.1, 7.9),
+            ("node1", 24.9, 6.9, 8.1),
+            ("node1", 25.3, 7.0, 8.0),
+            ("node1", 25.1, 7.2, 7.8),
         ]
 
         # Create a payload with multiple outliers
@@ -135,18 +130,12 @@ async def test_process_outliers_multiple_outliers() -> None:
 @pytest.mark.asyncio
 async def test_process_outliers_insufficient_history() -> None:
     """Test handling when there's not enough historical data."""
-    with patch("sqlite3.connect") as mock_connect, patch(
+    with patch.object(database, "fetch") as mock_fetch, patch(
         "lakewatch.services.outlier.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Set up database mock
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-
         # Mock insufficient historical readings
-        mock_cursor.fetchall.return_value = [
+        mock_fetch.return_value = [
             (25.0, 7.0, 8.0),  # Only one reading
         ]
 
@@ -168,12 +157,12 @@ async def test_process_outliers_insufficient_history() -> None:
 @pytest.mark.asyncio
 async def test_process_outliers_db_error() -> None:
     """Test handling of database errors."""
-    with patch("sqlite3.connect") as mock_connect, patch(
+    with patch.object(database, "fetch") as mock_fetch, patch(
         "lakewatch.services.outlier.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
         # Set up database mock to raise an exception
-        mock_connect.side_effect = sqlite3.Error("Test database error")
+        mock_fetch.side_effect = sqlite3.Error("Test database error")
 
         payload = {
             "node_id": "node1",
@@ -187,3 +176,53 @@ async def test_process_outliers_db_error() -> None:
 
         # No alerts should be sent
         mock_send_alert.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_outliers_seeds_window_once() -> None:
+    """Test the database is only read the first time a node is seen."""
+    with patch.object(database, "fetch") as mock_fetch, patch(
+        "lakewatch.services.outlier.send_threshold_alert", return_value=True
+    ) as mock_send_alert:
+        mock_fetch.return_value = [
+            ("node1", 25.0, 7.0, 8.0),
+            ("node1", 25.2, 7.1, 7.9),
+            ("node1", 24.9, 6.9, 8.1),
+        ]
+
+        for temperature in (25.0, 25.1, 25.2, 30.0):
+            await process_outliers(
+                {
+                    "node_id": "node1",
+                    "temperature": temperature,
+                    "ph": 7.0,
+                    "dissolved_oxygen": 8.0,
+                }
+            )
+
+        mock_fetch.assert_called_once()
+        mock_send_alert.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_detector_window_is_bounded() -> None:
+    """Test only the last readings are kept in a node window."""
+    detector = OutlierDetector(window=3, factor=1.7, min_history=3)
+    with patch.object(database, "fetch", return_value=[]):
+        for value in (1.0, 2.0, 3.0, 4.0):
+            await detector.check({"node_id": "node1", "temperature": value})
+
+        window = await detector.node_window("node1", None)
+
+    assert list(window.values["temperature"]) == [2.0, 3.0, 4.0]
+
+
+@pytest.mark.asyncio
+async def test_detector_evicts_least_recent_nodes() -> None:
+    """Test memory is bounded by evicting the least recently seen nodes."""
+    detector = OutlierDetector(max_nodes=2)
+    with patch.object(database, "fetch", return_value=[]):
+        for node_id in ("node1", "node2", "node3"):
+            await detector.check({"node_id": node_id, "temperature": 25.0})
+
+    assert len(detector) == 2
@@ -0,0 +1,98 @@
+"""Tests for the threshold profiles."""
+
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from pydantic import ValidationError
+
+from lakewatch.services.profiles import (
+    THRESHOLD_METRICS,
+    Bounds,
+    ThresholdProfiles,
+    ThresholdStore,
+    ThresholdTable,
+    default_bounds,
+)
+
+PROFILES = {
+    "default": {"dissolved_oxygen": {"min": 5.0}},
+    "groups": {
+        "north": {"nodes": ["node1", "node2"], "thresholds": {"ph": {"min": 6.5}}},
+    },
+    "nodes": {
+        "node2": {"temperature": {"max": 25.0}},
+        "node3": {"ph": {}},
+    },
+}
+
+
+def test_compile_resolves_overrides() -> None:
+    """Test nodes get the defaults, then their group, then their own bounds."""
+    table = ThresholdTable.compile(ThresholdProfiles.model_validate(PROFILES))
+
+    assert table.bounds("node0")["dissolved_oxygen"] == {"min": 5.0, "max": None}
+    assert table.bounds("node0")["ph"] == {"min": None, "max": 7.0}
+    assert table.bounds("node1")["ph"] == {"min": 6.5, "max": None}
+    assert table.bounds("node2")["ph"] == {"min": 6.5, "max": None}
+    assert table.bounds("node2")["temperature"] == {"min": None, "max": 25.0}
+    assert table.bounds("node1")["temperature"] == {"min": None, "max": 30.0}
+    assert "ph" not in table.bounds("node3")
+
+    rows = table.rows(["node0", "node1", "node2", "node3"])
+    column = THRESHOLD_METRICS.index("ph")
+    assert table.low[rows, column].tolist() == [-float("inf"), 6.5, 6.5, -float("inf")]
+    assert table.high[rows, column].tolist() == [7.0, float("inf"), float("inf")] + [
+        float("inf"),
+    ]
+
+
+def test_limits_report_the_breached_bound() -> None:
+    """Test the bound a value is checked against follows the breach."""
+    table = ThresholdTable.compile(
+        ThresholdProfiles(default={"ph": Bounds(min=6.5, max=8.5)}),
+    )
+    (ph,) = [limits for limits in table.node_limits("node1") if limits.metric == "ph"]
+
+    assert ph.breached(6.0) and ph.threshold(6.0) == 6.5
+    assert ph.breached(9.0) and ph.threshold(9.0) == 8.5
+    assert not ph.breached(7.0) and ph.threshold(7.0) == 8.5
+
+
+@pytest.mark.parametrize(
+    "profiles",
+    [
+        {"default": {"salinity": {"max": 1.0}}},
+        {"nodes": {"node1": {"ph": {"min": 9.0, "max": 6.0}}}},
+        {"groups": {"a": {"nodes": ["node1"]}, "b": {"nodes": ["node1"]}}},
+    ],
+)
+def test_invalid_profiles_are_rejected(profiles: dict) -> None:
+    """Test unknown metrics, swapped bounds and overlapping groups fail."""
+    with pytest.raises(ValidationError):
+        ThresholdProfiles.model_validate(profiles)
+
+
+@pytest.mark.asyncio
+async def test_reload_reads_file_and_swaps_table(tmp_path: Path) -> None:
+    """Test a reload compiles the file contents and changes the version."""
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps(PROFILES))
+    store = ThresholdStore(path)
+    before = store.table.version
+
+    store.load(store.read())
+
+    assert store.table.version != before
+    assert store.table.version == ThresholdProfiles.model_validate(PROFILES).version
+    assert store.stats()["groups"] == 1
+    assert store.stats()["rows"] == 4
+
+
+def test_default_oxygen_bound_is_a_floor() -> None:
+    """Test the oxygen settings bound dissolved oxygen from below."""
+    assert default_bounds()["dissolved_oxygen"] == Bounds(min=5.0)
+
+    with patch("lakewatch.services.profiles.settings.oxygen_min_threshold", 4.0):
+        assert default_bounds()["dissolved_oxygen"] == Bounds(min=4.0)
@@ -0,0 +1,92 @@
+"""Tests for the raw data retention worker."""
+
+import sqlite3
+import pytest
+from unittest.mock import patch
+from typing import Generator
+
+from lakewatch.db import Database
+from lakewatch.services.retention import DELETE_EXPIRED_CHUNK, RetentionWorker
+
+DAY = 24 * 60 * 60
+NOW = 100 * DAY
+
+
+@pytest.fixture
+def history(temp_database: Database) -> Generator[Database, None, None]:
+    """Fill the database with 60 days of readings for two nodes."""
+    conn = sqlite3.connect(temp_database.path)
+    for node_id in ("node1", "node2"):
+        conn.execute(
+            "INSERT INTO node_metadata (node_id, last_updated) VALUES (?, ?)",
+            (node_id, NOW),
+        )
+        conn.executemany(
+            "INSERT INTO node_data VALUES (?, ?, 25.0, 7.0, 8.0)",
+            [(node_id, NOW - hour * 3600) for hour in range(60 * 24)],
+        )
+    conn.execute(
+        "INSERT INTO node_rollup_1d VALUES "
+        "('node1', 0, 5, 5, 100.0, 19.0, 21.0, 0, 0, NULL, NULL, 0, 0, NULL, NULL)",
+    )
+    conn.commit()
+    conn.close()
+    with patch("lakewatch.services.retention.settings") as mock_settings:
+        mock_settings.raw_retention_days = 30
+        mock_settings.retention_chunk_size = 100
+        mock_settings.retention_vacuum_pages = 10000
+        yield temp_database
+
+
+def count(db: Database, sql: str) -> int:
+    """Run a COUNT query."""
+    conn = sqlite3.connect(db.path)
+    result = conn.execute(sql).fetchone()[0]
+    conn.close()
+    return int(result)
+
+
+@pytest.mark.asyncio
+async def test_prune_deletes_expired_readings(history: Database) -> None:
+    """Test only readings older than the retention period are removed."""
+    worker = RetentionWorker()
+
+    pruned = await worker.prune(now=NOW)
+
+    cutoff = NOW - 30 * DAY
+    assert pruned == 2 * (60 * 24 - 30 * 24 - 1)
+    assert (
+        count(history, f"SELECT COUNT(*) FROM node_data WHERE timestamp < {cutoff}")
+        == 0
+    )
+    assert count(history, "SELECT COUNT(*) FROM node_data") == 2 * (30 * 24 + 1)
+    assert count(history, "SELECT COUNT(*) FROM node_rollup_1d") == 1
+    assert worker.stats()["last_run"]["pruned"] == pruned
+    assert worker.stats()["last_run"]["vacuumed_pages"] > 0
+
+
+@pytest.mark.asyncio
+async def test_prune_disabled(history: Database) -> None:
+    """Test a retention of zero days keeps everything."""
+    with patch("lakewatch.services.retention.settings") as mock_settings:
+        mock_settings.raw_retention_days = 0
+
+        assert await RetentionWorker().prune(now=NOW) == 0
+
+    assert count(history, "SELECT COUNT(*) FROM node_data") == 2 * 60 * 24
+
+
+def test_delete_uses_node_index(history: Database) -> None:
+    """Test expired rows are located through an index, not a table scan."""
+    conn = sqlite3.connect(history.path)
+    plan = " ".join(
+        row[3]
+        for row in conn.execute(
+            f"EXPLAIN QUERY PLAN {DELETE_EXPIRED_CHUNK}",
+            ("node1", 0, 1),
+        )
+    )
+    conn.close()
+
+    assert "INDEX" in plan
+    assert "SCAN node_data" not in plan
@@ -0,0 +1,139 @@
+"""Tests for the rollup tables."""
+
+import asyncio
+import sqlite3
+import pytest
+from unittest.mock import patch
+from typing import Any, Dict, List
+
+from lakewatch.db import Database
+from lakewatch.services.readings import BucketSize
+from lakewatch.services.rollup import (
+    accumulate,
+    apply_rollups,
+    main,
+    rebuild_rollups,
+)
+from lakewatch.services.writer import IngestWriter
+
+DAY = 24 * 60 * 60
+
+
+def rollup_rows(db: Database, table: str) -> List[Any]:
+    """Read a whole rollup table."""
+    conn = sqlite3.connect(db.path)
+    rows = conn.execute(f"SELECT * FROM {table} ORDER BY node_id, bucket").fetchall()
+    conn.close()
+    return rows
+
+
+def make_reading(node_id: str, timestamp: int, temperature: float) -> Dict[str, Any]:
+    """Build a sensor reading."""
+    return {
+        "node_id": node_id,
+        "timestamp": timestamp,
+        "latitude": 12.345,
+        "longitude": 67.890,
+        "temperature": temperature,
+        "ph": 7.0,
+        "dissolved_oxygen": None,
+        "maintenance_required": 0,
+    }
+
+
+def test_accumulate_groups_per_bucket() -> None:
+    """Test readings are pre-aggregated per node and bucket."""
+    result = accumulate(
+        [
+            ("node1", 0, 20.0, 7.0, None),
+            ("node1", 59, 22.0, 7.4, None),
+            ("node1", 60, 24.0, 7.2, 8.0),
+        ],
+    )
+
+    assert result[BucketSize.MINUTE] == [
+        ("node1", 0, 2, 2, 42.0, 20.0, 22.0, 2, 14.4, 7.0, 7.4, 0, 0.0, None, None),
+        ("node1", 60, 1, 1, 24.0, 24.0, 24.0, 1, 7.2, 7.2, 7.2, 1, 8.0, 8.0, 8.0),
+    ]
+    assert len(result[BucketSize.HOUR]) == 1
+    assert result[BucketSize.DAY][0][2] == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_maintains_rollups(temp_database: Database) -> None:
+    """Test incremental rollups match a rebuild from the raw readings."""
+    writer = IngestWriter(batch_size=3, flush_interval=0.01)
+    readings = [
+        make_reading("node1", ts, 20.0 + ts % 7) for ts in range(0, 2 * DAY, 1800)
+    ]
+    for start in range(0, len(readings), 3):
+        await asyncio.gather(*(writer.submit(r) for r in readings[start : start + 3]))
+    await writer.stop()
+
+    incremental = {
+        table: rollup_rows(temp_database, table)
+        for table in ("node_rollup_1m", "node_rollup_1h", "node_rollup_1d")
+    }
+    conn = sqlite3.connect(temp_database.path, isolation_level=None)
+    assert rebuild_rollups(conn) == 2
+    conn.close()
+
+    for table, rows in incremental.items():
+        assert rows == rollup_rows(temp_database, table)
+    assert incremental["node_rollup_1d"][0][2] == 48
+
+
+def test_rebuild_keeps_days_without_raw_data(temp_database: Database) -> None:
+    """Test rollups older than the oldest raw reading survive a rebuild."""
+    conn = sqlite3.connect(temp_database.path, isolation_level=None)
+    conn.execute(
+        "INSERT INTO node_rollup_1d VALUES "
+        "('node1', 0, 5, 5, 100.0, 19.0, 21.0, 0, 0, NULL, NULL, 0, 0, NULL, NULL)",
+    )
+    conn.execute("INSERT INTO node_data VALUES ('node1', ?, 25.0, 7.0, 8.0)", (DAY,))
+
+    rebuild_rollups(conn)
+
+    rows = conn.execute("SELECT bucket, count FROM node_rollup_1d").fetchall()
+    conn.close()
+    assert rows == [(0, 5), (DAY, 1)]
+
+
+def test_rebuild_keeps_day_partly_pruned(temp_database: Database) -> None:
+    """Test a day whose start was pruned keeps the rollups of its readings."""
+    conn = sqlite3.connect(temp_database.path, isolation_level=None)
+    readings = [
+        ("node1", DAY + 600, 20.0, 7.0, 8.0),
+        ("node1", DAY + 4200, 22.0, 7.0, 8.0),
+    ]
+    conn.executemany("INSERT INTO node_data VALUES (?, ?, ?, ?, ?)", readings)
+    apply_rollups(conn, readings)
+    # Retention pruned the first hour of the day
+    cutoff = DAY + 3600
+    conn.execute("DELETE FROM node_data WHERE timestamp < ?", (cutoff,))
+
+    rebuild_rollups(conn, cutoff=cutoff)
+
+    hours = conn.execute("SELECT bucket, count FROM node_rollup_1h").fetchall()
+    days = conn.execute("SELECT bucket, count FROM node_rollup_1d").fetchall()
+    conn.close()
+    assert hours == [(DAY, 1), (DAY + 3600, 1)]
+    assert days == [(DAY, 2)]
+
+
+def test_backfill_command(temp_database: Database) -> None:
+    """Test the backfill command rebuilds the rollups."""
+    conn = sqlite3.connect(temp_database.path)
+    conn.execute("INSERT INTO node_data VALUES ('node1', 30, 25.0, 7.0, 8.0)")
+    conn.commit()
+    conn.close()
+
+    # Without retention, so the old reading counts as complete history
+    with patch("lakewatch.services.rollup.settings") as mock_settings, patch(
+        "lakewatch.services.rollup.retention_cutoff",
+        return_value=None,
+    ):
+        mock_settings.db_file = temp_database.path
+        main([])
+
+    assert rollup_rows(temp_database, "node_rollup_1m")[0][:3] == ("node1", 0, 1)
@@ -0,0 +1,141 @@
+"""Tests for routing committed readings to the worker owning their node."""
+
+import json
+from typing import Any, Dict, Generator, List
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aio_pika.message import ProcessContext
+
+from lakewatch.services import routing
+from lakewatch.services.messages import ATTEMPTS_HEADER, DeadLetters
+from lakewatch.services.routing import AlertRouter, owner
+
+
+def make_channel() -> MagicMock:
+    """Build a channel whose exchange and queue record what they get."""
+    channel = MagicMock()
+    channel.set_qos = AsyncMock()
+    channel.close = AsyncMock()
+    channel.declare_exchange = AsyncMock(return_value=MagicMock(publish=AsyncMock()))
+    queue = MagicMock(bind=AsyncMock(), cancel=AsyncMock())
+    queue.consume = AsyncMock(return_value="consumer-tag")
+    channel.declare_queue = AsyncMock(return_value=queue)
+    return channel
+
+
+def readings_of(*node_ids: str) -> List[Dict[str, Any]]:
+    """Build one reading per node."""
+    return [{"node_id": node_id, "timestamp": 1} for node_id in node_ids]
+
+
+@pytest.fixture
+def evaluate_batch() -> Generator[AsyncMock, None, None]:
+    """Record the batches checked for alerts."""
+    with patch.object(routing, "evaluate_batch", AsyncMock()) as evaluate:
+        yield evaluate
+
+
+def test_owner_is_stable() -> None:
+    """Test nodes are spread over the workers the same way in every process."""
+    owners = [owner(f"node{index}", 3) for index in range(30)]
+
+    assert owner("node1", 3) == owner("node1", 3)
+    assert set(owners) == {0, 1, 2}
+
+
+@pytest.mark.asyncio
+async def test_route_checks_owned_nodes_and_forwards_others(
+    evaluate_batch: AsyncMock,
+) -> None:
+    """Test only the nodes of this worker are checked here."""
+    mine = next(f"node{i}" for i in range(100) if owner(f"node{i}", 2) == 0)
+    theirs = next(f"node{i}" for i in range(100) if owner(f"node{i}", 2) == 1)
+    channel = make_channel()
+    router = AlertRouter()
+    await router.start(channel, 0, 2)
+
+    await router.route(readings_of(mine, theirs, mine))
+
+    evaluate_batch.assert_awaited_once_with(readings_of(mine, mine), [])
+    exchange = await channel.declare_exchange()
+    message = exchange.publish.call_args.args[0]
+    assert json.loads(message.body) == {"readings": readings_of(theirs), "late": []}
+    assert exchange.publish.call_args.kwargs["routing_key"] == "1"
+    assert router.stats()["forwarded"] == 1
+    await router.stop()
+
+
+def make_message(body: Any) -> MagicMock:
+    """Build a routed message whose processing context acks or rejects it."""
+    message = MagicMock(body=json.dumps(body).encode())
+    message.headers = {}
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.message_id = None
+    message.timestamp = None
+    message.processed = False
+    message.channel.is_closed = False
+    message.ack = AsyncMock()
+    message.reject = AsyncMock()
+    message.process.side_effect = lambda requeue=False: ProcessContext(
+        message,
+        requeue=requeue,
+        reject_on_redelivered=False,
+        ignore_processed=False,
+    )
+    return message
+
+
+@pytest.mark.asyncio
+async def test_routed_readings_are_checked(evaluate_batch: AsyncMock) -> None:
+    """Test readings routed by another worker are checked, then acked."""
+    router = AlertRouter()
+    message = make_message(
+        {"readings": readings_of("node1"), "late": readings_of("node2")},
+    )
+
+    await router._on_message(message)  # noqa: SLF001
+
+    evaluate_batch.assert_awaited_once_with(
+        readings_of("node1"),
+        readings_of("node2"),
+    )
+    message.ack.assert_awaited_once()
+    assert router.stats()["received"] == 2
+
+
+@pytest.mark.asyncio
+async def test_single_worker_checks_everything(evaluate_batch: AsyncMock) -> None:
+    """Test without other workers every batch is checked in-process."""
+    await AlertRouter().route(readings_of("node1", "node2"))
+
+    evaluate_batch.assert_awaited_once_with(readings_of("node1", "node2"), [])
+
+
+@pytest.mark.asyncio
+async def test_routed_readings_failing_to_be_checked_are_parked(
+    evaluate_batch: AsyncMock,
+) -> None:
+    """Test a routed batch that keeps failing ends up dead-lettered."""
+    evaluate_batch.side_effect = RuntimeError("broken")
+    letters = DeadLetters("dead", max_attempts=2)
+    channel = make_channel()
+    channel.default_exchange.publish = AsyncMock()
+    await letters.start(channel)
+    router = AlertRouter()
+    await router.start(make_channel(), 0, 2)
+    message = make_message(readings_of("node1"))
+
+    with patch.object(routing, "dead_letters", letters):
+        await router._on_message(message)  # noqa: SLF001
+        retried = channel.default_exchange.publish.call_args
+        message.headers = retried.args[0].headers
+        await router._on_message(message)  # noqa: SLF001
+
+    assert message.headers == {ATTEMPTS_HEADER: 1}
+    parked = channel.default_exchange.publish.call_args
+    assert parked.kwargs["routing_key"] == "dead"
+    assert message.ack.await_count == 2
+    message.reject.assert_not_awaited()
+    await router.stop()
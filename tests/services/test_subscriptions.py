@@ -0,0 +1,101 @@
+from typing import Any, Dict
+
+import pytest
+from pydantic import ValidationError
+
+from lakewatch.services.subscriptions import Subscription, SubscriptionIndex
+
+
+def alert(**fields: Any) -> Dict[str, Any]:
+    """Build alert metadata."""
+    return {
+        "node_id": "node1",
+        "metric": "temperature",
+        "severity": "warning",
+        "latitude": 12.95,
+        "longitude": 77.65,
+        **fields,
+    }
+
+
+def test_default_subscription_matches_everything() -> None:
+    """Test a client without filters receives every alert."""
+    index: SubscriptionIndex[str] = SubscriptionIndex()
+    index.add("tablet", Subscription())
+
+    assert index.match(alert()) == ["tablet"]
+    assert index.match(alert(latitude=None, longitude=None)) == ["tablet"]
+
+
+def test_filters_by_node_metric_and_severity() -> None:
+    """Test exact value filters."""
+    index: SubscriptionIndex[str] = SubscriptionIndex()
+    index.add("nodes", Subscription(node_ids={"node1", "node2"}))
+    index.add("ph", Subscription(metrics={"ph"}))
+    index.add("critical", Subscription(severities={"critical"}))
+
+    assert index.match(alert()) == ["nodes"]
+    assert sorted(index.match(alert(node_id="node2", metric="ph"))) == [
+        "nodes",
+        "ph",
+    ]
+    assert index.match(alert(node_id="node3", severity="critical")) == ["critical"]
+
+
+def test_filters_by_bounding_box() -> None:
+    """Test alerts are matched against the subscribed area."""
+    index: SubscriptionIndex[str] = SubscriptionIndex(cell_degrees=0.1, max_cells=10)
+    index.add("lake", Subscription(bbox=(77.6, 12.9, 77.7, 13.0)))
+    index.add("city", Subscription(bbox=(77.0, 12.0, 78.0, 14.0)))
+
+    assert sorted(index.match(alert())) == ["city", "lake"]
+    assert index.match(alert(latitude=13.5)) == ["city"]
+    assert index.match(alert(latitude=20.0)) == []
+    assert index.match(alert(latitude=None, longitude=None)) == []
+
+
+def test_resubscribe_and_remove() -> None:
+    """Test a new subscription replaces the old one and removal is complete."""
+    index: SubscriptionIndex[str] = SubscriptionIndex()
+    index.add("tablet", Subscription(node_ids={"node1"}, bbox=(77.6, 12.9, 77.7, 13.0)))
+    index.add("tablet", Subscription(node_ids={"node2"}))
+
+    assert index.match(alert()) == []
+    assert index.match(alert(node_id="node2")) == ["tablet"]
+
+    index.remove("tablet")
+
+    assert len(index) == 0
+    assert index.match(alert(node_id="node2")) == []
+    assert not index._cells  # noqa: SLF001
+    assert not index._exact["node_id"]  # noqa: SLF001
+
+
+def test_lookup_only_visits_candidates() -> None:
+    """Test clients of other nodes are not checked one by one."""
+    index: SubscriptionIndex[int] = SubscriptionIndex()
+    for client in range(1000):
+        index.add(client, Subscription(node_ids={f"node{client}"}))
+
+    checked = 0
+    original = Subscription.matches
+
+    def counting(self: Subscription, alert: Dict[str, Any]) -> bool:
+        nonlocal checked
+        checked += 1
+        return original(self, alert)
+
+    Subscription.matches = counting  # type: ignore[method-assign]
+    try:
+        assert index.match(alert(node_id="node7")) == [7]
+    finally:
+        Subscription.matches = original  # type: ignore[method-assign]
+    assert checked == 1
+
+
+def test_invalid_subscriptions() -> None:
+    """Test unknown severities and swapped corners are rejected."""
+    with pytest.raises(ValidationError):
+        Subscription(severities={"urgent"})
+    with pytest.raises(ValidationError):
+        Subscription(bbox=(78.0, 12.0, 77.0, 13.0))
@@ -3,20 +3,28 @@
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 
+from lakewatch.services.profiles import Bounds, ThresholdProfiles, threshold_store
 from lakewatch.services.threshold import threshold_check
 
 
+def load_thresholds(**limits: float) -> None:
+    """Check every node against the given upper limits."""
+    threshold_store.load(
+        ThresholdProfiles(
+            default={metric: Bounds(max=limit) for metric, limit in limits.items()},
+        ),
+    )
+
+
 @pytest.mark.asyncio
 async def test_threshold_check_no_thresholds_exceeded() -> None:
     """Test when no thresholds are exceeded."""
-    with patch("lakewatch.services.threshold.settings") as mock_settings, patch(
+    with patch(
         "lakewatch.services.threshold.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Configure threshold settings
-        mock_settings.temperature_threshold = 30.0
-        mock_settings.ph_threshold = 8.0
-        mock_settings.oxygen_threshold = 10.0
+        # Configure thresholds
+        load_thresholds(temperature=30.0, ph=8.0, dissolved_oxygen=10.0)
 
         # Create a payload with values below thresholds
         payload = {
@@ -40,14 +48,12 @@ async def test_threshold_check_no_thresholds_exceeded() -> None:
 @pytest.mark.asyncio
 async def test_threshold_check_temperature_exceeded() -> None:
     """Test when temperature threshold is exceeded."""
-    with patch("lakewatch.services.threshold.settings") as mock_settings, patch(
+    with patch(
         "lakewatch.services.threshold.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Configure threshold settings
-        mock_settings.temperature_threshold = 25.0
-        mock_settings.ph_threshold = 8.0
-        mock_settings.oxygen_threshold = 10.0
+        # Configure thresholds
+        load_thresholds(temperature=25.0, ph=8.0, dissolved_oxygen=10.0)
 
         # Create a payload with temperature exceeding threshold
         payload = {
@@ -74,14 +80,12 @@ async def test_threshold_check_temperature_exceeded() -> None:
 @pytest.mark.asyncio
 async def test_threshold_check_multiple_thresholds_exceeded() -> None:
     """Test when multiple thresholds are exceeded."""
-    with patch("lakewatch.services.threshold.settings") as mock_settings, patch(
+    with patch(
         "lakewatch.services.threshold.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Configure threshold settings
-        mock_settings.temperature_threshold = 25.0
-        mock_settings.ph_threshold = 7.0
-        mock_settings.oxygen_threshold = 8.0
+        # Configure thresholds
+        load_thresholds(temperature=25.0, ph=7.0, dissolved_oxygen=8.0)
 
         # Create a payload with multiple thresholds exceeded
         payload = {
@@ -105,14 +109,12 @@ async def test_threshold_check_multiple_thresholds_exceeded() -> None:
 @pytest.mark.asyncio
 async def test_threshold_check_maintenance_required() -> None:
     """Test when maintenance is required."""
-    with patch("lakewatch.services.threshold.settings") as mock_settings, patch(
+    with patch(
         "lakewatch.services.threshold.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Configure threshold settings
-        mock_settings.temperature_threshold = 30.0
-        mock_settings.ph_threshold = 8.0
-        mock_settings.oxygen_threshold = 10.0
+        # Configure thresholds
+        load_thresholds(temperature=30.0, ph=8.0, dissolved_oxygen=10.0)
 
         # Create a payload indicating maintenance is required
         payload = {
@@ -140,14 +142,12 @@ async def test_threshold_check_maintenance_required() -> None:
 @pytest.mark.asyncio
 async def test_threshold_check_missing_values() -> None:
     """Test handling of payloads with missing sensor values."""
-    with patch("lakewatch.services.threshold.settings") as mock_settings, patch(
+    with patch(
         "lakewatch.services.threshold.send_threshold_alert", return_value=True
     ) as mock_send_alert:
 
-        # Configure threshold settings
-        mock_settings.temperature_threshold = 25.0
-        mock_settings.ph_threshold = 7.0
-        mock_settings.oxygen_threshold = 8.0
+        # Configure thresholds
+        load_thresholds(temperature=25.0, ph=7.0, dissolved_oxygen=8.0)
 
         # Create a payload with missing values
         payload = {
@@ -168,3 +168,88 @@ async def test_threshold_check_missing_values() -> None:
         mock_send_alert.assert_called_once()
         args = mock_send_alert.call_args[1]
         assert "pH threshold exceeded" in args["message"]
+
+
+@pytest.mark.asyncio
+async def test_threshold_check_alerts_only_on_transitions() -> None:
+    """Test a node stuck above a threshold is only reported once."""
+    with patch(
+        "lakewatch.services.threshold.send_threshold_alert", return_value=True
+    ) as mock_send_alert:
+
+        load_thresholds(temperature=25.0, ph=8.0, dissolved_oxygen=10.0)
+
+        payload = {
+            "node_id": "node1",
+            "latitude": 12.345,
+            "longitude": 67.890,
+            "timestamp": 1620000000,
+            "temperature": 26.0,
+            "ph": 7.0,
+            "dissolved_oxygen": 8.0,
+            "maintenance_required": 0,
+        }
+        for _ in range(10):
+            await threshold_check(payload)
+
+        mock_send_alert.assert_called_once()
+
+        # Back to normal for long enough resolves the alert
+        for _ in range(3):
+            await threshold_check({**payload, "temperature": 20.0})
+
+        assert mock_send_alert.call_count == 2
+        args = mock_send_alert.call_args[1]
+        assert args["message"] == "Temperature back to normal: 20.0"
+
+
+@pytest.mark.asyncio
+async def test_threshold_check_low_bound_and_node_override() -> None:
+    """Test low bounds alert and node overrides replace the defaults."""
+    threshold_store.load(
+        ThresholdProfiles(
+            default={"dissolved_oxygen": Bounds(min=5.0)},
+            nodes={"node2": {"dissolved_oxygen": Bounds(min=3.0, max=12.0)}},
+        ),
+    )
+    with patch(
+        "lakewatch.services.threshold.send_threshold_alert", return_value=True
+    ) as mock_send_alert:
+        for node_id in ("node1", "node2"):
+            await threshold_check(
+                {"node_id": node_id, "timestamp": 1, "dissolved_oxygen": 4.0},
+            )
+
+        mock_send_alert.assert_called_once()
+        args = mock_send_alert.call_args[1]
+        assert args["node_id"] == "node1"
+        assert args["message"] == "Oxygen below threshold: 4.0"
+
+        # Only clears once above the bound by the hysteresis margin
+        for _ in range(3):
+            await threshold_check(
+                {"node_id": "node1", "timestamp": 2, "dissolved_oxygen": 5.05},
+            )
+        assert mock_send_alert.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_threshold_check_oxygen_default_is_a_floor() -> None:
+    """Test the oxygen threshold of the settings alerts below it, not above."""
+    threshold_store.load(ThresholdProfiles())
+    with patch(
+        "lakewatch.services.threshold.send_threshold_alert", return_value=True
+    ) as mock_send_alert:
+        await threshold_check(
+            {"node_id": "node1", "timestamp": 1, "dissolved_oxygen": 8.0},
+        )
+        mock_send_alert.assert_not_called()
+
+        await threshold_check(
+            {"node_id": "node2", "timestamp": 1, "dissolved_oxygen": 4.0},
+        )
+
+        mock_send_alert.assert_called_once()
+        args = mock_send_alert.call_args[1]
+        assert args["node_id"] == "node2"
+        assert args["message"] == "Oxygen below threshold: 4.0"
@@ -0,0 +1,279 @@
+"""Tests for the batched ingest writer."""
+
+import asyncio
+import sqlite3
+import pytest
+from typing import Any, Dict, List
+
+from lakewatch.db import Database
+from lakewatch.services.alerts import AlertEvent
+from lakewatch.services import writer as writer_module
+from lakewatch.services.writer import IngestWriter
+
+
+def make_reading(node_id: str, timestamp: int, **overrides: Any) -> Dict[str, Any]:
+    """Build a sensor reading."""
+    reading = {
+        "node_id": node_id,
+        "timestamp": timestamp,
+        "latitude": 12.345,
+        "longitude": 67.890,
+        "temperature": 25.0,
+        "ph": 7.0,
+        "dissolved_oxygen": 8.0,
+        "maintenance_required": 0,
+    }
+    reading.update(overrides)
+    return reading
+
+
+@pytest.mark.asyncio
+async def test_submit_writes_batch_in_one_flush(temp_database: Database) -> None:
+    """Test concurrent readings are written together in a single batch."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    stages = [
+        writer_module.insert_seconds,
+        writer_module.upsert_seconds,
+        writer_module.rollup_seconds,
+        writer_module.commit_seconds,
+    ]
+    timed = [stage.count for stage in stages]
+
+    await asyncio.gather(
+        *(writer.submit(make_reading("node1", ts)) for ts in range(1, 6)),
+    )
+    await writer.stop()
+
+    assert writer.flush_size.count == 1
+    assert writer.flush_size.sum == 5
+    assert writer.flush_latency.count == 1
+    # Every stage is timed once per batch
+    assert [stage.count for stage in stages] == [count + 1 for count in timed]
+
+    conn = sqlite3.connect(temp_database.path)
+    assert conn.execute("SELECT COUNT(*) FROM node_data").fetchone()[0] == 5
+    assert conn.execute(
+        "SELECT last_updated FROM node_metadata WHERE node_id = 'node1'",
+    ).fetchone() == (5,)
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_size_triggers_flush(temp_database: Database) -> None:
+    """Test a full batch is flushed without waiting for the interval."""
+    writer = IngestWriter(batch_size=2, flush_interval=10)
+
+    await asyncio.wait_for(
+        asyncio.gather(
+            writer.submit(make_reading("node1", 1)),
+            writer.submit(make_reading("node1", 2)),
+        ),
+        timeout=1,
+    )
+    await writer.stop()
+
+    assert writer.flush_size.count == 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_readings_are_skipped(temp_database: Database) -> None:
+    """Test redelivered readings succeed without being stored or counted twice."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    await writer.submit(make_reading("node1", 1))
+
+    await asyncio.gather(
+        writer.submit(make_reading("node1", 1, temperature=30.0)),
+        writer.submit(make_reading("node1", 2)),
+        writer.submit(make_reading("node1", 2)),
+    )
+    await writer.stop()
+
+    assert writer.stats()["duplicates"] == 2
+    conn = sqlite3.connect(temp_database.path)
+    assert conn.execute("SELECT timestamp, temperature FROM node_data").fetchall() == [
+        (1, 25.0),
+        (2, 25.0),
+    ]
+    assert conn.execute("SELECT SUM(count) FROM node_rollup_1m").fetchone() == (2,)
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_late_readings_keep_node_metadata(temp_database: Database) -> None:
+    """Test a reading older than the latest one is stored but not the node state."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    await writer.submit(make_reading("node1", 5))
+
+    await asyncio.gather(
+        writer.submit(make_reading("node1", 3, maintenance_required=1)),
+        writer.submit(make_reading("node2", 4)),
+        writer.submit(make_reading("node2", 2)),
+    )
+    await writer.stop()
+
+    assert writer.stats()["late"] == 2
+    conn = sqlite3.connect(temp_database.path)
+    assert conn.execute("SELECT COUNT(*) FROM node_data").fetchone() == (4,)
+    assert conn.execute(
+        "SELECT node_id, last_updated, maintenance_required FROM node_metadata",
+    ).fetchall() == [("node1", 5, 0), ("node2", 4, 0)]
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_reading_is_rejected(temp_database: Database) -> None:
+    """Test a reading with missing fields fails without touching the batch."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    malformed = make_reading("node1", 1)
+    del malformed["ph"]
+
+    results = await asyncio.gather(
+        writer.submit(malformed),
+        writer.submit(make_reading("node2", 1)),
+        return_exceptions=True,
+    )
+    await writer.stop()
+
+    assert isinstance(results[0], KeyError)
+    assert results[1] is None
+    assert writer.stats()["flush_size"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unstorable_reading_does_not_sink_the_batch(
+    temp_database: Database,
+) -> None:
+    """Test a reading SQLite cannot store fails alone, the others are stored."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+
+    results = await asyncio.gather(
+        writer.submit_many([make_reading("node1", 2**64)]),
+        writer.submit_many([make_reading("node2", 1)]),
+        return_exceptions=True,
+    )
+    await writer.stop()
+
+    assert isinstance(results[0], OverflowError)
+    assert results[1] is None
+    conn = sqlite3.connect(temp_database.path)
+    stored = conn.execute("SELECT node_id FROM node_data").fetchall()
+    conn.close()
+    assert stored == [("node2",)]
+
+
+@pytest.mark.asyncio
+async def test_submit_many_waits_for_every_reading(temp_database: Database) -> None:
+    """Test a batch of readings is written before the first error is raised."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    malformed = make_reading("node1", 1)
+    del malformed["ph"]
+
+    with pytest.raises(KeyError):
+        await writer.submit_many([malformed, make_reading("node2", 1)])
+    await writer.submit_many([make_reading("node2", 2), make_reading("node3", 1)])
+    await writer.stop()
+
+    conn = sqlite3.connect(temp_database.path)
+    count = conn.execute("SELECT COUNT(*) FROM node_data").fetchone()[0]
+    conn.close()
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_alert_events_written_with_batch(temp_database: Database) -> None:
+    """Test recorded alerts are written and counted alongside readings."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+
+    writer.record_alert(AlertEvent("node1", "ph", "threshold", "open", 9.0, 8.0, 1))
+    writer.record_alert(AlertEvent("node1", "ph", "threshold", "open", 9.5, 8.0, 3))
+    await writer.submit(make_reading("node1", 2))
+    await writer.stop()
+
+    assert writer.stats()["alerts_written"] == 2
+    assert writer.flush_size.count == 1
+    conn = sqlite3.connect(temp_database.path)
+    assert conn.execute("SELECT COUNT(*) FROM alert_events").fetchone()[0] == 2
+    assert conn.execute("SELECT * FROM alert_counts").fetchall() == [
+        ("node1", "ph", "threshold", "open", 2, 3),
+    ]
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_commit_hooks_get_committed_readings(temp_database: Database) -> None:
+    """Test hooks see every committed batch but not the rejected readings."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    batches: List[List[Dict[str, Any]]] = []
+
+    async def hook(readings: List[Dict[str, Any]], late: List[Any]) -> None:
+        batches.append(readings)
+
+    async def failing(readings: List[Dict[str, Any]], late: List[Any]) -> None:
+        raise RuntimeError("boom")
+
+    writer.on_commit(failing)
+    writer.on_commit(hook)
+    results = await asyncio.gather(
+        writer.submit(make_reading("node1", 1)),
+        writer.submit({"node_id": "node1"}),
+        writer.submit(make_reading("node2", 1)),
+        return_exceptions=True,
+    )
+    await writer.stop()
+
+    assert isinstance(results[1], KeyError)
+    assert [[r["node_id"] for r in batch] for batch in batches] == [["node1", "node2"]]
+
+
+@pytest.mark.asyncio
+async def test_commit_hooks_skip_replays(temp_database: Database) -> None:
+    """Test duplicates are not passed on and late readings are passed apart."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+    batches: List[List[Dict[str, Any]]] = []
+    late_batches: List[List[Dict[str, Any]]] = []
+
+    async def hook(
+        readings: List[Dict[str, Any]],
+        late: List[Dict[str, Any]],
+    ) -> None:
+        batches.append(readings)
+        late_batches.append(late)
+
+    writer.on_commit(hook)
+    await writer.submit_many([make_reading("node1", 2), make_reading("node2", 2)])
+    await writer.submit_many(
+        [
+            make_reading("node1", 2),
+            make_reading("node2", 1),
+            make_reading("node2", 3),
+        ],
+    )
+    await writer.stop()
+
+    assert [[r["timestamp"] for r in batch] for batch in batches] == [[2, 2], [3]]
+    assert [[r["node_id"] for r in batch] for batch in late_batches] == [
+        [],
+        ["node2"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stop_writes_alerts_of_last_batch(temp_database: Database) -> None:
+    """Test alerts raised by the hooks of the final batch are not lost."""
+    writer = IngestWriter(batch_size=10, flush_interval=0.05)
+
+    async def hook(readings: List[Dict[str, Any]], late: List[Any]) -> None:
+        writer.record_alert(
+            AlertEvent("node1", "ph", "threshold", "open", 9.0, 8.5, 1),
+        )
+
+    writer.on_commit(hook)
+    submitted = asyncio.create_task(writer.submit(make_reading("node1", 1)))
+    await asyncio.sleep(0)
+    await writer.stop()
+    await submitted
+
+    assert writer.stats()["alerts_written"] == 1
+    conn = sqlite3.connect(temp_database.path)
+    assert conn.execute("SELECT COUNT(*) FROM alert_events").fetchone() == (1,)
+    conn.close()
@@ -0,0 +1,153 @@
+"""Tests for the standalone ingest worker."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from lakewatch import ingest
+from lakewatch.db import Database
+from lakewatch.services.fanout import fanout
+from lakewatch.services.flow import flow_controller
+from lakewatch.services.rabbitmq import process_message
+from lakewatch.services.retention import retention_worker
+from lakewatch.services.writer import ingest_writer
+
+
+def make_connection() -> MagicMock:
+    """Build a RabbitMQ connection whose channels hand out one queue."""
+    queue = MagicMock()
+    queue.consume = AsyncMock(return_value="consumer-tag")
+    queue.cancel = AsyncMock()
+    channel = MagicMock()
+    channel.set_qos = AsyncMock()
+    channel.declare_queue = AsyncMock(return_value=queue)
+    channel.close = AsyncMock()
+    connection = MagicMock()
+    connection.channel = AsyncMock(return_value=channel)
+    connection.close = AsyncMock()
+    connection.queue = queue
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_run_consumes_until_stopped(temp_database: Database) -> None:
+    """Test a worker consumes the queue and stops cleanly."""
+    connection = make_connection()
+    stopping = asyncio.Event()
+    with patch.object(
+        ingest.aio_pika,
+        "connect_robust",
+        AsyncMock(return_value=connection),
+    ), patch.object(fanout, "start", AsyncMock()) as start_fanout, patch.object(
+        fanout,
+        "stop",
+        AsyncMock(),
+    ) as stop_fanout, patch.object(
+        retention_worker,
+        "start",
+    ) as start_retention:
+        worker = asyncio.create_task(ingest.run(1, stopping))
+        # Migrating runs on the database thread
+        for _ in range(100):
+            if connection.queue.consume.await_count:
+                break
+            await asyncio.sleep(0.01)
+        connection.queue.consume.assert_awaited_once_with(process_message)
+        start_fanout.assert_awaited_once()
+        channel = await connection.channel()
+        channel.set_qos.assert_awaited_once_with(prefetch_count=500, global_=True)
+
+        stopping.set()
+        await worker
+
+    connection.queue.cancel.assert_awaited_once_with("consumer-tag")
+    stop_fanout.assert_awaited_once()
+    connection.close.assert_awaited_once()
+    # Only the first worker prunes old readings
+    start_retention.assert_not_called()
+    assert ingest_writer.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stop_finishes_messages_in_flight(temp_database: Database) -> None:
+    """Test the channel is only closed once the messages in flight are acked."""
+    connection = make_connection()
+    channel = await connection.channel()
+    in_flight_at_close = []
+    channel.close.side_effect = lambda: in_flight_at_close.append(
+        flow_controller.in_flight,
+    )
+    service = ingest.IngestService(retention=False)
+    await service.start(connection)
+
+    await flow_controller.acquire()
+    asyncio.get_running_loop().call_later(0.02, flow_controller.release)
+    await service.stop(timeout=1)
+
+    connection.queue.cancel.assert_awaited_once_with("consumer-tag")
+    assert in_flight_at_close == [0]
+
+
+@pytest.mark.asyncio
+async def test_serve_metrics() -> None:
+    """Test a worker answers scrapes of /metrics and nothing else."""
+    server = ingest.metrics_server(0)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    async def get(path: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        request = f"GET {path} HTTP/1.1\r\nHost: worker\r\nConnection: close\r\n"
+        writer.write(f"{request}\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response
+
+    try:
+        metrics = await get("/metrics")
+        missing = await get("/")
+    finally:
+        server.should_exit = True
+        await serving
+
+    head, body = metrics.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"content-type: text/plain; version=0.0.4" in head
+    assert b"# TYPE lakewatch_ingest_stage_seconds histogram" in body
+    assert missing.startswith(b"HTTP/1.1 404 Not Found")
+
+
+def test_main_starts_worker_processes() -> None:
+    """Test every worker runs in its own process."""
+    context = MagicMock()
+    context.Process.return_value.exitcode = 0
+    with patch.object(
+        ingest.multiprocessing,
+        "get_context",
+        return_value=context,
+    ), patch.object(ingest.signal, "signal"):
+        ingest.main(["--workers", "3"])
+
+    # Every worker knows how many there are, nodes are split between them
+    assert [call.kwargs["args"] for call in context.Process.call_args_list] == [
+        (0, 3),
+        (1, 3),
+        (2, 3),
+    ]
+    assert context.Process.return_value.start.call_count == 3
+    assert context.Process.return_value.join.call_count == 3
+
+
+def test_main_single_worker_runs_in_process() -> None:
+    """Test a single worker does not fork."""
+    with patch.object(ingest, "work") as work, patch.object(
+        ingest.multiprocessing,
+        "get_context",
+    ) as get_context:
+        ingest.main(["--workers", "1"])
+
+    work.assert_called_once_with(0)
+    get_context.assert_not_called()
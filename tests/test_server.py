@@ -0,0 +1,51 @@
+"""Tests for the uvicorn server."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("uvicorn")
+pytest.importorskip("websockets")
+
+import uvicorn  # noqa: E402
+from websockets.asyncio.client import connect  # noqa: E402
+from websockets.exceptions import ConnectionClosed  # noqa: E402
+
+from lakewatch.services.broadcast import broadcaster  # noqa: E402
+from lakewatch.web.application import get_app  # noqa: E402
+from lakewatch.web.server import Server  # noqa: E402
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_websockets_before_uvicorn_closes_them() -> None:
+    """Test clients get their queued alerts and a going-away close code."""
+    config = uvicorn.Config(
+        get_app(),
+        host="127.0.0.1",
+        port=0,
+        lifespan="off",
+        log_level="warning",
+    )
+    server = Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    async with connect(f"ws://127.0.0.1:{port}/api/monitoring/ws") as websocket:
+        while not len(broadcaster):
+            await asyncio.sleep(0.01)
+        for number in range(100):
+            broadcaster.publish(f"alert {number}")
+        # What the signal handler does
+        server.should_exit = True
+
+        received = []
+        with pytest.raises(ConnectionClosed) as closed:
+            while True:
+                received.append(await websocket.recv())
+
+    await serving
+    assert received == [f"alert {number}" for number in range(100)]
+    assert closed.value.rcvd is not None
+    assert closed.value.rcvd.code == 1001
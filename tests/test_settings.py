@@ -6,7 +6,12 @@ from pathlib import Path
 from tempfile import gettempdir
 import unittest.mock as mock
 
-from lakewatch.settings import Settings, LogLevel
+from lakewatch.settings import (
+    Settings,
+    LogLevel,
+    SlowConsumerPolicy,
+    SynchronousMode,
+)
 
 
 def test_default_settings() -> None:
@@ -24,11 +29,34 @@ def test_default_settings() -> None:
         assert settings.log_level == LogLevel.INFO
         assert settings.db_file == Path(gettempdir()) / "db.sqlite3"
         assert settings.db_echo is False
+        assert settings.db_read_pool_size == 4
+        assert settings.db_queue_warn_depth == 50
+        assert settings.db_synchronous == SynchronousMode.NORMAL
 
         # Check RabbitMQ defaults
         assert settings.rabbitmq_host == "localhost"
         assert settings.rabbitmq_port == 5672
         assert settings.rabbitmq_queue == "node_data"
+        assert settings.rabbitmq_prefetch_count == 500
+        assert settings.rabbitmq_dead_letter_queue == "node_data.dead"
+        assert settings.rabbitmq_max_attempts == 5
+        assert settings.rabbitmq_fanout_exchange == "lakewatch.fanout"
+        assert settings.rabbitmq_alert_exchange == "lakewatch.alerts"
+        assert settings.ingest_workers == 1
+        assert settings.api_ingest is False
+        assert settings.ingest_prefetch_min == 50
+        assert settings.ingest_prefetch_max == 5000
+        assert settings.ingest_commit_target_ms == 100
+        assert settings.ingest_metrics_port == 0
+        assert settings.shutdown_timeout_seconds == 10.0
+
+        # Check ingest writer defaults
+        assert settings.ingest_batch_size == 500
+        assert settings.ingest_flush_interval_ms == 50
+
+        # Check WebSocket fan-out defaults
+        assert settings.ws_queue_size == 100
+        assert settings.ws_slow_consumer_policy == SlowConsumerPolicy.DROP_OLDEST
 
         # Check threshold defaults
         assert settings.temperature_threshold == 30.0